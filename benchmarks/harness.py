@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+import gc
+import sys
+import time
+import platform
+from datetime import datetime
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+
+__all__ = ('SCENARIOS', 'SkipScenario', 'scenario', 'timed', 'statistics',
+           'deep_size', 'run', 'save', 'load', 'compare')
+
+
+SCENARIOS = []
+
+
+class SkipScenario(Exception):
+    '''
+    Raised by a scenario which cannot run in the current environment.
+    '''
+    pass
+
+
+def scenario(name):
+    '''
+    Registers a scenario. The decorated function takes the options of the
+    run and returns a dict of measurements.
+    @param name:str Name of the scenario.
+    @return: function
+    '''
+    def register(func):
+        SCENARIOS.append((name, func))
+        return func
+    return register
+
+
+def timed(func, repeat=5, number=1, setup=None):
+    '''
+    Measures the duration of a callable.
+    @param func:function Callable to measure.
+    @param repeat:int Number of samples.
+    @param number:int Number of calls per sample.
+    @param setup:function Callable run before every sample, not measured.
+    @return: dict Statistics of the durations of a call, in seconds.
+    '''
+    samples = []
+    for _ in xrange(repeat):
+        if setup:
+            setup()
+        gc.collect()
+        started = time.time()
+        for _ in xrange(number):
+            func()
+        samples.append((time.time() - started) / number)
+    return statistics(samples, number)
+
+
+def statistics(samples, number=1):
+    '''
+    Summarizes durations measured.
+    @param samples:list Durations, in seconds.
+    @param number:int Number of calls per sample.
+    @return: dict
+    '''
+    samples = sorted(samples)
+    mean = sum(samples) / len(samples)
+    return {'min': samples[0],
+            'median': samples[len(samples) // 2],
+            'mean': mean,
+            'max': samples[-1],
+            'stdev': (sum((s - mean) ** 2 for s in samples) /
+                      len(samples)) ** 0.5,
+            'samples': len(samples),
+            'calls': number}
+
+
+def deep_size(obj, seen=None):
+    '''
+    Estimates the memory used by an object and everything it references,
+    excluding classes, modules and functions.
+    @param obj:object
+    @param seen:set IDs of the objects already counted.
+    @return: int Number of bytes.
+    '''
+    seen = set() if seen is None else seen
+    if id(obj) in seen or isinstance(obj, (type, type(sys), type(deep_size))):
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(key, seen) + deep_size(value, seen)
+                    for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_size(item, seen) for item in obj)
+    if hasattr(obj, '__dict__'):
+        size += deep_size(obj.__dict__, seen)
+    for cls in type(obj).__mro__:
+        for name in cls.__dict__.get('__slots__', ()):
+            if hasattr(obj, name):
+                size += deep_size(getattr(obj, name), seen)
+    return size
+
+
+def run(options, names=None, output=sys.stdout):
+    '''
+    Runs the scenarios.
+    @param options:dict Options of the run (sizes, number of samples...).
+    @param names:list Names of the scenarios to run. Defaults to all.
+    @param output:file Stream on which the progress is written.
+    @return: dict Results, serializable to JSON.
+    '''
+    from greendizer.clients.config import VERSION
+    results = {}
+    for name, func in SCENARIOS:
+        if names and name not in names:
+            continue
+
+        output.write('%-32s' % name)
+        output.flush()
+        try:
+            results[name] = func(options)
+            output.write('%s\n' % _headline(results[name]))
+        except(SkipScenario), e:
+            results[name] = {'skipped': str(e)}
+            output.write('skipped (%s)\n' % e)
+
+    return {'version': VERSION,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'date': datetime.now().isoformat(),
+            'options': options,
+            'results': results}
+
+
+def _headline(measurements):
+    '''
+    Gets a one line summary of the measurements of a scenario.
+    @param measurements:dict
+    @return: str
+    '''
+    parts = []
+    for key, value in sorted(measurements.items()):
+        if isinstance(value, dict) and 'median' in value:
+            parts.append('%s %.3fms' % (key, value['median'] * 1000))
+        elif isinstance(value, (int, long, float)):
+            parts.append('%s %s' % (key, value))
+    return ', '.join(parts)
+
+
+def save(results, path):
+    '''
+    Writes results to a JSON file.
+    @param results:dict
+    @param path:str
+    '''
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def load(path):
+    '''
+    Reads results from a JSON file.
+    @param path:str
+    @return: dict
+    '''
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(baseline, current, threshold=0.1):
+    '''
+    Compares the median durations of two runs.
+    @param baseline:dict Results of the reference run.
+    @param current:dict Results of the run to compare.
+    @param threshold:float Relative change above which a measurement is
+    reported as a regression or an improvement.
+    @return: list (scenario, measurement, baseline, current, ratio, verdict)
+    tuples.
+    '''
+    rows = []
+    for name, measurements in sorted(current['results'].items()):
+        previous = baseline['results'].get(name) or {}
+        for key, value in sorted(measurements.items()):
+            before = previous.get(key)
+            if isinstance(value, dict) and 'median' in value:
+                value, before = value['median'], (before or {}).get('median')
+            if not isinstance(value, (int, long, float)) or not before:
+                continue
+            ratio = float(value) / before
+            verdict = ('regression' if ratio > 1 + threshold else
+                       'improvement' if ratio < 1 - threshold else '')
+            rows.append((name, key, before, value, ratio, verdict))
+    return rows
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+'''
+Runs the benchmarks against an in-process sandbox of the API.
+Usage:
+    python -m benchmarks.run -o results.json
+    python -m benchmarks.run -s collection.retrieve_all --invoices 5000
+    python -m benchmarks.run -o new.json --compare results.json
+    python -m benchmarks.run -s cassette.replay --cassette prod.cassette
+'''
+import sys
+from optparse import OptionParser
+from benchmarks import harness
+import benchmarks.scenarios
+
+
+def main(argv=None):
+    parser = OptionParser(usage='python -m benchmarks.run [options]')
+    parser.add_option('-o', '--output', help='JSON file to write results to')
+    parser.add_option('-s', '--scenario', action='append', dest='scenarios',
+                      help='Scenario to run (repeatable). Defaults to all.')
+    parser.add_option('-l', '--list', action='store_true',
+                      help='List the scenarios and exit')
+    parser.add_option('-c', '--compare', metavar='FILE',
+                      help='JSON results to compare with')
+    parser.add_option('--threshold', type='float', default=0.1,
+                      help='Relative change reported by --compare')
+    parser.add_option('--invoices', type='int', default=1000,
+                      help='Number of invoices served by the sandbox')
+    parser.add_option('--buyers', type='int', default=20)
+    parser.add_option('--storm', type='int', default=200,
+                      help='Number of resources loaded at once')
+    parser.add_option('--workers', type='int', default=8)
+    parser.add_option('--latency', type='float', default=0.0,
+                      help='Latency of the sandbox in seconds')
+    parser.add_option('--repeat', type='int', default=5,
+                      help='Number of samples per measurement')
+    parser.add_option('--number', type='int', default=10000,
+                      help='Number of calls per sample of micro-benchmarks')
+    parser.add_option('--cassette', metavar='FILE',
+                      help='Recorded workload replayed by cassette.replay')
+    parser.add_option('--speed', type='float', default=0.0,
+                      help='Speed of the replay (0: as fast as possible)')
+    options, _ = parser.parse_args(argv)
+
+    if options.list:
+        for name, _ in harness.SCENARIOS:
+            print name
+        return 0
+
+    results = harness.run(dict((name, getattr(options, name))
+                               for name in ['invoices', 'buyers', 'storm',
+                                            'workers', 'latency', 'repeat',
+                                            'number', 'cassette',
+                                            'speed']),
+                          options.scenarios)
+    if options.output:
+        harness.save(results, options.output)
+
+    if options.compare:
+        rows = harness.compare(harness.load(options.compare), results,
+                               options.threshold)
+        for name, key, before, after, ratio, verdict in rows:
+            print '%-28s %-22s %12.6g %12.6g %6.2fx %s' % (
+                                name, key, before, after, ratio, verdict)
+        if any(row[-1] == 'regression' for row in rows):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
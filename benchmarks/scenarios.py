@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+import gc
+import sys
+import httplib
+import subprocess
+from StringIO import StringIO
+from datetime import datetime, date, timedelta
+from benchmarks.harness import (scenario, timed, statistics, deep_size,
+                                SkipScenario)
+from greendizer.clients import SellerClient, http
+from greendizer.clients.concurrency import map_concurrently
+from greendizer.clients.dal import RESPONSE_SIZE_LIMIT
+from tests.sandbox import SandboxServer, SandboxData
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+
+def _sandbox(options, **kwargs):
+    '''
+    Starts a sandbox sized after the options of the run.
+    @param options:dict
+    @return: SandboxServer
+    '''
+    data = SandboxData.generate(emails=1, invoices=options['invoices'],
+                                payments=0, buyers=options['buyers'])
+    return SandboxServer(data, latency=options['latency'], **kwargs)
+
+
+def _invoices_payload(count):
+    '''
+    Gets the JSON representation of a page of invoices.
+    @param count:int Number of invoices.
+    @return: str
+    '''
+    data = SandboxData.generate(emails=1, invoices=count, payments=0,
+                                buyers=1)
+    return json.dumps([dict(item, etag=SandboxData.etag(path, modified))
+                       for path, item, modified in
+                       data.children('sellers/me/emails/e1/invoices')])
+
+
+# Modules which are only needed once a request is sent or an optional
+# feature is used, and should not be loaded by importing the library.
+DEFERRED_MODULES = ('urllib', 'urllib2', 'httplib', 'socket', 'ssl', 'zlib',
+                    'gzip', 'hashlib', 'logging', 'pyxmli', 'Crypto',
+                    'greendizer.clients.transport')
+
+# The namespace declaration of greendizer imports pkg_resources, which
+# loads some of the deferred modules itself. Blocking it makes the
+# declaration fall back to pkgutil so that the library is measured alone.
+_IMPORT_PROBE = '''
+import sys, time
+if %r:
+    sys.modules['pkg_resources'] = None
+started = time.time()
+import greendizer.clients
+print time.time() - started
+print ' '.join(sorted(name for name in %r if name in sys.modules))
+'''
+
+
+def _probe_import(library_only):
+    '''
+    Imports greendizer.clients in a fresh interpreter.
+    @param library_only:bool Whether to leave pkg_resources out.
+    @return: tuple (float, list) Duration in seconds, and the deferred
+    modules which were loaded.
+    '''
+    output = subprocess.check_output([sys.executable, '-c', _IMPORT_PROBE %
+                                      (library_only, DEFERRED_MODULES)])
+    duration, eager = (output.split('\n') + [''])[:2]
+    return float(duration), eager.split()
+
+
+@scenario('import.clients')
+def import_clients(options):
+    # Every sample needs a fresh interpreter with nothing cached.
+    samples = [_probe_import(False)[0] for _ in xrange(options['repeat'])]
+    library = [_probe_import(True) for _ in xrange(options['repeat'])]
+    return {'import': statistics(samples),
+            'import_library': statistics([d for d, _ in library]),
+            'eager_modules': library[-1][1]}
+
+
+@scenario('collection.retrieve_all')
+def retrieve_all(options):
+    with _sandbox(options):
+        client = SellerClient(oauth_token='benchmark')
+        node = client.seller.emails['e1'].invoices
+
+        def retrieve():
+            collection = node.search('')
+            collection.retrieve_all()
+            assert len(collection) == options['invoices']
+
+        return {'invoices': options['invoices'],
+                'retrieve_all': timed(retrieve, options['repeat'])}
+
+
+@scenario('collection.sync')
+def sync(options):
+    with _sandbox(options) as server:
+        client = SellerClient(oauth_token='benchmark')
+        collection = client.seller.emails['e1'].invoices.search('')
+        collection.sync()
+        path = 'sellers/me/emails/e1/invoices/%d'
+        touched = [1]
+
+        def change():
+            touched[0] = touched[0] % options['invoices'] + 1
+            server.data.update(path % touched[0], {'name': 'Changed'})
+
+        return {'invoices': options['invoices'],
+                'unchanged': timed(collection.sync, options['repeat']),
+                'one_change': timed(collection.sync, options['repeat'],
+                                    setup=change),
+                'retrieve_all': timed(collection.retrieve_all,
+                                      options['repeat'])}
+
+
+@scenario('resource.load_storm')
+def load_storm(options):
+    with _sandbox(options):
+        client = SellerClient(oauth_token='benchmark')
+        node = client.seller.emails['e1'].invoices
+        count = min(options['invoices'], options['storm'])
+        identifiers = [str(n + 1) for n in xrange(count)]
+
+        def load(identifier):
+            node[identifier].load()
+
+        def serial():
+            for identifier in identifiers:
+                load(identifier)
+
+        def concurrent():
+            map_concurrently(load, identifiers, options['workers'])
+
+        return {'resources': count,
+                'serial': timed(serial, options['repeat']),
+                'concurrent': timed(concurrent, options['repeat'])}
+
+
+def _xmli_invoice():
+    '''
+    Creates a minimal XMLi invoice.
+    @return: pyxmli.Invoice
+    '''
+    try:
+        from pyxmli import Invoice, Group, Line, Address
+    except ImportError:
+        raise SkipScenario('pyxmli is not installed')
+
+    invoice = Invoice(name='Benchmark', description='Benchmark invoice',
+                      currency='EUR', date=datetime.now(),
+                      due_date=date.today() + timedelta(days=30),
+                      domain='greendizer.com')
+    invoice.buyer.identifier = 'buyer@example.com'
+    invoice.buyer.name = 'Benchmark'
+    invoice.buyer.address = Address(street_address='1 Sandbox street',
+                                    city='Paris', zipcode='75001',
+                                    country='FR')
+    invoice.shipping.recipient = invoice.buyer
+    group = Group()
+    invoice.groups.append(group)
+    for n in xrange(20):
+        group.lines.append(Line(name='Item %d' % n, quantity=n + 1,
+                                unit_price=9.99))
+    return invoice
+
+
+def _import_keys(client):
+    '''
+    Generates and imports a key pair to sign invoices.
+    @param client:SellerClient
+    '''
+    try:
+        from Crypto.PublicKey import RSA
+    except ImportError:
+        raise SkipScenario('PyCrypto is not installed')
+
+    key = RSA.generate(1024)
+    client.import_keys(StringIO(key.exportKey()),
+                       StringIO(key.publickey().exportKey()))
+
+
+@scenario('invoices.send')
+def send(options):
+    invoice = _xmli_invoice()
+    with _sandbox(options):
+        client = SellerClient(oauth_token='benchmark')
+        node = client.seller.emails['e1'].invoices
+        unsigned = timed(lambda: node.send(invoice, signature=False),
+                         options['repeat'])
+        _import_keys(client)
+        signed = timed(lambda: node.send(invoice, signature=True),
+                       options['repeat'])
+        return {'unsigned': unsigned, 'signed': signed}
+
+
+@scenario('response.decode')
+def decode(options):
+    payload = _invoices_payload(RESPONSE_SIZE_LIMIT)
+    client = SellerClient(oauth_token='benchmark')
+    measurements = {'bytes': len(payload)}
+    for encoding, body in [('identity', payload),
+                           ('gzip', http.gzip_str(payload))]:
+        headers = httplib.HTTPMessage(StringIO(
+                    'Content-Encoding: %s\r\n\r\n' % encoding))
+
+        def decode():
+            request = http.Request(client, uri='sellers/me/')
+            http.Response(request, 200, body, headers).data
+
+        measurements[encoding] = timed(decode, options['repeat'],
+                                       options['number'] // 10 or 1)
+    return measurements
+
+
+@scenario('headers.parse')
+def parse_headers(options):
+    return {'etag': timed(lambda: http.Etag.parse('1325376000000-12345'),
+                          options['repeat'], options['number']),
+            'content_range': timed(lambda: http.ContentRange.parse(
+                                                'resources 0-199/10000'),
+                                   options['repeat'], options['number'])}
+
+
+@scenario('cassette.replay')
+def replay(options):
+    if not options.get('cassette'):
+        raise SkipScenario('no cassette given')
+
+    from greendizer.clients.cassettes import Cassette
+    cassette = Cassette.load(options['cassette'])
+    measurements = {'requests': len(cassette),
+                    'recorded': cassette.duration}
+    for name, workers in [('serial', 1), ('concurrent', options['workers'])]:
+        measurements[name] = timed(lambda: cassette.replay(
+                                        speed=options['speed'] or None,
+                                        max_workers=workers),
+                                   options['repeat'])
+    return measurements
+
+
+@scenario('memory.resource')
+def memory_per_resource(options):
+    data = json.loads(_invoices_payload(options['storm']))
+    client = SellerClient(oauth_token='benchmark')
+    node = client.seller.emails['e1'].invoices
+    gc.collect()
+    resources = []
+    for item in data:
+        etag = http.Etag.parse(item['etag'])
+        resource = node[etag.id]
+        resource.sync(item, etag)
+        resources.append(resource)
+
+    # Objects shared by every resource are counted once, up front.
+    shared = set()
+    deep_size(client, shared)
+    total = sum(deep_size(resource, shared) for resource in resources)
+    return {'resources': len(resources),
+            'bytes_per_resource': total // len(resources)}
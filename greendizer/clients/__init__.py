@@ -1,7 +1,10 @@
 # -*- coding: utf-8 -*-
-from greendizer.clients.http import ApiError
+import threading
+from greendizer.clients.http import ApiError, Deadline
 from greendizer.clients.resources.buyers import Buyer
 from greendizer.clients.resources.sellers import Seller
+from greendizer.clients.stats import ClientStats, Profile
+from greendizer.clients.dal import LAZY_LOADING_ALLOW, LAZY_LOADING_MODES
 
 
 __all__ = ('SellerClient', 'BuyerClient')  
@@ -9,10 +12,16 @@ __all__ = ('SellerClient', 'BuyerClient')
 
 class Client(object):
     '''
-    Represents a Greendizer API client
+    Represents a Greendizer API client.
+    A client can be shared by several threads. The requests it sends are
+    counted in its stats, spaced by its rate_limiter and sent with its
+    opener (a urllib2 OpenerDirector) if it has them, or else by the ones
+    of the Channel entered by the sending thread.
     '''
 
-    def __init__(self, user, access_token=None, email=None, password=None):
+    def __init__(self, user, access_token=None, email=None, password=None,
+                 connect_timeout=None, read_timeout=None,
+                 lazy_loading=LAZY_LOADING_ALLOW):
         '''
         Initializes a new instance of the Client class.
         Either provide an email/password, or a valid access_token
@@ -20,7 +29,19 @@ class Client(object):
         @param email:str Email
         @param password:str Password
         @param access_token:str OAuth access token
-        '''
+        @param connect_timeout:float Connect timeout of the requests in
+        seconds.
+        @param read_timeout:float Read timeout of the requests in seconds.
+        @param lazy_loading:str What to do when an attribute of a resource
+        which was not loaded is read (see lazy_loading).
+        '''
+        self.__lock = threading.Lock()
+        self.stats = ClientStats()
+        self.rate_limiter = None
+        self.opener = None
+        self.lazy_loading = lazy_loading
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
         self.__authorization_header = None
         self._user = user
         self._email = email
@@ -36,10 +57,37 @@ class Client(object):
         
     def __setattr__(self, attr, val):
         if attr in ['oauth_token', 'access_token']:
-            self._access_token = val
-            self._generate_authorization_header()
+            # The header is swapped in a single assignment so that requests
+            # signed concurrently never see a half updated token.
+            with self.__lock:
+                self._access_token = val
+                self._generate_authorization_header()
+            return
         return super(Client, self).__setattr__(attr, val)
 
+    @property
+    def lazy_loading(self):
+        '''
+        Gets what happens when an attribute of a resource which was not
+        loaded is read: LAZY_LOADING_ALLOW loads it silently,
+        LAZY_LOADING_WARN loads it and issues an ImplicitLoadWarning, and
+        LAZY_LOADING_STRICT raises an ImplicitLoadError. Implicit loads are
+        counted in the stats in every mode.
+        @return: str
+        '''
+        return self.__lazy_loading
+
+    @lazy_loading.setter
+    def lazy_loading(self, mode):
+        '''
+        Sets what happens when an attribute of a resource which was not
+        loaded is read.
+        @param mode:str
+        '''
+        if mode not in LAZY_LOADING_MODES:
+            raise ValueError('Invalid lazy loading mode \'%s\'' % mode)
+        self.__lazy_loading = mode
+
     @property
     def email_address(self):
         '''
@@ -64,9 +112,32 @@ class Client(object):
         '''
         if self._email and self._password:
             encoded = ("%s:%s" % (self._email,self._password)).encode('base64')
-            self.__authorization_header = "BASIC " + encoded.strip("\n")
+            header = "BASIC " + encoded.strip("\n")
         else:
-            self.__authorization_header = "BEARER " + (self._access_token or '')
+            header = "BEARER " + (self._access_token or '')
+        self.__authorization_header = header
+
+    def deadline(self, seconds):
+        '''
+        Returns a deadline to enter as a context manager so that every
+        request sent within it, even by operations spanning several
+        requests, completes within the given number of seconds.
+        @param seconds:float Number of seconds.
+        @return: Deadline
+        '''
+        return Deadline(seconds)
+
+    def profile(self, limit=10, output=None):
+        '''
+        Returns a profiler to enter as a context manager so that the routes
+        on which the requests sent within it spent the most time are
+        printed when leaving it.
+        @param limit:int Maximum number of routes printed.
+        @param output:file Stream on which the report is printed. Defaults
+        to the standard output.
+        @return: Profile
+        '''
+        return Profile(self.stats, limit, output)
 
     def sign_request(self, request):
         '''
@@ -82,12 +153,15 @@ class BuyerClient(Client):
     '''
     Represents a buyer oriented client of the Greendizer API
     '''
-    def __init__(self, oauth_token=None, email=None, password=None):
+    def __init__(self, oauth_token=None, email=None, password=None,
+                 connect_timeout=None, read_timeout=None,
+                 lazy_loading=LAZY_LOADING_ALLOW):
         '''
         Initializes a new instance of the BuyerClient class
         '''
         super(BuyerClient, self).__init__(Buyer(self), oauth_token, email,
-                                          password)
+                                          password, connect_timeout,
+                                          read_timeout, lazy_loading)
 
     @property
     def buyer(self):
@@ -102,14 +176,17 @@ class SellerClient(Client):
     '''
     Represents a seller oriented client of the Greendizer API
     '''
-    def __init__(self, oauth_token=None, email=None, password=None):
+    def __init__(self, oauth_token=None, email=None, password=None,
+                 connect_timeout=None, read_timeout=None,
+                 lazy_loading=LAZY_LOADING_ALLOW):
         '''
         Initializes a new instance of the SellerClient class
         '''
         self.__private_key = None
         self.__public_key = None
         super(SellerClient, self).__init__(Seller(self), oauth_token, email,
-                                           password)
+                                           password, connect_timeout,
+                                           read_timeout, lazy_loading)
 
     @property
     def keys(self):
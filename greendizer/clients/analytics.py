@@ -0,0 +1,556 @@
+# -*- coding: utf-8 -*-
+from array import array
+from datetime import timedelta
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+__all__ = ('DigestSeries', 'Rollup', 'MetricsAggregate', 'AnalyticsTable',
+           'METRICS',
+           'BUCKET_DAY', 'BUCKET_WEEK', 'BUCKET_MONTH')
+
+
+'''
+Names of the CurrencyMetrics properties exposed as series.
+'''
+METRICS = ('sum', 'min', 'max', 'average', 'invoices_count', 'total_taxes',
+           'total_discounts')
+
+
+def _matrix(rows, width):
+    '''
+    Converts a list of rows into a 2D numpy array if numpy is available,
+    or into a list of array('d') otherwise.
+    @param rows:list
+    @param width:int Number of columns.
+    @return: object
+    '''
+    if numpy is not None:
+        return numpy.array(rows, dtype=float).reshape(len(rows), width)
+    return [array('d', row) for row in rows]
+
+
+def _vector(values):
+    '''
+    Converts a list of values into a numpy array if numpy is available, or
+    into an array('d') otherwise.
+    @param values:list
+    @return: object
+    '''
+    if numpy is not None:
+        return numpy.array(values, dtype=float)
+    return array('d', values)
+
+
+class DigestSeries(object):
+    '''
+    Represents the analytics digests of a time range as dense series indexed
+    by time and currency. Missing digests and currencies are filled with a
+    constant value. Series are numpy arrays when numpy is installed, and
+    arrays of doubles otherwise.
+    '''
+    def __init__(self, times, digests, currencies=None, fill_value=0.0):
+        '''
+        Initializes a new instance of the DigestSeries class.
+        @param times:list Datetimes covered, in chronological order.
+        @param digests:list TimespanDigest instances, or None for the gaps.
+        @param currencies:list Currencies to include. Defaults to every
+        currency found in the digests.
+        @param fill_value:float Value of the gaps.
+        '''
+        self.__times = list(times)
+        self.__digests = list(digests)
+        if not currencies:
+            currencies = set()
+            for digest in self.__digests:
+                currencies.update((digest and digest.available_currencies)
+                                  or [])
+        self.__currencies = sorted(c.upper() for c in currencies)
+        self.__index = dict((c, i) for i, c in enumerate(self.__currencies))
+        self.__fill_value = fill_value
+
+        rows = dict((metric, []) for metric in METRICS)
+        for digest in self.__digests:
+            available = set((digest and digest.available_currencies) or [])
+            for metric in METRICS:
+                rows[metric].append([fill_value] * len(self.__currencies))
+            for currency in available:
+                if currency.upper() not in self.__index:
+                    continue
+                column = self.__index[currency.upper()]
+                metrics = digest.get_currency_metrics(currency)
+                for metric in METRICS:
+                    value = getattr(metrics, metric)
+                    if value is not None:
+                        rows[metric][-1][column] = float(value)
+
+        self.__values = dict((metric, _matrix(rows[metric],
+                                              len(self.__currencies)))
+                             for metric in METRICS)
+
+    def __len__(self):
+        return len(self.__times)
+
+    @property
+    def times(self):
+        '''
+        Gets the datetimes covered by the series.
+        @return: list
+        '''
+        return self.__times
+
+    @property
+    def currencies(self):
+        '''
+        Gets the currencies of the columns.
+        @return: list
+        '''
+        return self.__currencies
+
+    @property
+    def digests(self):
+        '''
+        Gets the digests, with None for the gaps.
+        @return: list
+        '''
+        return self.__digests
+
+    @property
+    def missing(self):
+        '''
+        Gets the datetimes for which no digest was available.
+        @return: list
+        '''
+        return [t for t, d in zip(self.__times, self.__digests) if d is None]
+
+    def values(self, metric):
+        '''
+        Gets a metric for every time and currency.
+        @param metric:str One of METRICS.
+        @return: object 2D array (time x currency)
+        '''
+        if metric not in self.__values:
+            raise ValueError('Unknown metric ' + metric)
+        return self.__values[metric]
+
+    def series(self, metric, currency):
+        '''
+        Gets a metric over time for a currency.
+        @param metric:str One of METRICS.
+        @param currency:str Currency code.
+        @return: object 1D array
+        '''
+        column = self.__index.get(currency.upper())
+        if column is None:
+            return _vector([self.__fill_value] * len(self.__times))
+
+        values = self.values(metric)
+        if numpy is not None:
+            return values[:, column]
+        return array('d', [row[column] for row in values])
+
+    def moving_average(self, metric, currency, window):
+        '''
+        Gets the moving average of a metric. The result has
+        len(self) - window + 1 values.
+        @param metric:str One of METRICS.
+        @param currency:str Currency code.
+        @param window:int Number of periods averaged.
+        @return: object 1D array
+        '''
+        values = self.series(metric, currency)
+        if window < 1 or window > len(values):
+            raise ValueError('Invalid window size %s' % window)
+
+        if numpy is not None:
+            return numpy.convolve(values, numpy.ones(window) / window, 'valid')
+
+        averages, total = [], sum(values[:window])
+        averages.append(total / window)
+        for i in xrange(window, len(values)):
+            total += values[i] - values[i - window]
+            averages.append(total / window)
+        return array('d', averages)
+
+    def trend(self, metric, currency):
+        '''
+        Gets the slope of the least squares line fitting a metric, in
+        units per period.
+        @param metric:str One of METRICS.
+        @param currency:str Currency code.
+        @return: float
+        '''
+        values = self.series(metric, currency)
+        n = len(values)
+        if n < 2:
+            return 0.0
+
+        if numpy is not None:
+            return float(numpy.polyfit(numpy.arange(n), values, 1)[0])
+
+        mean_x, mean_y = (n - 1) / 2.0, sum(values) / n
+        covariance = sum((i - mean_x) * (y - mean_y)
+                         for i, y in enumerate(values))
+        variance = sum((i - mean_x) ** 2 for i in xrange(n))
+        return covariance / variance
+
+
+BUCKET_DAY = 'day'
+BUCKET_WEEK = 'week'
+BUCKET_MONTH = 'month'
+
+
+def bucket_start(value, bucket):
+    '''
+    Gets the beginning of the bucket containing a datetime.
+    @param value:datetime
+    @param bucket:object BUCKET_DAY, BUCKET_WEEK, BUCKET_MONTH or a callable
+    returning the beginning of the bucket of a datetime.
+    @return: datetime
+    '''
+    if callable(bucket):
+        return bucket(value)
+
+    day = value.replace(hour=0, minute=0, second=0, microsecond=0)
+    if bucket == BUCKET_DAY:
+        return day
+    if bucket == BUCKET_WEEK:
+        return day - timedelta(days=day.weekday())
+    if bucket == BUCKET_MONTH:
+        return day.replace(day=1)
+
+    raise ValueError('Unknown bucket ' + str(bucket))
+
+
+def _field(metrics, name):
+    '''
+    Gets a field of a CurrencyMetrics instance, or None if the server did
+    not provide it.
+    @param metrics:CurrencyMetrics
+    @param name:str Property name.
+    @return: object
+    '''
+    try:
+        return getattr(metrics, name)
+    except(KeyError, TypeError):
+        return None
+
+
+class MetricsAggregate(object):
+    '''
+    Represents CurrencyMetrics merged over several periods. The average is
+    recomputed from the sum and the number of invoices rather than averaged.
+    '''
+    __slots__ = ('sum', 'min', 'max', 'invoices_count', 'items',
+                 'total_taxes', 'total_discounts', 'taxes', 'discounts')
+
+    def __init__(self):
+        '''
+        Initializes a new instance of the MetricsAggregate class.
+        '''
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        self.invoices_count = 0
+        self.items = 0
+        self.total_taxes = 0.0
+        self.total_discounts = 0.0
+        self.taxes = {}
+        self.discounts = {}
+
+    @property
+    def average(self):
+        '''
+        Gets the average invoice amount.
+        @return: float
+        '''
+        if not self.invoices_count:
+            return 0.0
+        return self.sum / self.invoices_count
+
+    def add(self, metrics):
+        '''
+        Merges the metrics of a period.
+        @param metrics:CurrencyMetrics
+        '''
+        count = _field(metrics, 'invoices_count') or 0
+        self.sum += _field(metrics, 'sum') or 0.0
+        self.invoices_count += count
+        self.items += _field(metrics, 'items') or 0
+        self.total_taxes += _field(metrics, 'total_taxes') or 0.0
+        self.total_discounts += _field(metrics, 'total_discounts') or 0.0
+        minimum, maximum = _field(metrics, 'min'), _field(metrics, 'max')
+        if count and minimum is not None:
+            self.min = minimum if self.min is None else min(self.min, minimum)
+        if count and maximum is not None:
+            self.max = maximum if self.max is None else max(self.max, maximum)
+
+        for treatments, merged in [(_field(metrics, 'taxes'), self.taxes),
+                                   (_field(metrics, 'discounts'),
+                                    self.discounts)]:
+            for treatment in treatments or []:
+                key = (treatment.type, treatment.name)
+                merged[key] = merged.get(key, 0.0) + (treatment.value or 0.0)
+
+    def to_dict(self):
+        '''
+        Gets the aggregate in the format of the API.
+        @return: dict
+        '''
+        return {'sum': self.sum,
+                'min': self.min or 0.0,
+                'max': self.max or 0.0,
+                'average': self.average,
+                'invoicesCount': self.invoices_count,
+                'items': self.items,
+                'totalTaxes': self.total_taxes,
+                'totalDiscounts': self.total_discounts,
+                'taxes': [{'type': t, 'name': n, 'value': v}
+                          for (t, n), v in sorted(self.taxes.items())],
+                'discounts': [{'type': t, 'name': n, 'value': v}
+                              for (t, n), v in sorted(self.discounts.items())]}
+
+    def to_metrics(self, currency_code):
+        '''
+        Gets the aggregate as a CurrencyMetrics instance.
+        @param currency_code:str Currency code.
+        @return: CurrencyMetrics
+        '''
+        from greendizer.clients.helpers import CurrencyMetrics
+        return CurrencyMetrics(currency_code, self.to_dict())
+
+
+class Rollup(object):
+    '''
+    Merges digests of fine periods (typically hourly digests) into coarser
+    buckets (days, weeks, months or custom buckets) without any request to
+    the server. Aggregates are updated incrementally as new digests are
+    added; a digest added again for the same period replaces the previous
+    one.
+    Usage:
+        rollup = Rollup(BUCKET_MONTH)
+        rollup.add_all(buyer.hours.range(start, end).digests)
+        print rollup[datetime(2012, 5, 1)]['EUR'].average
+    '''
+    def __init__(self, bucket=BUCKET_DAY):
+        '''
+        Initializes a new instance of the Rollup class.
+        @param bucket:object BUCKET_DAY, BUCKET_WEEK, BUCKET_MONTH or a
+        callable returning the beginning of the bucket of a datetime.
+        '''
+        self.__bucket = bucket
+        self.__periods = {}  # bucket -> {period: {currency: metrics}}
+        self.__aggregates = {}  # bucket -> {currency: MetricsAggregate}
+
+    def __getitem__(self, start):
+        '''
+        Gets the metrics of a bucket by currency.
+        @param start:datetime Beginning of the bucket.
+        @return: dict
+        '''
+        return dict((currency, aggregate.to_metrics(currency))
+                    for currency, aggregate
+                    in self.__aggregates.get(start, {}).items())
+
+    def __contains__(self, start):
+        return start in self.__aggregates
+
+    def __len__(self):
+        return len(self.__aggregates)
+
+    @property
+    def buckets(self):
+        '''
+        Gets the beginning of the buckets covered, in chronological order.
+        @return: list
+        '''
+        return sorted(self.__aggregates)
+
+    def add(self, digest):
+        '''
+        Adds the digest of a period.
+        @param digest:TimespanDigest Digest to merge, or None.
+        @return: datetime Beginning of the bucket updated.
+        '''
+        if digest is None:
+            return None
+
+        period = digest.datetime
+        start = bucket_start(period, self.__bucket)
+        metrics = dict((currency.upper(), digest.get_currency_metrics(currency))
+                       for currency in (digest.available_currencies or []))
+
+        periods = self.__periods.setdefault(start, {})
+        replaced = period in periods
+        periods[period] = metrics
+        if replaced:
+            self.__aggregates[start] = self.__merge(periods.values())
+            return start
+
+        aggregates = self.__aggregates.setdefault(start, {})
+        for currency, currency_metrics in metrics.items():
+            if currency not in aggregates:
+                aggregates[currency] = MetricsAggregate()
+            aggregates[currency].add(currency_metrics)
+        return start
+
+    def add_all(self, digests):
+        '''
+        Adds the digests of several periods.
+        @param digests:iterable TimespanDigest instances.
+        '''
+        for digest in digests:
+            self.add(digest)
+
+    def get(self, start, currency_code):
+        '''
+        Gets the metrics of a bucket in a currency.
+        @param start:datetime Beginning of the bucket.
+        @param currency_code:str Currency code.
+        @return: CurrencyMetrics or None
+        '''
+        aggregate = self.__aggregates.get(start, {}).get(currency_code.upper())
+        return aggregate.to_metrics(currency_code.upper()) if aggregate else None
+
+    def __merge(self, periods):
+        '''
+        Recomputes the aggregates of a bucket from its periods.
+        @param periods:list Metrics by currency of each period.
+        @return: dict
+        '''
+        aggregates = {}
+        for metrics in periods:
+            for currency, currency_metrics in metrics.items():
+                if currency not in aggregates:
+                    aggregates[currency] = MetricsAggregate()
+                aggregates[currency].add(currency_metrics)
+        return aggregates
+
+
+class AnalyticsTable(object):
+    '''
+    Represents the analytics of many entities (buyers, sellers) as a compact
+    table with one row per entity and currency, and one column of doubles
+    per metric.
+    '''
+    def __init__(self, entries, currencies=None):
+        '''
+        Initializes a new instance of the AnalyticsTable class.
+        @param entries:iterable AnalyticsBase instances, already loaded.
+        @param currencies:list Currencies to include. Defaults to all.
+        '''
+        wanted = set(c.upper() for c in currencies) if currencies else None
+        self.__entries = []
+        self.__currencies = []
+        currency_index = {}
+        self.__entry_column = array('i')
+        self.__currency_column = array('i')
+        self.__columns = dict((metric, array('d')) for metric in METRICS)
+
+        for entry in entries:
+            available = entry.available_currencies or []
+            self.__entries.append(entry)
+            for currency in sorted(c.upper() for c in available):
+                if wanted is not None and currency not in wanted:
+                    continue
+                if currency not in currency_index:
+                    currency_index[currency] = len(self.__currencies)
+                    self.__currencies.append(currency)
+
+                metrics = entry.get_currency_metrics(currency)
+                self.__entry_column.append(len(self.__entries) - 1)
+                self.__currency_column.append(currency_index[currency])
+                for metric in METRICS:
+                    self.__columns[metric].append(
+                        float(_field(metrics, metric) or 0.0))
+
+    def __len__(self):
+        return len(self.__entry_column)
+
+    def __iter__(self):
+        '''
+        Iterates over the rows as (entry, currency, {metric: value}) tuples.
+        '''
+        for i in xrange(len(self)):
+            yield self.row(i)
+
+    @property
+    def entries(self):
+        '''
+        Gets the entities of the table.
+        @return: list
+        '''
+        return self.__entries
+
+    @property
+    def currencies(self):
+        '''
+        Gets the currencies found in the table.
+        @return: list
+        '''
+        return self.__currencies
+
+    def row(self, index):
+        '''
+        Gets a row.
+        @param index:int Index of the row.
+        @return: tuple (entry, currency, {metric: value})
+        '''
+        return (self.__entries[self.__entry_column[index]],
+                self.__currencies[self.__currency_column[index]],
+                dict((metric, column[index])
+                     for metric, column in self.__columns.items()))
+
+    def column(self, metric):
+        '''
+        Gets the values of a metric for every row. The array exposes the
+        buffer interface, so numpy.frombuffer() wraps it without copy.
+        @param metric:str One of METRICS.
+        @return: array
+        '''
+        if metric not in self.__columns:
+            raise ValueError('Unknown metric ' + metric)
+        return self.__columns[metric]
+
+    def sort(self, metric, currency=None, reverse=True):
+        '''
+        Gets the rows sorted by a metric.
+        @param metric:str One of METRICS.
+        @param currency:str Only include the rows in this currency.
+        @param reverse:bool Sort from the largest to the smallest value.
+        @return: list Row tuples.
+        '''
+        column = self.column(metric)
+        indexes = xrange(len(self))
+        if currency:
+            if currency.upper() not in self.__currencies:
+                return []
+            code = self.__currencies.index(currency.upper())
+            indexes = [i for i in indexes if self.__currency_column[i] == code]
+
+        return [self.row(i) for i in sorted(indexes, key=column.__getitem__,
+                                            reverse=reverse)]
+
+    def top(self, count, metric, currency=None):
+        '''
+        Gets the rows with the largest values of a metric.
+        @param count:int Number of rows.
+        @param metric:str One of METRICS.
+        @param currency:str Only include the rows in this currency.
+        @return: list Row tuples.
+        '''
+        return self.sort(metric, currency)[:count]
+
+    def totals(self, metric):
+        '''
+        Gets the sum of a metric by currency.
+        @param metric:str One of METRICS.
+        @return: dict
+        '''
+        totals = dict((currency, 0.0) for currency in self.__currencies)
+        column = self.column(metric)
+        for i in xrange(len(self)):
+            totals[self.__currencies[self.__currency_column[i]]] += column[i]
+        return totals
@@ -27,6 +27,17 @@ def to_byte_string(text):
     return text.encode("UTF-8") if type(text) == unicode else str(text)
 
 
+def quote_plus(text):
+    '''
+    Quotes a text to be used in a query string. urllib is only imported
+    when it is first needed, as it loads the socket and ssl modules.
+    @param text:str Input text
+    @return: str
+    '''
+    import urllib
+    return urllib.quote_plus(text)
+
+
 def is_valid_email(s):
     '''
     Returns a value indicating whether the submitted string is a valid
@@ -0,0 +1,550 @@
+# -*- coding: utf-8 -*-
+import time
+import base64
+import urllib
+import urllib2
+import httplib
+import urlparse
+import threading
+from gzip import GzipFile
+from StringIO import StringIO
+from greendizer.clients import http, transport
+from greendizer.clients.concurrency import run_concurrently
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+
+__all__ = ('CassetteError', 'Interaction', 'Cassette', 'Recorder', 'Player')
+
+
+FORMAT_VERSION = 1
+REDACTED = 'REDACTED'
+SCRUBBED_HEADERS = frozenset(['authorization', 'proxy-authorization',
+                              'cookie', 'set-cookie'])
+SCRUBBED_PARAMETERS = frozenset(['access_token', 'oauth_token', 'password',
+                                 'client_secret', 'refresh_token'])
+# Headers identical for every request, left out of the cassettes.
+_CONSTANT_HEADERS = frozenset(['accept', 'accept-encoding', 'user-agent',
+                               'cache-control', 'content-length', 'host',
+                               'connection'])
+# Headers set by Request itself, which are not copied on replay.
+_GENERATED_HEADERS = frozenset(['accept', 'accept-encoding', 'user-agent',
+                                'cache-control', 'content-type',
+                                'content-encoding', 'content-length',
+                                'x-http-method-override', 'host',
+                                'connection'] + list(SCRUBBED_HEADERS))
+
+
+class CassetteError(Exception):
+    '''
+    Represents the exception raised when a request played back has not
+    been recorded.
+    '''
+    pass
+
+
+def _scrub_query(query):
+    '''
+    Replaces the values of the credentials found in a query string.
+    @param query:str
+    @return: str
+    '''
+    if not query:
+        return query
+
+    pairs = urlparse.parse_qsl(query, keep_blank_values=True)
+    if not any(name.lower() in SCRUBBED_PARAMETERS for name, _ in pairs):
+        return query
+
+    return urllib.urlencode([(name, REDACTED if name.lower() in
+                              SCRUBBED_PARAMETERS else value)
+                             for name, value in pairs])
+
+
+def _relative_uri(url):
+    '''
+    Gets the URI of a request relative to the root of the API, with the
+    credentials scrubbed, so that cassettes do not depend on the host they
+    were recorded against.
+    @param url:str Absolute URL.
+    @return: str
+    '''
+    if url.startswith(http.API_ROOT):
+        url = '/' + url[len(http.API_ROOT):]
+    parts = urlparse.urlsplit(url)
+    query = _scrub_query(parts.query)
+    return parts.path.lstrip('/') + ('?' + query if query else '')
+
+
+def _scrub_headers(headers):
+    '''
+    Replaces the values of the headers carrying credentials.
+    @param headers:list (name, value) tuples.
+    @return: list
+    '''
+    return [[name, REDACTED if name.lower() in SCRUBBED_HEADERS else value]
+            for name, value in headers]
+
+
+def _header(headers, name):
+    '''
+    Gets the value of a header.
+    @param headers:list (name, value) pairs.
+    @param name:str Header name, case insensitive.
+    @return: str or None
+    '''
+    name = name.lower()
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+
+
+def _method(request):
+    '''
+    Gets the HTTP method of a urllib2 request, before any override.
+    @param request:urllib2.Request
+    @return: str
+    '''
+    return (_header(request.header_items(), 'X-HTTP-Method-Override') or
+            request.get_method()).upper()
+
+
+def _encode_body(data, key):
+    '''
+    Serializes a body, as text when possible.
+    @param data:str
+    @param key:str Name of the field.
+    @return: dict
+    '''
+    if not data:
+        return {}
+    try:
+        return {key: data.decode('utf-8')}
+    except UnicodeDecodeError:
+        return {key + '_base64': base64.b64encode(data)}
+
+
+def _decode_body(data, key):
+    '''
+    Deserializes a body.
+    @param data:dict
+    @param key:str Name of the field.
+    @return: str
+    '''
+    if key + '_base64' in data:
+        return base64.b64decode(data[key + '_base64'])
+    return (data.get(key) or u'').encode('utf-8')
+
+
+class Interaction(object):
+    '''
+    Represents a request and the response received, as recorded.
+    '''
+    __slots__ = ('method', 'uri', 'request_headers', 'request_body',
+                 'status_code', 'reason', 'headers', 'body', 'started',
+                 'elapsed')
+
+    def __init__(self, method, uri, request_headers, request_body,
+                 status_code, reason, headers, body, started=0.0,
+                 elapsed=0.0):
+        '''
+        Initializes a new instance of the Interaction class.
+        @param method:str HTTP method, before any override.
+        @param uri:str URI relative to the root of the API.
+        @param request_headers:list (name, value) pairs of the request.
+        @param request_body:str Uncompressed body of the request.
+        @param status_code:int Status code of the response.
+        @param reason:str Reason phrase of the response.
+        @param headers:list (name, value) pairs of the response.
+        @param body:str Body of the response, as received.
+        @param started:float Number of seconds between the beginning of the
+        recording and the request.
+        @param elapsed:float Number of seconds the response took.
+        '''
+        self.method = method.upper()
+        self.uri = uri
+        self.request_headers = request_headers
+        self.request_body = request_body
+        self.status_code = status_code
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+        self.started = started
+        self.elapsed = elapsed
+
+    @property
+    def key(self):
+        '''
+        Gets the key under which the interaction is played back. Pages of
+        collections are told apart by their range.
+        @return: tuple
+        '''
+        return (self.method, self.uri,
+                self.header('Range', self.request_headers))
+
+    def header(self, name, headers=None):
+        '''
+        Gets the value of a header of the request or of the response.
+        @param name:str Header name.
+        @param headers:list Headers to look into. Defaults to the response's.
+        @return: str or None
+        '''
+        return _header(self.headers if headers is None else headers, name)
+
+    def to_dict(self):
+        '''
+        Gets a serializable version of the interaction.
+        @return: dict
+        '''
+        data = {'method': self.method,
+                'uri': self.uri,
+                'request_headers': self.request_headers,
+                'status_code': self.status_code,
+                'reason': self.reason,
+                'headers': self.headers,
+                'started': round(self.started, 6),
+                'elapsed': round(self.elapsed, 6)}
+        data.update(_encode_body(self.request_body, 'request_body'))
+        data.update(_encode_body(self.body, 'body'))
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        '''
+        Creates an interaction from its serialized version.
+        @param data:dict
+        @return: Interaction
+        '''
+        return cls(data['method'], data['uri'], data['request_headers'],
+                   _decode_body(data, 'request_body'), data['status_code'],
+                   data['reason'], data['headers'], _decode_body(data, 'body'),
+                   data.get('started', 0.0), data.get('elapsed', 0.0))
+
+    def to_response(self, url):
+        '''
+        Creates the urllib2 response of the interaction.
+        @param url:str URL requested.
+        @return: urllib.addinfourl
+        '''
+        info = httplib.HTTPMessage(StringIO(''.join(
+                    '%s: %s\r\n' % (name, value)
+                    for name, value in self.headers) + '\r\n'))
+        response = urllib.addinfourl(StringIO(self.body), info, url,
+                                     self.status_code)
+        response.msg = self.reason
+        return response
+
+
+class _Installable(urllib2.BaseHandler, object):
+    '''
+    Base class of the handlers added to the opener of the transport, on top
+    of the handlers already installed there, such as a PooledHandler.
+    '''
+    handler_order = 100  # Before the error and redirection processors
+
+    def install(self):
+        '''
+        Sends the requests of the library through the handler.
+        @return: object
+        '''
+        transport.add_handler(self)
+        return self
+
+    def uninstall(self):
+        '''
+        Stops sending the requests of the library through the handler.
+        '''
+        transport.remove_handler(self)
+
+    def __enter__(self):
+        return self.install()
+
+    def __exit__(self, *exc_info):
+        self.uninstall()
+        return False
+
+
+class Recorder(_Installable):
+    '''
+    Records the requests sent by the library and the responses received,
+    with the credentials scrubbed.
+    Usage:
+        with cassette.record():
+            client.seller.emails['e1'].invoices.search().retrieve_all()
+        cassette.save('workload.cassette')
+    '''
+    def __init__(self, cassette):
+        '''
+        Initializes a new instance of the Recorder class.
+        @param cassette:Cassette Cassette on which interactions are recorded.
+        '''
+        super(Recorder, self).__init__()
+        self.cassette = cassette
+        self.__origin = None
+        self.__lock = threading.Lock()
+
+    def __start(self, request):
+        now = time.time()
+        with self.__lock:
+            if self.__origin is None:
+                self.__origin = now - (self.cassette.duration or 0.0)
+        request.cassette_started = now
+        return request
+
+    def __record(self, request, response):
+        now = time.time()
+        headers = [h for h in request.header_items()
+                   if h[0].lower() not in _CONSTANT_HEADERS]
+        body = request.get_data()
+        for name, value in headers:
+            if name.lower() == 'content-encoding' and value == 'gzip':
+                body = GzipFile(fileobj=StringIO(body)).read()
+                headers = [h for h in headers
+                           if h[0].lower() != 'content-encoding']
+
+        content = response.read()
+        if body and request.get_header('Content-type', '').startswith(
+                            'application/x-www-form-urlencoded'):
+            body = _scrub_query(body)
+
+        started = request.cassette_started
+        self.cassette.append(Interaction(
+                    _method(request), _relative_uri(request.get_full_url()),
+                    _scrub_headers(headers), body, response.getcode(),
+                    response.msg,
+                    _scrub_headers([line.rstrip('\r\n').split(': ', 1)
+                                    for line in response.info().headers
+                                    if ': ' in line]),
+                    content, started - self.__origin, now - started))
+
+        recorded = urllib.addinfourl(StringIO(content), response.info(),
+                                     response.geturl(), response.getcode())
+        recorded.msg = response.msg
+        return recorded
+
+    def http_request(self, request):
+        return self.__start(request)
+
+    def http_response(self, request, response):
+        return self.__record(request, response)
+
+    https_request = http_request
+    https_response = http_response
+
+
+class Player(_Installable):
+    '''
+    Serves the requests of the library from a cassette instead of the
+    network. Requests recorded several times are answered in the order of
+    the recording, the last response being repeated once they are used up.
+    Requests which were not recorded raise a CassetteError, unless the
+    player lets them pass through to the network.
+    Usage:
+        with Cassette.load('workload.cassette').play(speed=2):
+            client.seller.emails['e1'].invoices.search().retrieve_all()
+    '''
+    def __init__(self, cassette, speed=None, passthrough=False):
+        '''
+        Initializes a new instance of the Player class.
+        @param cassette:Cassette Cassette to play.
+        @param speed:float Factor by which the recorded response times are
+        divided. Responses are served without delay if None.
+        @param passthrough:bool Whether to send the requests which were not
+        recorded to the network rather than raising a CassetteError.
+        '''
+        super(Player, self).__init__()
+        self.cassette = cassette
+        self.speed = speed
+        self.passthrough = passthrough
+        self.__lock = threading.Lock()
+        self.__queues = {}
+        self.__last = {}
+        for interaction in cassette:
+            self.__queues.setdefault(interaction.key, []).append(interaction)
+        for queue in self.__queues.values():
+            queue.reverse()
+
+    def __next(self, key):
+        '''
+        Gets the next interaction recorded for a key.
+        @param key:tuple
+        @return: Interaction or None
+        '''
+        with self.__lock:
+            queue = self.__queues.get(key)
+            if queue:
+                self.__last[key] = queue.pop()
+            return self.__last.get(key)
+
+    def __play(self, request):
+        url = request.get_full_url()
+        key = (_method(request), _relative_uri(url),
+               _header(request.header_items(), 'Range'))
+        interaction = self.__next(key)
+        if not interaction:
+            if not self.passthrough:
+                raise CassetteError('No recorded response to %s %s (range: '
+                                    '%s)' % key)
+            return None
+
+        if self.speed and interaction.elapsed:
+            time.sleep(interaction.elapsed / self.speed)
+        return interaction.to_response(url)
+
+    def http_open(self, request):
+        return self.__play(request)
+
+    https_open = http_open
+
+
+class Cassette(object):
+    '''
+    Represents a sequence of recorded requests and responses, used to
+    reproduce a production workload without the live service.
+    '''
+    def __init__(self, interactions=None):
+        '''
+        Initializes a new instance of the Cassette class.
+        @param interactions:list Interaction instances.
+        '''
+        self.__interactions = list(interactions or [])
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.__interactions)
+
+    def __iter__(self):
+        return iter(list(self.__interactions))
+
+    def __getitem__(self, index):
+        return self.__interactions[index]
+
+    @property
+    def duration(self):
+        '''
+        Gets the number of seconds between the first request recorded and
+        the end of the last response.
+        @return: float
+        '''
+        return max([i.started + i.elapsed for i in self.__interactions] or
+                   [0.0])
+
+    def append(self, interaction):
+        '''
+        Adds an interaction to the cassette.
+        @param interaction:Interaction
+        '''
+        with self.__lock:
+            self.__interactions.append(interaction)
+
+    def record(self):
+        '''
+        Returns a recorder to enter as a context manager so that the
+        requests sent within it are recorded on this cassette.
+        @return: Recorder
+        '''
+        return Recorder(self)
+
+    def play(self, speed=None, passthrough=False):
+        '''
+        Returns a player to enter as a context manager so that the requests
+        sent within it are answered from this cassette.
+        @param speed:float Factor by which the recorded response times are
+        divided. Responses are served without delay if None.
+        @param passthrough:bool Whether to send the requests which were not
+        recorded to the network rather than raising a CassetteError.
+        @return: Player
+        '''
+        return Player(self, speed, passthrough)
+
+    def replay(self, client=None, speed=None, max_workers=1, callback=None):
+        '''
+        Sends the recorded requests again through the library, answered
+        from the cassette, following the timing of the recording.
+        @param client:Client Client signing the requests, if any.
+        @param speed:float Factor by which the recorded timings are divided.
+        Requests are sent as fast as possible if None.
+        @param max_workers:int Maximum number of requests sent at once.
+        @param callback:function Callable notified with every Outcome.
+        @return: list Outcome instances, whose values are Responses.
+        '''
+        interactions = sorted(self, key=lambda i: i.started)
+        started = time.time()
+
+        def send(interaction):
+            if speed:
+                delay = started + interaction.started / speed - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+            return self.__send(client, interaction)
+
+        with self.play(speed):
+            return run_concurrently(send, interactions, max_workers,
+                                    callback)
+
+    def __send(self, client, interaction):
+        '''
+        Sends the request of an interaction.
+        @param client:Client
+        @param interaction:Interaction
+        @return: Response
+        '''
+        content_type = (interaction.header('Content-type',
+                                           interaction.request_headers) or
+                        'application/x-www-form-urlencoded').split(';')[0]
+        data = interaction.request_body or None
+        if data and content_type == 'application/x-www-form-urlencoded':
+            data = urlparse.parse_qsl(data, keep_blank_values=True)
+
+        request = http.Request(client, interaction.method.lower(),
+                               interaction.uri, data, content_type)
+        for name, value in interaction.request_headers:
+            if name.lower() not in _GENERATED_HEADERS:
+                request[name] = value
+        return request.get_response()
+
+    def to_dict(self):
+        '''
+        Gets a serializable version of the cassette.
+        @return: dict
+        '''
+        return {'version': FORMAT_VERSION,
+                'interactions': [i.to_dict() for i in self]}
+
+    @classmethod
+    def from_dict(cls, data):
+        '''
+        Creates a cassette from its serialized version.
+        @param data:dict
+        @return: Cassette
+        '''
+        if data.get('version') != FORMAT_VERSION:
+            raise CassetteError('Unsupported cassette version %s' %
+                                data.get('version'))
+        return cls([Interaction.from_dict(i) for i in data['interactions']])
+
+    def save(self, path):
+        '''
+        Writes the cassette to a gzipped JSON file.
+        @param path:str
+        '''
+        f = GzipFile(path, 'wb')
+        try:
+            json.dump(self.to_dict(), f, separators=(',', ':'))
+        finally:
+            f.close()
+
+    @classmethod
+    def load(cls, path):
+        '''
+        Reads a cassette from a gzipped JSON file.
+        @param path:str
+        @return: Cassette
+        '''
+        f = GzipFile(path, 'rb')
+        try:
+            return cls.from_dict(json.load(f))
+        finally:
+            f.close()
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import time
+import threading
+from Queue import Queue, Empty
+from greendizer.clients.http import (Deadline, Channel, deadline_scope,
+                                     channel_scope)
+
+
+__all__ = ('Outcome', 'RateLimiter', 'CallSite', 'start_thread',
+           'run_concurrently', 'map_concurrently')
+
+
+DEFAULT_MAX_WORKERS = 8
+_PACKAGE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+_THREADING_MODULE = os.path.splitext(os.path.abspath(threading.__file__))[0]
+_local = threading.local()
+
+
+class CallSite(object):
+    '''
+    Represents the location of the code calling into the library.
+    '''
+    __slots__ = ('filename', 'lineno', 'function', 'module_globals')
+
+    def __init__(self, frame):
+        '''
+        Initializes a new instance of the CallSite class.
+        @param frame:frame Frame of the calling code.
+        '''
+        self.filename = frame.f_code.co_filename
+        self.lineno = frame.f_lineno
+        self.function = frame.f_code.co_name
+        self.module_globals = frame.f_globals
+
+    def __str__(self):
+        return '%s:%d in %s' % (self.filename, self.lineno, self.function)
+
+    @classmethod
+    def current(cls):
+        '''
+        Gets the innermost frame of the stack which belongs neither to the
+        library nor to the threading module. In a thread started by the
+        library, the code which started it is used if there is none.
+        @return: CallSite or None
+        '''
+        frame = sys._getframe(1)
+        while frame:
+            path = os.path.abspath(frame.f_code.co_filename)
+            if not (path.startswith(_PACKAGE_DIRECTORY) or
+                    os.path.splitext(path)[0] == _THREADING_MODULE):
+                return cls(frame)
+            frame = frame.f_back
+        return getattr(_local, 'call_site', None)
+
+
+def start_thread(target, name=None):
+    '''
+    Starts a daemon thread on behalf of the calling code, which becomes the
+    call site of the thread (see CallSite.current).
+    @param target:function Callable run by the thread.
+    @param name:str Name of the thread.
+    @return: threading.Thread
+    '''
+    call_site = CallSite.current()
+
+    def run():
+        _local.call_site = call_site
+        target()
+
+    thread = threading.Thread(target=run, name=name)
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+class Outcome(object):
+    '''
+    Represents the result of an operation run on an item.
+    '''
+    __slots__ = ('item', 'value', 'error', 'traceback')
+
+    def __init__(self, item, value=None, error=None, traceback=None):
+        '''
+        Initializes a new instance of the Outcome class.
+        @param item:object Item on which the operation was run.
+        @param value:object Value returned by the operation.
+        @param error:Exception Exception raised by the operation.
+        @param traceback:traceback Traceback of the exception.
+        '''
+        self.item = item
+        self.value = value
+        self.error = error
+        self.traceback = traceback
+
+    @property
+    def failed(self):
+        '''
+        Gets a value indicating whether the operation raised an exception.
+        @return: bool
+        '''
+        return self.error is not None
+
+    def get(self):
+        '''
+        Returns the value of the operation or raises its exception.
+        @return: object
+        '''
+        if self.error is not None:
+            raise self.error.__class__, self.error, self.traceback
+        return self.value
+
+
+class RateLimiter(object):
+    '''
+    Limits the rate of an operation with a token bucket: bursts of up to
+    'burst' calls go through at once, then calls are spaced to respect the
+    rate. A limiter can be shared by several threads.
+    '''
+    def __init__(self, rate, burst=None):
+        '''
+        Initializes a new instance of the RateLimiter class.
+        @param rate:float Number of calls allowed per second.
+        @param burst:int Number of calls allowed at once. Defaults to one
+        second worth of calls.
+        '''
+        self.rate = float(rate)
+        self.burst = max(burst or int(self.rate), 1)
+        self.__tokens = float(self.burst)
+        self.__updated = time.time()
+        self.__lock = threading.Lock()
+
+    def acquire(self):
+        '''
+        Waits until a call is allowed.
+        @return: float Number of seconds waited.
+        '''
+        waited = 0.0
+        while True:
+            with self.__lock:
+                now = time.time()
+                self.__tokens = min(self.burst, self.__tokens +
+                                    (now - self.__updated) * self.rate)
+                self.__updated = now
+                if self.__tokens >= 1:
+                    self.__tokens -= 1
+                    return waited
+                delay = (1 - self.__tokens) / self.rate
+
+            time.sleep(delay)
+            waited += delay
+
+
+def run_concurrently(func, items, max_workers=DEFAULT_MAX_WORKERS,
+                     callback=None):
+    '''
+    Calls a function on every item from a pool of threads. The deadline and
+    the channel entered by the calling thread, if any, apply to the workers.
+    @param func:function Callable taking an item.
+    @param items:iterable Items.
+    @param max_workers:int Maximum number of threads.
+    @param callback:function Callable notified with every Outcome as soon
+    as it is available. Calls are serialized. An exception it raises becomes
+    the outcome of the item.
+    @return: list Outcome instances, in the order of the items.
+    '''
+    items = list(items)
+    outcomes = [None] * len(items)
+    deadline = Deadline.current()
+    channel = Channel.current()
+    lock = threading.Lock()
+    queue = Queue()
+    for index in xrange(len(items)):
+        queue.put(index)
+
+    def work():
+        with deadline_scope(deadline), channel_scope(channel):
+            while True:
+                try:
+                    index = queue.get_nowait()
+                except Empty:
+                    return
+
+                item = items[index]
+                try:
+                    outcome = Outcome(item, func(item))
+                except(Exception), e:
+                    outcome = Outcome(item, error=e,
+                                      traceback=sys.exc_info()[2])
+
+                outcomes[index] = outcome
+                if callback:
+                    try:
+                        with lock:
+                            callback(outcome)
+                    except(Exception), e:
+                        # The worker carries on with the next items.
+                        outcomes[index] = Outcome(item, error=e,
+                                                  traceback=sys.exc_info()[2])
+
+    workers = min(max_workers or 1, len(items))
+    if workers <= 1:
+        work()
+        return outcomes
+
+    threads = [start_thread(work) for _ in xrange(workers)]
+    for thread in threads:
+        thread.join()
+
+    return outcomes
+
+
+def map_concurrently(func, items, max_workers=DEFAULT_MAX_WORKERS):
+    '''
+    Calls a function on every item from a pool of threads and returns the
+    values in the order of the items. The first exception raised, if any,
+    is re-raised once every item has been processed.
+    @param func:function Callable taking an item.
+    @param items:iterable Items.
+    @param max_workers:int Maximum number of threads.
+    @return: list
+    '''
+    return [outcome.get()
+            for outcome in run_concurrently(func, items, max_workers)]
@@ -1,10 +1,124 @@
 # -*- coding: utf-8 -*-
-import urllib
+import warnings
+import threading
 from datetime import datetime, date
-from greendizer.clients.http import Request, Etag, Range, ApiError
-from greendizer.clients.base import timestamp_to_datetime, datetime_to_timestamp
+from greendizer.clients.http import (Request, Etag, Range, ApiError,
+                                     deadline_scope)
+from greendizer.clients.base import (timestamp_to_datetime,
+                                     datetime_to_timestamp, quote_plus)
+from greendizer.clients.concurrency import (run_concurrently, CallSite,
+                                            DEFAULT_MAX_WORKERS)
 
 RESPONSE_SIZE_LIMIT = 200
+_IDENTITY_FIELDS = 'etag'  # Smallest projection listing the resources
+CONFLICT_SKIP = 'skip'
+CONFLICT_REFRESH = 'refresh'
+CONFLICT_FORCE = 'force'
+LAZY_LOADING_ALLOW = 'allow'
+LAZY_LOADING_WARN = 'warn'
+LAZY_LOADING_STRICT = 'strict'
+LAZY_LOADING_MODES = (LAZY_LOADING_ALLOW, LAZY_LOADING_WARN,
+                      LAZY_LOADING_STRICT)
+
+
+def _format_call_site(site):
+    '''
+    Gets a short description of a call site.
+    @param site:CallSite
+    @return: str
+    '''
+    return str(site) if site else '<unknown>'
+
+
+class Projection(object):
+    '''
+    Represents the fields of a resource requested from the server: either
+    a list of fields, or every field but a list of excluded ones.
+    '''
+    __slots__ = ('included', 'excluded')
+
+    def __init__(self, included=None, excluded=()):
+        '''
+        Initializes a new instance of the Projection class.
+        @param included:iterable Names of the fields included. Every field
+        but the excluded ones if None.
+        @param excluded:iterable Names of the fields excluded.
+        '''
+        self.included = frozenset(included) if included is not None else None
+        self.excluded = frozenset(excluded) if included is None else frozenset()
+
+    @classmethod
+    def parse(cls, fields):
+        '''
+        Creates a projection from the value of a 'fields' parameter.
+        @param fields:str|list Comma-separated list, or list, of fields to
+        request. Fields prefixed by '-' are excluded, in which case every
+        field must be.
+        @return: Projection or None if every field is requested.
+        '''
+        if isinstance(fields, Projection) or not fields:
+            return fields or None
+        if isinstance(fields, basestring):
+            fields = fields.split(',')
+        fields = [field.strip() for field in fields if field.strip()]
+        excluded = [field[1:] for field in fields if field.startswith('-')]
+        if excluded and len(excluded) < len(fields):
+            raise ValueError('Fields cannot be both included and excluded: '
+                             '%s' % ','.join(fields))
+        if excluded:
+            return cls(excluded=excluded)
+        return cls(fields) if fields else None
+
+    def covers(self, name):
+        '''
+        Gets a value indicating whether a field is part of the projection.
+        @param name:str Field name.
+        @return: bool
+        '''
+        if self.included is None:
+            return name not in self.excluded
+        return name in self.included
+
+    def merge(self, other):
+        '''
+        Gets the projection covering the fields of two projections.
+        @param other:Projection Projection, or None for every field.
+        @return: Projection or None if every field is covered.
+        '''
+        if other is None:
+            return None
+        if self.included is not None and other.included is not None:
+            return Projection(self.included | other.included)
+        if self.included is None and other.included is None:
+            return Projection(excluded=self.excluded & other.excluded) \
+                   if self.excluded & other.excluded else None
+        included, excluded = ((self.included, other.excluded)
+                              if self.included is not None
+                              else (other.included, self.excluded))
+        return Projection(excluded=excluded - included) \
+               if excluded - included else None
+
+    def __str__(self):
+        '''
+        Gets the value of the 'fields' parameter requesting the projection.
+        @return: str
+        '''
+        if self.included is None:
+            return ','.join('-' + name for name in sorted(self.excluded))
+        return ','.join(sorted(self.included))
+
+
+def _with_fields(uri, fields):
+    '''
+    Adds the 'fields' parameter to a URI.
+    @param uri:str
+    @param fields:Projection Projection, or None for every field.
+    @return: str
+    '''
+    if not fields:
+        return uri
+    return (uri + ('&' if '?' in uri else '?') + 'fields=' +
+            quote_plus(str(fields)))
 
 
 class ResourceDeletedException(Exception):
@@ -15,6 +129,22 @@ class ResourceDeletedException(Exception):
     pass
 
 
+class ImplicitLoadError(Exception):
+    '''
+    Represents the exception raised in strict lazy loading mode when an
+    attribute of a resource is read before the resource was loaded.
+    '''
+    pass
+
+
+class ImplicitLoadWarning(UserWarning):
+    '''
+    Represents the warning issued in warning lazy loading mode when an
+    attribute of a resource is read before the resource was loaded.
+    '''
+    pass
+
+
 class ResourceConflictException(Exception):
     '''
     Represents the exception raised if a resource could not be
@@ -38,9 +168,10 @@ class ResourceConflictException(Exception):
 
     def refresh(self):
         '''
-        Refreshes the resource.
+        Refreshes the resource. The version loaded is out of date, so it is
+        not sent along.
         '''
-        self.__resource.load()
+        self.__resource.load(conditional=False)
 
     def force(self):
         '''
@@ -54,8 +185,14 @@ class ResourceConflictException(Exception):
 
 class Resource(object):
     '''
-    Represents a generic resource
+    Represents a generic resource.
+    Resources can be shared between threads: the changes made to their
+    representation and to the stack of updates are serialized. Implicit
+    loads are serialized apart, so that a load waiting for the server
+    does not block the threads changing the resource.
     '''
+    route = None  # Name of the route of the resource in routes.ROUTER
+
     def __init__(self, client, identifier='0'):
         '''
         Initializes a new instance of the Resource class.
@@ -67,7 +204,10 @@ class Resource(object):
         self.__last_modified = datetime(1970, 1, 1)
         self.__raw_data = {}
         self.__raw_updates = {}
+        self.__projection = None
         self.__deleted = False
+        self.__lock = threading.RLock()
+        self.__load_lock = threading.Lock()
 
     def _get_date_attribute(self, name):
         '''
@@ -90,10 +230,50 @@ class Resource(object):
             raise ResourceDeletedException()
 
         if not len(self.__raw_data):  # What a lazy ass...
-            self.load()
+            with self.__load_lock:
+                if not len(self.__raw_data):  # Loaded by another thread?
+                    self.__load_implicitly(name)
+
+        elif self.__projection and not self.__projection.covers(name):
+            with self.__load_lock:
+                projection = self.__projection
+                if projection and not projection.covers(name):
+                    self.__load_implicitly(name, Projection([name]))
 
         return self.__raw_data.get(name, None)
 
+    def __load_implicitly(self, name, fields=None):
+        '''
+        Loads the resource because one of its attributes was read, after
+        recording, reporting or refusing it depending on the lazy loading
+        mode of the client.
+        @param name:str Name of the attribute read.
+        @param fields:Projection Fields to load. Defaults to all.
+        '''
+        site = CallSite.current()
+        stats = getattr(self.__client, 'stats', None)
+        if stats:
+            stats.record_lazy_load(self, _format_call_site(site))
+
+        mode = getattr(self.__client, 'lazy_loading', LAZY_LOADING_ALLOW)
+        if mode != LAZY_LOADING_ALLOW:
+            # The ID is left out of warnings so that the default filter
+            # reports a loop once.
+            message = ('%s loaded implicitly to read \'%s\' at %s. Load it '
+                       'or retrieve its collection beforehand.' %
+                       (type(self).__name__, name, _format_call_site(site)))
+            if mode == LAZY_LOADING_STRICT:
+                raise ImplicitLoadError('%s (ID: %s)' % (message, self.__id))
+            if site:
+                warnings.warn_explicit(message, ImplicitLoadWarning,
+                                       site.filename, site.lineno,
+                                       registry=site.module_globals.setdefault(
+                                                '__warningregistry__', {}))
+            else:
+                warnings.warn(message, ImplicitLoadWarning)
+
+        self.load(fields=fields)
+
     def _set_attribute(self, name, value):
         '''
         Sets the value of an internal attribute.
@@ -107,9 +287,10 @@ class Resource(object):
         if isinstance(value, datetime) or isinstance(value, date):
             value = str(datetime_to_timestamp(value))
 
-        if self.__raw_data.get(name, None) != value:
-            self.__raw_data[name] = value
-            return True
+        with self.__lock:
+            if self.__raw_data.get(name, None) != value:
+                self.__raw_data[name] = value
+                return True
 
         return False
 
@@ -122,8 +303,13 @@ class Resource(object):
         if self.__deleted:
             raise ResourceDeletedException()
 
-        if self.__raw_data.get(attribute, None) != value:
-            self.__raw_updates[attribute] = value
+        with self.__lock:
+            if self.__raw_data.get(attribute, None) != value:
+                self.__raw_updates[attribute] = value
+
+        session = UpdateSession.current()
+        if session is not None:
+            session.add(self)
 
     @property
     def exists(self):
@@ -147,6 +333,23 @@ class Resource(object):
 
         return True
 
+    @property
+    def fields(self):
+        '''
+        Gets the fields loaded, the other ones being loaded when they are
+        read.
+        @return: Projection or None if every field is loaded.
+        '''
+        return self.__projection
+
+    @property
+    def has_updates(self):
+        '''
+        Gets a value indicating whether updates are waiting to be sent.
+        @return: bool
+        '''
+        return len(self.__raw_updates) > 0
+
     @property
     def created_date(self):
         '''
@@ -195,17 +398,41 @@ class Resource(object):
         '''
         raise NotImplementedError()
 
-    def sync(self, data, etag):
+    def sync(self, data, etag, fields=None, partial=False):
         '''
         Updates the current representation with another one.
         @param data:dict New representation
+        @param fields:Projection Fields of the new representation. Defaults
+        to all.
+        @param partial:bool A value indicating whether the new representation
+        only holds some attributes, like the echo of an update or the headers
+        of the resource. Its attributes are then added to the fields loaded.
         @return: bool A value indicating whether the representation has changed.
         '''
-        self.__last_modified = etag.last_modified
-        self.__id = etag.id
-        data.pop('etag', None)
-        return any([self._set_attribute(item, value)
-                    for item, value in data.items()])
+        fields = Projection.parse(fields)
+        with self.__lock:
+            if partial:
+                echoed = Projection.parse(data.keys())
+                if echoed and self.__projection:
+                    self.__projection = echoed.merge(self.__projection)
+                elif echoed and not len(self.__raw_data):
+                    self.__projection = echoed
+            elif not len(self.__raw_data):
+                self.__projection = fields
+            elif fields and etag.last_modified != self.__last_modified:
+                # The fields which were not reloaded are out of date.
+                self.__raw_data = {}
+                self.__projection = fields
+            elif fields and self.__projection:
+                self.__projection = fields.merge(self.__projection)
+            elif not fields:
+                self.__projection = None
+
+            self.__last_modified = etag.last_modified
+            self.__id = etag.id
+            data.pop('etag', None)
+            return any([self._set_attribute(item, value)
+                        for item, value in data.items()])
 
     def load_info(self):
         '''
@@ -213,25 +440,32 @@ class Resource(object):
         '''
         self.load(True)
 
-    def load(self, head=False):
+    def load(self, head=False, fields=None, conditional=True):
         '''
         Loads the resource.
         @param head:bool A value indicating whether to use the HEAD HTTP
         method.
+        @param fields:str|list Fields to load, or to exclude if prefixed by
+        '-'. The others are loaded when they are read. Defaults to all.
+        @param conditional:bool A value indicating whether to send the ETag
+        of the version loaded, if any.
         '''
         if self.__deleted:
             raise ResourceDeletedException()
 
-        request = Request(self.__client, uri=self.uri,
+        fields = Projection.parse(fields)
+        request = Request(self.__client, uri=_with_fields(self.uri, fields),
                           method=("HEAD" if head else "GET"))
 
-        if len(self.__raw_data):
+        if conditional and len(self.__raw_data) and not fields:
             request["If-Match"] = self.etag
             request["If-Unmodified-Since"] = self.etag.last_modified
 
         response = request.get_response()
         if response.status_code == 200:
-            self.sync({} if head else response.data, response["Etag"])
+            data = {} if head else response.data
+            with response.event.timing('sync'):
+                self.sync(data, response["Etag"], fields, partial=head)
 
     def update(self, prevent_conflicts=False):
         '''
@@ -243,11 +477,14 @@ class Resource(object):
         if self.__deleted:
             raise ResourceDeletedException()
 
-        if not len(self.__raw_updates):
+        with self.__lock:
+            updates = dict(self.__raw_updates)
+
+        if not len(updates):
             return
 
         request = Request(self.__client, method="PATCH",
-                          uri=self.uri, data=self.__raw_updates)
+                          uri=self.uri, data=updates)
 
         if prevent_conflicts:
             request["If-Match"] = self.etag
@@ -258,8 +495,13 @@ class Resource(object):
             raise ResourceConflictException(self, "PATCH")
 
         if response.status_code == 204:  # No-Content
-            self.sync(self.__raw_updates, response["Etag"])
-            self.__raw_updates = {}
+            with self.__lock:
+                self.sync(dict(updates), response["Etag"] or self.etag,
+                          partial=True)
+                # Keep the updates registered while the request was sent
+                for attribute, value in updates.items():
+                    if self.__raw_updates.get(attribute, value) == value:
+                        self.__raw_updates.pop(attribute, None)
 
     def delete(self, prevent_conflicts=False):
         '''
@@ -282,14 +524,18 @@ class Resource(object):
             raise ResourceConflictException(self, "DELETE")
 
         if response.status_code == 204:  # No-Content
-            self.__deleted = True
-            self.__raw_data = {}
-            self.__raw_updates = {}
+            with self.__lock:
+                self.__deleted = True
+                self.__raw_data = {}
+                self.__raw_updates = {}
 
 
 class Collection(object):
     '''
-    Represents a collection of resources
+    Represents a collection of resources.
+    The resources loaded are replaced all at once, so that threads iterating
+    over a collection while it is populated see either the previous or the
+    new contents.
     '''
     def __init__(self, node, uri, query=None):
         '''
@@ -300,17 +546,16 @@ class Collection(object):
         '''
         self.__node = node
         self.__query = query
-        self.__uri = uri + (("?q=" + urllib.quote_plus(query)) if query else "")
+        self.__uri = uri + (("?q=" + quote_plus(query)) if query else "")
         self.__content_range = None
         self.__etag = Etag(datetime(1970, 1, 1), 0)
-        self.__resources = {}
-        self.__list = []
+        self.__contents = ({}, [])  # (Resources by ID, ordered resources)
 
     def __iter__(self):
         '''
         Allows iterations over the resources contained in the collection.
         '''
-        return iter(self.__list)
+        return iter(self.__contents[1])
 
     def __getitem__(self, identifier):
         '''
@@ -318,15 +563,16 @@ class Collection(object):
         @param identifier:ID of the resource or index in the list
         @return: Resource
         '''
-        return (self.__list[identifier] if type(identifier) is int
-                else self.__resources.get(identifier))
+        resources, items = self.__contents
+        return (items[identifier] if type(identifier) is int
+                else resources.get(identifier))
 
     def __len__(self):
         '''
         Returns the number of items contained in the collection.
         @return: int
         '''
-        return len(self.__resources)
+        return len(self.__contents[0])
 
     @property
     def node(self):
@@ -358,7 +604,7 @@ class Collection(object):
         Gets the loaded resources
         @return: dict
         '''
-        return self.__resources
+        return self.__contents[0]
 
     @property
     def count(self):
@@ -377,18 +623,110 @@ class Collection(object):
         '''
         self.populate(0, 1, head=True)
     
-    def retrieve_all(self, fields=None):
+    def retrieve_all(self, fields=None, deadline=None):
         '''
         Populates the collection with all the resources available on the
         server.
-        @param fields:str Comma-separated list of fields to request or exclude.
+        @param fields:str|list Fields to load, or to exclude if prefixed by
+        '-'. The others are loaded when they are read.
+        @param deadline:object Deadline or number of seconds within which all
+        the pages must be retrieved.
+        '''
+        resources, items = {}, []
+        with deadline_scope(deadline):
+            for n in xrange(0, self.count, RESPONSE_SIZE_LIMIT):
+                page = self.__fetch(offset=n, limit=RESPONSE_SIZE_LIMIT,
+                                    fields=fields)
+                for resource in page or []:
+                    if str(resource.id) not in resources:
+                        items.append(resource)
+                    resources[str(resource.id)] = resource
+        self.__contents = (resources, items)
+
+    def delete_all(self, prevent_conflicts=False,
+                   max_workers=DEFAULT_MAX_WORKERS, callback=None):
+        '''
+        Deletes all the resources of the collection, streaming through its
+        pages and sending the requests of each page concurrently.
+        @param prevent_conflicts:bool A value indicating whether resources
+        should not be deleted if they were modified since their page was
+        retrieved.
+        @param max_workers:int Maximum number of concurrent requests.
+        @param callback:function Callable(outcome, done, total) notified
+        every time a resource is processed.
+        @return: list Outcome instances. Conflicts are reported as
+        ResourceConflictException errors.
+        '''
+        def delete(resource):
+            resource.delete(prevent_conflicts)
+            return resource.is_deleted
+
+        outcomes = self.__process_all(delete, max_workers, callback)
+        resources, items = self.__contents
+        items = [resource for resource in items if not resource.is_deleted]
+        self.__contents = (dict((str(resource.id), resource)
+                                for resource in items), items)
+        return outcomes
+
+    def update_all(self, prevent_conflicts=False,
+                   max_workers=DEFAULT_MAX_WORKERS, callback=None,
+                   **attributes):
+        '''
+        Updates attributes of all the resources of the collection, streaming
+        through its pages and sending the requests of each page concurrently.
+        Usage:
+            email.invoices.unread.update_all(read=True)
+        @param prevent_conflicts:bool A value indicating whether resources
+        should not be updated if they were modified since their page was
+        retrieved.
+        @param max_workers:int Maximum number of concurrent requests.
+        @param callback:function Callable(outcome, done, total) notified
+        every time a resource is processed.
+        @return: list Outcome instances whose values indicate whether the
+        resources were changed. Conflicts are reported as
+        ResourceConflictException errors.
+        '''
+        resource_cls = self.__node._resource_cls
+        for name in attributes:
+            attribute = getattr(resource_cls, name, None)
+            if not isinstance(attribute, property) or not attribute.fset:
+                raise AttributeError('%s.%s cannot be updated' %
+                                     (resource_cls.__name__, name))
+
+        def update(resource):
+            for name, value in attributes.items():
+                setattr(resource, name, value)
+            if not resource.has_updates:
+                return False
+            resource.update(prevent_conflicts)
+            return True
+
+        return self.__process_all(update, max_workers, callback)
+
+    def __process_all(self, func, max_workers, callback):
+        '''
+        Calls a function on all the resources of the collection.
+        Pages are processed from the last one to the first one so that the
+        resources leaving the collection do not shift the pages left.
+        @param func:function Callable taking a resource.
+        @param max_workers:int Maximum number of concurrent calls.
+        @param callback:function Callable(outcome, done, total).
+        @return: list Outcome instances.
         '''
-        results = {}
-        for n in xrange(0, self.count, RESPONSE_SIZE_LIMIT):
-            self.populate(offset=n, limit=RESPONSE_SIZE_LIMIT, fields=fields)
-            results.update(self.__resources)
-        self.__resources = results    
-        self.__list = results.values()
+        self.load_info()
+        total = self.__content_range.total if self.__content_range else 0
+        processed = [0]
+
+        def notify(outcome):
+            processed[0] += 1
+            callback(outcome, processed[0], total)
+
+        outcomes = []
+        for offset in reversed(xrange(0, total, RESPONSE_SIZE_LIMIT)):
+            page = self.__fetch(offset=offset, limit=RESPONSE_SIZE_LIMIT)
+            outcomes.extend(run_concurrently(func, page or [], max_workers,
+                                             notify if callback else None))
+        return outcomes
 
     def populate(self, offset=0, limit=200, head=False, fields=None):
         '''
@@ -396,46 +734,233 @@ class Collection(object):
         @param offset:int Offset
         @param limit:int Limit (Max: 200)
         @param head:bool Value indicating whether to use a HEAD method or not.
-        @param fields:str List of fields to request or to exclude.
+        @param fields:str|list Fields to load, or to exclude if prefixed by
+        '-'. The others are loaded when they are read.
+        '''
+        items = self.__fetch(offset, limit, head, fields)
+        if items is not None:
+            self.__contents = (dict((str(resource.id), resource)
+                                    for resource in items), items)
+
+    def sync(self, fields=None, deadline=None):
+        '''
+        Brings the collection up to date by retrieving only the resources
+        modified since it was last populated, and merges them into the
+        resources loaded. Resources which left the collection are detected
+        by comparing counts over ranges of modification dates, so that only
+        the ranges which lost resources are listed again.
+        The first sync of a collection retrieves all its resources.
+        @param fields:str|list Fields to load, or to exclude if prefixed by
+        '-'.
+        @param deadline:object Deadline or number of seconds within which the
+        collection must be synchronized.
+        @return: CollectionDelta
+        '''
+        delta = CollectionDelta()
+        resources, items = self.__contents
+        with deadline_scope(deadline):
+            if not items:
+                # The count cached by an empty collection is out of date.
+                self.load_info()
+                self.retrieve_all(fields)
+                delta.added = list(self)
+                return delta
+
+            response = self.__request(head=True, conditional=True)
+            if response.status_code == 304:  # Not-Modified
+                return delta
+
+            content_range, etag = response["Content-Range"], response["Etag"]
+            total = content_range.total if content_range else 0
+            resources, items = dict(resources), list(items)
+            since = self.__etag.timestamp - 1  # Same millisecond changes
+            clause, offset = 'lastModified>>%d' % since, 0
+            while True:
+                page = self.__request(clause, offset, RESPONSE_SIZE_LIMIT,
+                                      fields=fields)
+                modified = self.__parse(page, fields, resources, delta)
+                for resource in modified:
+                    if str(resource.id) not in resources:
+                        resources[str(resource.id)] = resource
+                        items.append(resource)
+                offset += RESPONSE_SIZE_LIMIT
+                if (not modified or not page["Content-Range"] or
+                    offset >= page["Content-Range"].total):
+                    break
+
+            if len(resources) > total:
+                timestamps = [r.etag.timestamp for r in items]
+                removed = set(self.__removed(items, min(timestamps) - 1,
+                                             max(timestamps), total))
+                delta.removed = [r for r in items if str(r.id) in removed]
+                items = [r for r in items if str(r.id) not in removed]
+                for identifier in removed:
+                    del resources[identifier]
+
+            self.__content_range = content_range
+            self.__etag = etag or self.__etag
+            self.__contents = (resources, items)
+        return delta
+
+    def __removed(self, items, after, until, count):
+        '''
+        Finds the resources modified within a range of dates which are not
+        part of the collection anymore on the server.
+        @param items:list Resources loaded modified within the range.
+        @param after:long Timestamp after which the range starts.
+        @param until:long Timestamp at which the range ends, included.
+        @param count:int Number of resources of the range on the server.
+        @return: list IDs of the resources removed.
+        '''
+        local = [r for r in items if after < r.etag.timestamp <= until]
+        if count >= len(local):
+            return []
+        if not count:
+            return [str(r.id) for r in local]
+
+        timestamps = sorted(r.etag.timestamp for r in local)
+        middle = timestamps[len(timestamps) // 2]
+        if len(local) <= RESPONSE_SIZE_LIMIT or middle in (after, until):
+            clause = 'lastModified>>%d|lastModified<<%d' % (after, until + 1)
+            remaining = set()
+            for offset in xrange(0, count, RESPONSE_SIZE_LIMIT):
+                response = self.__request(clause, offset, RESPONSE_SIZE_LIMIT,
+                                          fields=_IDENTITY_FIELDS)
+                if response.status_code not in [200, 206]:
+                    break
+                remaining.update(str(Etag.parse(item['etag']).id)
+                                 for item in response.data)
+            return [str(r.id) for r in local if str(r.id) not in remaining]
+
+        # Counting one half tells how many resources the other one has.
+        response = self.__request('lastModified>>%d|lastModified<<%d' %
+                                  (after, middle + 1), 0, 1, head=True)
+        content_range = response["Content-Range"]
+        first = content_range.total if content_range else 0
+        return (self.__removed(local, after, middle, first) +
+                self.__removed(local, middle, until, count - first))
+
+    def __request(self, clause=None, offset=None, limit=None, head=False,
+                  fields=None, conditional=False):
+        '''
+        Sends a request for resources of the collection.
+        @param clause:str Filter clause added to the query of the collection.
+        @param offset:int Offset
+        @param limit:int Limit (Max: 200)
+        @param head:bool Value indicating whether to use a HEAD method or not.
+        @param fields:Projection Fields to load.
+        @param conditional:bool Whether to ask for the resources only if
+        the collection changed since it was last retrieved.
+        @return: Response
         '''
         uri = self.__uri
+        if clause:
+            query = self.__query + '|' + clause if self.__query else clause
+            uri = uri.split('?', 1)[0] + '?q=' + quote_plus(query)
 
-        if fields and len(fields):
-            fields = "fields=" + urllib.quote_plus(fields)
-            uri = uri + ("?" if not self.__query else "&") + fields
-
-        request = Request(self.__node.client, uri=uri,
+        request = Request(self.__node.client,
+                          uri=_with_fields(uri, Projection.parse(fields)),
                           method="HEAD" if head else "GET")
 
         if offset != None and limit != None:
             request["Range"] = Range(offset=offset,
                                      limit=min(RESPONSE_SIZE_LIMIT, limit))
-        else:
+        if conditional:
             request["If-None-Match"] = self.__etag
             request["If-Modified-Since"] = self.__etag.last_modified
 
-        response = request.get_response()
-        self.__content_range = response["Content-Range"]
-        self.__etag = response["Etag"]
+        return request.get_response()
 
+    def __parse(self, response, fields, existing=None, delta=None,
+                head=False):
+        '''
+        Synchronizes the resources found in a page.
+        @param response:Response
+        @param fields:Projection Fields loaded.
+        @param existing:dict Resources already loaded, by ID, which are
+        synchronized rather than replaced.
+        @param delta:CollectionDelta Delta on which the resources added and
+        changed are reported.
+        @param head:bool Whether the response answers a HEAD request.
+        @return: list Resources of the page, or None for a HEAD request.
+        '''
         if response.status_code in [204, 416]:  # (No-Content, Out-Range)
-            self.__resources = {}
-            self.__list = []
-            return
+            return []
 
         if response.status_code not in [200, 206]:  # (OK, Partial Content)
-            return Exception("Unexpected response from the server (code: %s)"
-                             % response.status_code)
+            raise Exception("Unexpected response from the server (code: %s)"
+                            % response.status_code)
+
+        if head:
+            return None
 
-        if not head:
-            self.__resources = {}
-            self.__list = []
-            for item in response.data:
+        data = response.data
+        items = []
+        with response.event.timing('sync'):
+            for item in data:
                 etag = Etag.parse(item["etag"])
-                resource = self.__node[etag.id]
-                resource.sync(item, etag)
-                self.__list.append(resource)
-                self.__resources[str(resource.id)] = resource
+                resource = (existing or {}).get(str(etag.id))
+                if resource is None:
+                    resource = self.__node[etag.id]
+                    resource.sync(item, etag, fields)
+                    if delta is not None:
+                        delta.added.append(resource)
+                else:
+                    previous = resource.etag.timestamp
+                    changed = resource.sync(item, etag, fields)
+                    if delta is not None and (changed or
+                                              resource.etag.timestamp !=
+                                              previous):
+                        delta.changed.append(resource)
+                items.append(resource)
+        return items
+
+    def __fetch(self, offset=0, limit=200, head=False, fields=None):
+        '''
+        Retrieves resources from the server.
+        @return: list Resources retrieved, or None if the contents of the
+        collection should not change.
+        '''
+        fields = Projection.parse(fields)
+        paged = offset != None and limit != None
+        response = self.__request(None, offset, limit, head, fields,
+                                  conditional=not paged)
+        if response.status_code == 304:  # Not-Modified
+            return None
+
+        self.__content_range = response["Content-Range"]
+        self.__etag = response["Etag"] or self.__etag
+
+        return self.__parse(response, fields, head=head)
+
+
+class CollectionDelta(object):
+    '''
+    Represents the changes brought to a collection by a sync.
+    '''
+    def __init__(self):
+        '''
+        Initializes a new instance of the CollectionDelta class.
+        '''
+        self.added = []
+        self.changed = []
+        self.removed = []
+
+    def __nonzero__(self):
+        return bool(self.added or self.changed or self.removed)
+
+    def summary(self):
+        '''
+        Gets the number of resources per change.
+        @return: dict
+        '''
+        return {'added': len(self.added),
+                'changed': len(self.changed),
+                'removed': len(self.removed)}
+
+    def __str__(self):
+        return ('%(added)d added, %(changed)d changed, %(removed)d removed'
+                % self.summary())
 
 
 class Node(object):
@@ -452,6 +977,7 @@ class Node(object):
         self.__client = client
         self._uri = uri
         self.__collections = {}
+        self.__collections_lock = threading.Lock()
         self._resource_cls = resource_cls
 
     def __contains__(self, identifier):
@@ -472,11 +998,13 @@ class Node(object):
 
     def get(self, *args, **kwargs):
         '''
-        Gets a resource by its ID.
+        Gets a resource by its ID. The 'fields' keyword argument limits the
+        fields loaded when the existence of the resource is checked.
         @return: Resource
         '''
         check_existence = kwargs.pop('check_existence', True)
         default = kwargs.pop('default', None)
+        fields = kwargs.pop('fields', None)
         
         if not self._resource_cls:
             raise NotImplementedError()
@@ -486,7 +1014,7 @@ class Node(object):
             return instance
 
         try:
-            instance.load()
+            instance.load(fields=fields)
             return instance
         except (ApiError), e:
             if e.code == 404:
@@ -515,7 +1043,182 @@ class Node(object):
         @param query:str Query
         @return: Collection
         '''
-        if query not in self.__collections:
-            self.__collections[query] = Collection(self, self._uri, query)
+        with self.__collections_lock:
+            if query not in self.__collections:
+                self.__collections[query] = Collection(self, self._uri, query)
+
+            return self.__collections[query]
+
+
+class UpdateReport(object):
+    '''
+    Represents the summary of the updates flushed by an UpdateSession.
+    '''
+    def __init__(self):
+        '''
+        Initializes a new instance of the UpdateReport class.
+        '''
+        self.updated = []
+        self.unchanged = []
+        self.conflicts = []
+        self.errors = []
+
+    @property
+    def succeeded(self):
+        '''
+        Gets a value indicating whether every resource was updated.
+        @return: bool
+        '''
+        return not self.conflicts and not self.errors
+
+    def summary(self):
+        '''
+        Gets the number of resources per result.
+        @return: dict
+        '''
+        return {'updated': len(self.updated),
+                'unchanged': len(self.unchanged),
+                'conflicts': len(self.conflicts),
+                'errors': len(self.errors)}
+
+    def __str__(self):
+        return ('%(updated)d updated, %(unchanged)d unchanged, '
+                '%(conflicts)d conflicts, %(errors)d errors' % self.summary())
+
+
+class UpdateSession(object):
+    '''
+    Collects the updates registered on many resources and sends them with a
+    bounded number of concurrent requests. Within the session, resources
+    whose attributes are changed are added automatically.
+    Usage:
+        with UpdateSession(max_workers=8) as session:
+            for invoice in email.invoices.unread:
+                invoice.read = True
+        print session.report
+    '''
+    __local = threading.local()
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS,
+                 prevent_conflicts=False, on_conflict=CONFLICT_SKIP):
+        '''
+        Initializes a new instance of the UpdateSession class.
+        @param max_workers:int Maximum number of concurrent requests.
+        @param prevent_conflicts:bool A value indicating whether resources
+        should not be updated if the version loaded is not the most recent one
+        available.
+        @param on_conflict:str What to do with a conflicting resource:
+        CONFLICT_SKIP reports it, CONFLICT_REFRESH reloads it and sends the
+        updates again, CONFLICT_FORCE sends the updates unconditionally.
+        '''
+        if on_conflict not in [CONFLICT_SKIP, CONFLICT_REFRESH, CONFLICT_FORCE]:
+            raise ValueError('Invalid conflict policy \'%s\'' % on_conflict)
+
+        self.max_workers = max_workers
+        self.prevent_conflicts = prevent_conflicts
+        self.on_conflict = on_conflict
+        self.report = None
+        self.__lock = threading.Lock()
+        self.__resources = []
+        self.__ids = set()
+
+    def __len__(self):
+        '''
+        Returns the number of resources waiting to be flushed.
+        @return: int
+        '''
+        return len(self.__resources)
+
+    def __enter__(self):
+        self.__stack().append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.__stack().remove(self)
+        if exc_type is None:
+            self.flush()
+        return False
 
-        return self.__collections[query]
+    @classmethod
+    def __stack(cls):
+        '''
+        Gets the stack of sessions entered in the current thread.
+        @return: list
+        '''
+        if not hasattr(cls.__local, 'stack'):
+            cls.__local.stack = []
+        return cls.__local.stack
+
+    @classmethod
+    def current(cls):
+        '''
+        Gets the innermost session entered in the current thread or None.
+        @return: UpdateSession
+        '''
+        stack = cls.__stack()
+        return stack[-1] if stack else None
+
+    def add(self, resource):
+        '''
+        Adds a resource whose updates should be sent.
+        @param resource:Resource
+        '''
+        with self.__lock:
+            if id(resource) not in self.__ids:
+                self.__ids.add(id(resource))
+                self.__resources.append(resource)
+
+    def add_all(self, resources):
+        '''
+        Adds resources whose updates should be sent.
+        @param resources:iterable Resources
+        '''
+        for resource in resources:
+            self.add(resource)
+
+    def flush(self, callback=None):
+        '''
+        Sends the updates of the resources added to the session.
+        @param callback:function Callable notified with the Outcome of every
+        resource.
+        @return: UpdateReport
+        '''
+        with self.__lock:
+            resources, self.__resources, self.__ids = self.__resources, [], set()
+
+        report = UpdateReport()
+        for outcome in run_concurrently(self.__update, resources,
+                                        self.max_workers, callback):
+            if isinstance(outcome.error, ResourceConflictException):
+                report.conflicts.append(outcome.error)
+            elif outcome.failed:
+                report.errors.append(outcome)
+            elif outcome.value:
+                report.updated.append(outcome.item)
+            else:
+                report.unchanged.append(outcome.item)
+
+        self.report = report
+        return report
+
+    def __update(self, resource):
+        '''
+        Sends the updates of a resource, applying the conflict policy.
+        @param resource:Resource
+        @return: bool A value indicating whether there was anything to send.
+        '''
+        if not resource.has_updates:
+            return False
+
+        try:
+            resource.update(self.prevent_conflicts)
+        except(ResourceConflictException), e:
+            if self.on_conflict == CONFLICT_SKIP:
+                raise
+            if self.on_conflict == CONFLICT_REFRESH:
+                e.refresh()
+                resource.update(self.prevent_conflicts)
+            else:
+                e.force()
+
+        return True
@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+import sys
+import time
+import threading
+from collections import deque
+from greendizer.clients import transport
+from greendizer.clients.http import Deadline, Channel, deadline_scope
+from greendizer.clients.stats import ClientStats
+from greendizer.clients.concurrency import (Outcome, RateLimiter, start_thread,
+                                            DEFAULT_MAX_WORKERS)
+
+
+__all__ = ('AccountReport', 'FanOutReport', 'FanOut')
+
+
+class AccountReport(object):
+    '''
+    Represents the outcomes of the operations run on an account, along with
+    the requests they sent.
+    '''
+    def __init__(self, key, client, count):
+        '''
+        Initializes a new instance of the AccountReport class.
+        @param key:object Key of the account.
+        @param client:Client Client of the account.
+        @param count:int Number of operations run on the account.
+        '''
+        self.key = key
+        self.client = client
+        self.outcomes = [None] * count
+        self.stats = ClientStats()
+        self.started = None
+        self.finished = None
+
+    @property
+    def values(self):
+        '''
+        Gets the values returned by the operations which succeeded.
+        @return: list
+        '''
+        return [outcome.value for outcome in self.outcomes
+                if outcome and not outcome.failed]
+
+    @property
+    def errors(self):
+        '''
+        Gets the exceptions raised by the operations which failed.
+        @return: list
+        '''
+        return [outcome.error for outcome in self.outcomes
+                if outcome and outcome.failed]
+
+    @property
+    def failed(self):
+        '''
+        Gets a value indicating whether an operation failed.
+        @return: bool
+        '''
+        return any(outcome and outcome.failed for outcome in self.outcomes)
+
+    @property
+    def duration(self):
+        '''
+        Gets the number of seconds between the start of the first operation
+        and the end of the last one.
+        @return: float
+        '''
+        if self.started is None or self.finished is None:
+            return 0.0
+        return self.finished - self.started
+
+    def summary(self):
+        '''
+        Gets the figures of the account.
+        @return: dict
+        '''
+        return {'operations': len(self.outcomes),
+                'errors': len(self.errors),
+                'requests': self.stats.requests,
+                'failed_requests': self.stats.errors,
+                'duration': self.duration}
+
+
+class FanOutReport(object):
+    '''
+    Represents the outcomes of a fan-out, per account.
+    '''
+    def __init__(self, accounts, duration):
+        '''
+        Initializes a new instance of the FanOutReport class.
+        @param accounts:list AccountReport instances, in the order of the
+        accounts.
+        @param duration:float Number of seconds the fan-out took.
+        '''
+        self.accounts = accounts
+        self.duration = duration
+        self.__index = dict((account.key, account) for account in accounts)
+
+    def __getitem__(self, key):
+        return self.__index[key]
+
+    def __iter__(self):
+        return iter(self.accounts)
+
+    def __len__(self):
+        return len(self.accounts)
+
+    @property
+    def succeeded(self):
+        '''
+        Gets the keys of the accounts on which every operation succeeded.
+        @return: list
+        '''
+        return [account.key for account in self.accounts
+                if not account.failed]
+
+    @property
+    def failed(self):
+        '''
+        Gets the keys of the accounts on which an operation failed.
+        @return: list
+        '''
+        return [account.key for account in self.accounts if account.failed]
+
+    @property
+    def errors(self):
+        '''
+        Gets the exceptions raised, per account key. Accounts without error
+        are left out.
+        @return: dict
+        '''
+        return dict((account.key, account.errors)
+                    for account in self.accounts if account.failed)
+
+    def summary(self):
+        '''
+        Gets the figures of the fan-out.
+        @return: dict
+        '''
+        return {'accounts': len(self.accounts),
+                'failed': len(self.failed),
+                'operations': sum(len(account.outcomes)
+                                  for account in self.accounts),
+                'requests': sum(account.stats.requests
+                                for account in self.accounts),
+                'duration': self.duration}
+
+    def __str__(self):
+        lines = ['%(accounts)d accounts, %(failed)d failed, %(operations)d '
+                 'operations, %(requests)d requests in %(duration).3fs' %
+                 self.summary()]
+        for account in self.accounts:
+            if account.failed:
+                lines.append('  %s: %s' % (account.key, '; '.join(
+                                '%s: %s' % (error.__class__.__name__, error)
+                                for error in account.errors)))
+        return '\n'.join(lines)
+
+
+class FanOut(object):
+    '''
+    Runs operations across the clients of many accounts from a single pool
+    of threads.
+    Accounts are served in turns so that a large account does not hold
+    the workers while the others wait, and each one runs at most
+    max_per_account operations at once. The requests of every account are
+    spaced to respect a rate limit, and the clients share the persistent
+    connections of a pool. Both apply through a Channel entered around the
+    operations, so the clients are left untouched and may take part in
+    overlapping runs.
+    Usage:
+        fanout = FanOut({'acme': acme_client, 'globex': globex_client},
+                        rate=5)
+        report = fanout.run(lambda client: client.seller.emails.all)
+        for account in report:
+            print account.key, account.values, account.errors
+    '''
+    def __init__(self, clients, max_workers=DEFAULT_MAX_WORKERS,
+                 max_per_account=1, rate=None, burst=None, pool=None):
+        '''
+        Initializes a new instance of the FanOut class.
+        @param clients:dict Clients, per account key. A list of clients is
+        keyed by position.
+        @param max_workers:int Maximum number of concurrent operations.
+        @param max_per_account:int Maximum number of concurrent operations
+        on an account.
+        @param rate:float Maximum number of requests per second sent for an
+        account, across overlapping runs. Clients which have a rate_limiter
+        keep it.
+        @param burst:int Number of requests an account may send at once
+        (see RateLimiter).
+        @param pool:ConnectionPool Pool of connections shared by the
+        clients. Defaults to the pool of the library. Clients which already
+        have an opener keep it.
+        '''
+        if not isinstance(clients, dict):
+            clients = dict(enumerate(clients))
+        self.clients = clients
+        self.max_workers = max_workers
+        self.max_per_account = max_per_account
+        self.rate = rate
+        self.burst = burst
+        self.pool = pool or transport.POOL
+        self.__limiters = {}
+        self.__lock = threading.Lock()
+
+    def run(self, func, callback=None):
+        '''
+        Calls a function once on every account.
+        @param func:function Callable taking a client.
+        @param callback:function Callable(key, outcome) notified as soon as
+        an operation completes. Calls are serialized.
+        @return: FanOutReport
+        '''
+        return self.map(lambda client, _: func(client),
+                        dict((key, [None]) for key in self.clients),
+                        callback)
+
+    def map(self, func, items, callback=None):
+        '''
+        Calls a function on every item of every account, such as the
+        invoices to send from each of them.
+        @param func:function Callable taking a client and an item.
+        @param items:dict Iterables of items, per account key.
+        @param callback:function Callable(key, outcome) notified as soon as
+        an operation completes. Calls are serialized.
+        @return: FanOutReport The outcomes of an account are in the order
+        of its items.
+        '''
+        unknown = [key for key in items if key not in self.clients]
+        if unknown:
+            raise KeyError("Unknown accounts: %r" % (unknown,))
+
+        pending, reports = {}, []
+        for key in self.clients:
+            if key not in items:
+                continue
+            pending[key] = deque(enumerate(items[key]))
+            reports.append(AccountReport(key, self.clients[key],
+                                         len(pending[key])))
+
+        started = time.time()
+        channels = self.__channels(reports)
+        attached = []
+        try:
+            for report in reports:
+                stats = getattr(report.client, 'stats', None)
+                if stats is not None:
+                    stats.attach(report.stats)
+                    attached.append((stats, report.stats))
+            self.__execute(func, pending, reports, channels, callback)
+        finally:
+            for stats, listener in attached:
+                stats.detach(listener)
+        return FanOutReport(reports, time.time() - started)
+
+    def __channels(self, reports):
+        '''
+        Gets the channels carrying the requests of the accounts. The rate
+        limiter of an account is kept between runs, so that overlapping
+        runs share its limit.
+        @param reports:list AccountReport instances.
+        @return: dict Channel instances, per account key.
+        '''
+        # The handlers installed for the library, such as cassettes, apply
+        # to the requests of the run.
+        handlers = [handler for handler in transport.installed_handlers()
+                    if not isinstance(handler, transport.PooledHandler)]
+        opener = transport.build_opener(transport.PooledHandler(self.pool),
+                                        *handlers)
+        channels = {}
+        with self.__lock:
+            for report in reports:
+                limiter = None
+                if self.rate:
+                    limiter = self.__limiters.get(report.key)
+                    if limiter is None:
+                        limiter = RateLimiter(self.rate, self.burst)
+                        self.__limiters[report.key] = limiter
+                channels[report.key] = Channel(opener, limiter)
+        return channels
+
+    def __execute(self, func, pending, reports, channels, callback):
+        '''
+        Runs the operations from a pool of threads, serving the accounts in
+        turns.
+        @param func:function Callable taking a client and an item.
+        @param pending:dict Deques of (index, item) tuples, per account key.
+        @param reports:list AccountReport instances.
+        @param channels:dict Channel instances, per account key.
+        @param callback:function Callable(key, outcome).
+        '''
+        deadline = Deadline.current()
+        condition = threading.Condition()
+        lock = threading.Lock()
+        turns = deque(report.key for report in reports)
+        index = dict((report.key, report) for report in reports)
+        running = dict((key, 0) for key in pending)
+        remaining = [sum(len(queue) for queue in pending.values())]
+
+        def next_operation():
+            for _ in xrange(len(turns)):
+                key = turns[0]
+                turns.rotate(-1)
+                if pending[key] and running[key] < self.max_per_account:
+                    running[key] += 1
+                    return key, pending[key].popleft()
+            return None
+
+        def work():
+            with deadline_scope(deadline):
+                while True:
+                    with condition:
+                        operation = next_operation()
+                        while operation is None and remaining[0]:
+                            condition.wait()
+                            operation = next_operation()
+                        if operation is None:
+                            return
+
+                        key, (position, item) = operation
+                        report = index[key]
+                        if report.started is None:
+                            report.started = time.time()
+                    try:
+                        with channels[key]:
+                            outcome = Outcome(item, func(report.client, item))
+                    except(Exception), e:
+                        outcome = Outcome(item, error=e,
+                                          traceback=sys.exc_info()[2])
+
+                    with condition:
+                        report.outcomes[position] = outcome
+                        report.finished = time.time()
+                        running[key] -= 1
+                        remaining[0] -= 1
+                        condition.notify_all()
+                    if callback:
+                        with lock:
+                            callback(key, outcome)
+
+        workers = min(self.max_workers or 1, remaining[0])
+        if workers <= 1:
+            work()
+            return
+
+        threads = [start_thread(work) for _ in xrange(workers)]
+        for thread in threads:
+            thread.join()
@@ -1,8 +1,60 @@
 # -*- coding: utf-8 -*-
-try:
-    from pyxmli import CURRENCIES
-except ImportError:
-    CURRENCIES = []
+_CURRENCIES = None
+_SUPPORTED_CURRENCIES = None
+
+
+def _load_currencies():
+    '''
+    Loads the list of the currencies supported by pyxmli.
+    '''
+    global _CURRENCIES, _SUPPORTED_CURRENCIES
+    try:
+        from pyxmli import CURRENCIES
+    except ImportError:
+        CURRENCIES = []
+    _CURRENCIES = tuple(CURRENCIES)
+    _SUPPORTED_CURRENCIES = frozenset(CURRENCIES)
+
+
+def supported_currencies():
+    '''
+    Gets the codes of the currencies supported by pyxmli, loaded on first
+    use. Empty if pyxmli is not installed.
+    @return: frozenset
+    '''
+    if _SUPPORTED_CURRENCIES is None:
+        _load_currencies()
+    return _SUPPORTED_CURRENCIES
+
+
+class _Currencies(object):
+    '''
+    Read-only sequence of the codes of the currencies supported by pyxmli,
+    in its order, loaded on first use.
+    '''
+    def __codes(self):
+        if _CURRENCIES is None:
+            _load_currencies()
+        return _CURRENCIES
+
+    def __contains__(self, code):
+        return code in supported_currencies()
+
+    def __iter__(self):
+        return iter(self.__codes())
+
+    def __len__(self):
+        return len(self.__codes())
+
+    def __getitem__(self, index):
+        return self.__codes()[index]
+
+    def __repr__(self):
+        return repr(list(self.__codes()))
+
+
+# Kept for compatibility. Prefer supported_currencies().
+CURRENCIES = SUPPORTED_CURRENCIES = _Currencies()
 
 
 class Address(object):
@@ -53,22 +105,38 @@ class Address(object):
 
 class CurrencyMetrics(object):
     '''
-    Represents a set of data digested for a specific currency
+    Represents a set of data digested for a specific currency.
+    Values are parsed once from the source object and cannot be changed.
     '''
+    __slots__ = ('__currency_code', '__min', '__max', '__average', '__sum',
+                 '__total_taxes', '__total_discounts', '__invoices_count',
+                 '__items', '__taxes', '__discounts')
+
     def __init__(self, currency_code, data):
         '''
         Initializes a new instance of the CurrencyMetrics class.
         @param currency_code:str Currency code.
         @param data: dict Source object. 
         '''
-        if len(CURRENCIES) and currency_code not in CURRENCIES:
+        currencies = supported_currencies()
+        if currencies and currency_code not in currencies:
             raise ValueError('Unsupported currency ' + currency_code)
 
         if not data or not len(data):
             raise ValueError('Invalid data source object')
 
         self.__currency_code = currency_code
-        self.__data = data
+        self.__min = data.get('min')
+        self.__max = data.get('max')
+        self.__average = data.get('average')
+        self.__sum = data.get('sum')
+        self.__total_taxes = data.get('totalTaxes')
+        self.__total_discounts = data.get('totalDiscounts')
+        self.__invoices_count = data.get('invoicesCount')
+        self.__items = data.get('items')
+        self.__taxes = tuple([Treatment(i) for i in data.get('taxes') or ()])
+        self.__discounts = tuple([Treatment(i)
+                                  for i in data.get('discounts') or ()])
 
     @property
     def currency(self):
@@ -76,7 +144,7 @@ class CurrencyMetrics(object):
         Gets the currency in which the current metrics are labeled.
         @return: str
         '''
-        return self.__currency_codes
+        return self.__currency_code
 
     @property
     def min(self):
@@ -84,7 +152,7 @@ class CurrencyMetrics(object):
         Gets the smallest invoice paid in the current currency
         @return: float
         '''
-        return self.__data['min']
+        return self.__min
 
     @property
     def max(self):
@@ -92,7 +160,7 @@ class CurrencyMetrics(object):
         Gets the largest invoice paid in the current currency
         @return: float
         '''
-        return self.__data['max']
+        return self.__max
 
     @property
     def average(self):
@@ -100,7 +168,7 @@ class CurrencyMetrics(object):
         Gets the average invoice amount paid in the current currency
         @return: float
         '''
-        return self.__data['average']
+        return self.__average
 
     @property
     def sum(self):
@@ -108,7 +176,7 @@ class CurrencyMetrics(object):
         Gets the total revenue recorded in the current currency
         @return: float
         '''
-        return self.__data['sum']
+        return self.__sum
 
     @property
     def total_taxes(self):
@@ -116,7 +184,7 @@ class CurrencyMetrics(object):
         Gets the total amount of taxes.
         @return: float
         '''
-        return self.__data['totalTaxes']
+        return self.__total_taxes
 
     @property
     def total_discounts(self):
@@ -124,7 +192,7 @@ class CurrencyMetrics(object):
         Gets the total amount of discounts.
         @return: float
         '''
-        return self.__data['totalDiscounts']
+        return self.__total_discounts
 
     @property
     def invoices_count(self):
@@ -132,43 +200,47 @@ class CurrencyMetrics(object):
         Gets the total number of invoices exchanged in the current currency
         @return: int
         '''
-        return self.__data['invoicesCount']
+        return self.__invoices_count
 
     @property
     def items(self):
         '''
-        Gets the smallest invoice paid in the current currency
-        @return: float
+        Gets the number of items invoiced in the current currency
+        @return: int
         '''
-        return self.__data['items']
+        return self.__items
 
     @property
     def taxes(self):
         '''
         Gets the taxes recorded in the currency taxes
-        @return: list
+        @return: tuple
         '''
-        return [Treatment(i) for i in self.__data['taxes']]
+        return self.__taxes
 
     @property
     def discounts(self):
         '''
         Gets the discounts recorded in the currency taxes
-        @return: list
+        @return: tuple
         '''
-        return [Treatment(i) for i in self.__data['discounts']]
+        return self.__discounts
 
 
 class Treatment(object):
     '''
     Represents an invoice line discount or tax.
     '''
+    __slots__ = ('__type', '__value', '__name')
+
     def __init__(self, data):
         '''
         Initializes a new instance of the Treatment class.
         @param data: dict Source datas
         '''
-        self.__data = data
+        self.__type = data.get('type')
+        self.__value = data.get('value')
+        self.__name = data.get('name')
 
     @property
     def type(self):
@@ -176,7 +248,7 @@ class Treatment(object):
         Gets the type of the treatment.
         @return: str
         '''
-        return self.__data['type']
+        return self.__type
 
     @property
     def value(self):
@@ -184,7 +256,7 @@ class Treatment(object):
         Gets the value of the tax or the discount.
         @return: float
         '''
-        return self.__data['value']
+        return self.__value
 
     @property
     def name(self):
@@ -192,4 +264,4 @@ class Treatment(object):
         Gets the name of the tax or discount.
         @return: str
         '''
-        return self.__data['name']
+        return self.__name
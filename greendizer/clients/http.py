@@ -1,14 +1,11 @@
 # -*- coding: utf-8 -*-
-import urllib
-import urllib2
 import re
-import zlib
+import time
 import urlparse
-import logging
+import threading
 from datetime import datetime, date
-from gzip import GzipFile
-from StringIO import StringIO
 from greendizer.clients.config import DEBUG, VERSION
+from greendizer.clients.routes import ROUTER
 from greendizer.clients.base import (timestamp_to_datetime, to_byte_string,
                                      datetime_to_timestamp,)
 
@@ -29,6 +26,9 @@ HTTP_METHODS = ["head", "get", "delete", "options"] + HTTP_METHODS_WITH_DATA
 CONTENT_TYPES = ["application/xml",
                  "application/x-www-form-urlencoded"]
 HTTP_POST_ONLY = False
+REDIRECT_CODES = [301, 302, 303, 307]
+CONNECT_TIMEOUT = 10  # seconds
+READ_TIMEOUT = 60  # seconds
 
 
 def gzip_str(data):
@@ -37,6 +37,8 @@ def gzip_str(data):
     @param data:str
     @return data:str
     '''
+    from gzip import GzipFile
+    from StringIO import StringIO
     bf = StringIO('')
     f = GzipFile(fileobj=bf, mode='wb', compresslevel=9)
     f.write(data)
@@ -44,6 +46,280 @@ def gzip_str(data):
     return bf.getvalue()
 
 
+class RequestTimeoutError(Exception):
+    '''
+    Represents the exception raised if the server could not be reached or
+    did not answer in time.
+    '''
+    pass
+
+
+class DeadlineExceededError(RequestTimeoutError):
+    '''
+    Represents the exception raised if a deadline expired before a request
+    could be completed.
+    '''
+    pass
+
+
+class Deadline(object):
+    '''
+    Represents a point in time after which no request should be sent.
+    Deadlines can be entered as context managers to cover every request
+    sent from the current thread, including the ones made by operations
+    spanning several requests.
+    '''
+    __local = threading.local()
+
+    def __init__(self, seconds):
+        '''
+        Initializes a new instance of the Deadline class.
+        @param seconds:float Number of seconds left before the deadline.
+        '''
+        self.__expires = time.time() + float(seconds)
+
+    @property
+    def remaining(self):
+        '''
+        Gets the number of seconds left before the deadline.
+        @return: float
+        '''
+        return max(self.__expires - time.time(), 0.0)
+
+    @property
+    def expired(self):
+        '''
+        Gets a value indicating whether the deadline has expired.
+        @return: bool
+        '''
+        return time.time() >= self.__expires
+
+    def check(self):
+        '''
+        Raises a DeadlineExceededError if the deadline has expired.
+        '''
+        if self.expired:
+            raise DeadlineExceededError("Deadline exceeded.")
+
+    def __enter__(self):
+        stack = self.__stack()
+        stack.append(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.__stack().remove(self)
+        return False
+
+    @classmethod
+    def __stack(cls):
+        '''
+        Gets the stack of deadlines entered in the current thread.
+        @return: list
+        '''
+        if not hasattr(cls.__local, 'stack'):
+            cls.__local.stack = []
+        return cls.__local.stack
+
+    @classmethod
+    def current(cls):
+        '''
+        Gets the closest deadline entered in the current thread or None.
+        @return: Deadline
+        '''
+        stack = cls.__stack()
+        if not stack:
+            return None
+        return min(stack, key=lambda deadline: deadline.remaining)
+
+    @classmethod
+    def coerce(cls, value):
+        '''
+        Converts a number of seconds into a Deadline instance.
+        @param value:object Deadline, number of seconds or None.
+        @return: Deadline
+        '''
+        if value is None or isinstance(value, Deadline):
+            return value
+        return cls(value)
+
+
+class _NullContext(object):
+    '''
+    Context manager doing nothing.
+    '''
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+def deadline_scope(deadline):
+    '''
+    Returns a context manager applying a deadline to the requests sent
+    within it, or doing nothing if no deadline is given.
+    @param deadline:object Deadline, number of seconds or None.
+    @return: object
+    '''
+    deadline = Deadline.coerce(deadline)
+    return deadline if deadline else _NullContext()
+
+
+class Channel(object):
+    '''
+    Represents the way requests go out: the opener sending them and the
+    rate limiter spacing them. Channels can be entered as context managers
+    to cover every request sent from the current thread, without changing
+    the clients sending them. The opener and rate_limiter of a client take
+    precedence over the ones of a channel.
+    '''
+    __local = threading.local()
+
+    def __init__(self, opener=None, rate_limiter=None):
+        '''
+        Initializes a new instance of the Channel class.
+        @param opener:urllib2.OpenerDirector Opener sending the requests.
+        @param rate_limiter:RateLimiter Rate limiter spacing the requests.
+        '''
+        self.opener = opener
+        self.rate_limiter = rate_limiter
+
+    def __enter__(self):
+        self.__stack().append(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.__stack().remove(self)
+        return False
+
+    @classmethod
+    def __stack(cls):
+        '''
+        Gets the stack of channels entered in the current thread.
+        @return: list
+        '''
+        if not hasattr(cls.__local, 'stack'):
+            cls.__local.stack = []
+        return cls.__local.stack
+
+    @classmethod
+    def current(cls):
+        '''
+        Gets the last channel entered in the current thread or None.
+        @return: Channel
+        '''
+        stack = cls.__stack()
+        return stack[-1] if stack else None
+
+
+def channel_scope(channel):
+    '''
+    Returns a context manager applying a channel to the requests sent
+    within it, or doing nothing if no channel is given.
+    @param channel:Channel Channel or None.
+    @return: object
+    '''
+    return channel if channel else _NullContext()
+
+
+HOOKS = []
+
+
+def add_hook(hook):
+    '''
+    Registers a callable notified every time a phase of a request is
+    measured. Hooks are called with the RequestEvent, the name of the phase
+    and its duration in seconds. The last phase recorded by the transport is
+    'total', followed by 'decode' and 'sync' when the response is consumed.
+    The exceptions raised by a hook are logged rather than propagated to
+    the request.
+    @param hook:function Callable(event, phase, seconds)
+    '''
+    if hook not in HOOKS:
+        HOOKS.append(hook)
+
+
+def remove_hook(hook):
+    '''
+    Unregisters a hook.
+    @param hook:function Hook previously registered.
+    '''
+    if hook in HOOKS:
+        HOOKS.remove(hook)
+
+
+class _Timing(object):
+    '''
+    Context manager recording the duration of a phase.
+    '''
+    def __init__(self, event, phase):
+        self.__event = event
+        self.__phase = phase
+        self.__started = None
+
+    def __enter__(self):
+        self.__started = time.time()
+
+    def __exit__(self, *exc_info):
+        self.__event.record(self.__phase, time.time() - self.__started)
+        return False
+
+
+class RequestEvent(object):
+    '''
+    Represents the measurements recorded while processing a request: phase
+    timings, byte counts before and after compression, status code and
+    retries.
+    '''
+    def __init__(self, request):
+        '''
+        Initializes a new instance of the RequestEvent class.
+        @param request:Request Measured request.
+        '''
+        self.request = request
+        self.method = request.method.upper()
+        self.status_code = None
+        self.retries = 0
+        self.bytes_sent = 0
+        self.bytes_sent_compressed = 0
+        self.bytes_received = 0
+        self.bytes_received_decompressed = 0
+        self.timings = {}
+
+    @property
+    def route(self):
+        '''
+        Gets the name of the route on which the request was sent, or its
+        path if it does not match any route.
+        @return: str
+        '''
+        match = self.request.route
+        return match.name if match else self.request.uri.path
+
+    def timing(self, phase):
+        '''
+        Returns a context manager recording the duration of a phase.
+        @param phase:str Name of the phase.
+        @return: object
+        '''
+        return _Timing(self, phase)
+
+    def record(self, phase, seconds):
+        '''
+        Records the duration of a phase and notifies the hooks.
+        @param phase:str Name of the phase.
+        @param seconds:float Duration.
+        '''
+        self.timings[phase] = self.timings.get(phase, 0.0) + seconds
+        for hook in list(HOOKS):
+            try:
+                hook(self, phase, seconds)
+            except(Exception):
+                import logging
+                logging.getLogger(__name__).exception('Request hook %r '
+                                                      'failed', hook)
+
+
 class ApiError(Exception):
     '''
     Represents an API-related exception
@@ -76,35 +352,24 @@ class Request(object):
     '''
     Represents an HTTP request to the Greendizer API
     '''
-    class HttpRequest(urllib2.Request):
-        '''
-        Represents an HTTP request
-        This class inherits from the urllib2 Request class to extend the
-        HTTP methods available beyond the GET and POST already built-in.
-        '''
-        def __init__(self, uri, method="GET", **kwargs):
-            '''
-            Initializes a new instance of the Request class.
-            @param uri:str The URI to which will be bound.
-            @param method:str The HTTP method to use with the request.
-            '''
-            self.__method = method
-            urllib2.Request.__init__(self, uri, **kwargs)
-
-        def get_method(self):
-            '''
-            Gets the HTTP method in use.
-            @return: str
-            '''
-            return self.__method.upper()
-
     def __init__(self, client=None, method="GET", uri=None, data=None,
-                 content_type="application/x-www-form-urlencoded"):
+                 content_type="application/x-www-form-urlencoded",
+                 connect_timeout=None, read_timeout=None, deadline=None,
+                 follow_redirects=True):
         '''
         Initializes a new instance of the Request class.
         @param method:str HTTP method
         @param content_type:str MIME type of the data to carry to the server.
-        '''
+        @param connect_timeout:float Connect timeout in seconds. Defaults to
+        the client's, then to CONNECT_TIMEOUT.
+        @param read_timeout:float Read timeout in seconds. Defaults to
+        the client's, then to READ_TIMEOUT.
+        @param deadline:object Deadline or number of seconds after which the
+        request should not be sent anymore.
+        @param follow_redirects:bool A value indicating whether redirections
+        are followed, or returned as responses.
+        '''
+        started = time.time()
         if not uri:
             raise ValueError("Invalid URI.")
 
@@ -114,13 +379,29 @@ class Request(object):
         if content_type not in CONTENT_TYPES:
             raise ValueError("Invalid content type value.")
 
+        # IDs parsed from JSON are unicode. A unicode request line would
+        # make httplib decode the gzipped body appended to it as ASCII.
+        uri = to_byte_string(uri)
         self.__content_type = content_type
+        self.__path = uri
+        self.__route = None
+        self.__client = client
         self.data = data
         self.uri = urlparse.urlsplit(API_ROOT + uri)
         self.method = method.lower()
         self.headers = {}
+        self.connect_timeout = (connect_timeout or
+                                getattr(client, 'connect_timeout', None) or
+                                CONNECT_TIMEOUT)
+        self.read_timeout = (read_timeout or
+                             getattr(client, 'read_timeout', None) or
+                             READ_TIMEOUT)
+        self.deadline = Deadline.coerce(deadline)
+        self.follow_redirects = follow_redirects
+        self.event = RequestEvent(self)
         if client:
             client.sign_request(self)
+        self.event.record('build', time.time() - started)
 
     def __getitem__(self, header):
         '''
@@ -130,6 +411,16 @@ class Request(object):
         '''
         return self.headers.get(header, None)
 
+    @property
+    def route(self):
+        '''
+        Gets the route matching the URI of the request.
+        @return: RouteMatch or None
+        '''
+        if self.__route is None:
+            self.__route = ROUTER.match(self.__path) or False
+        return self.__route or None
+
     def __setitem__(self, header, value):
         '''
         Sets a header
@@ -163,6 +454,21 @@ class Request(object):
 
         return serialized
 
+    def __get_timeouts(self):
+        '''
+        Gets the connect and read timeouts to apply, capped by the closest
+        deadline.
+        @return: tuple
+        '''
+        connect_timeout, read_timeout = self.connect_timeout, self.read_timeout
+        deadlines = [d for d in (self.deadline, Deadline.current()) if d]
+        for deadline in deadlines:
+            deadline.check()
+            connect_timeout = min(connect_timeout, deadline.remaining)
+            read_timeout = min(read_timeout, deadline.remaining)
+
+        return connect_timeout, read_timeout
+
     def get_response(self, use_gzip=True):
         '''
         Sends the request and returns an HTTP response object.
@@ -172,9 +478,35 @@ class Request(object):
             raise Exception("%s requests must carry data." %
                             self.method.upper())
 
-        headers = self.__serialize_headers()
+        event = self.event
+        started = time.time()
+        try:
+            channel = Channel.current()
+            limiter = (getattr(self.__client, 'rate_limiter', None) or
+                       (channel and channel.rate_limiter))
+            if limiter:
+                event.record('throttle', limiter.acquire())
+            return self.__send(use_gzip)
+        finally:
+            event.record('total', time.time() - started)
+            stats = getattr(self.__client, 'stats', None)
+            if stats:
+                stats.record(event)
+
+    def __send(self, use_gzip):
+        '''
+        Encodes, sends the request and returns an HTTP response object,
+        recording the time spent in each phase.
+        @param use_gzip:bool A value indicating whether to compress the data.
+        @return: Response
+        '''
+        event = self.event
+        connect_timeout, read_timeout = self.__get_timeouts()
+
+        with event.timing('serialize_headers'):
+            headers = self.__serialize_headers()
+        headers.setdefault("Accept", "application/json")
         headers.update({
-            "Accept": "application/json",
             "User-Agent": USER_AGENT,
             "Accept-Encoding": "gzip, deflate",
             "Cache-Control": "no-cache"
@@ -194,33 +526,58 @@ class Request(object):
 
             #URL encoding
             if self.__content_type == "application/x-www-form-urlencoded":
+                import urllib
                 data = to_byte_string(urllib.urlencode(data))
 
+            data = to_byte_string(data)
+            event.bytes_sent = len(data)
+
             #GZip compression
             if not DEBUG and USE_GZIP and use_gzip:
                 headers["Content-Encoding"] = COMPRESSION_GZIP
-                data = gzip_str(to_byte_string(data))
+                with event.timing('compress'):
+                    data = gzip_str(data)
 
-        request = Request.HttpRequest(self.uri.geturl(),
-                                      data=data,
-                                      method=method, headers=headers)
+            event.bytes_sent_compressed = len(data)
 
+        import socket
+        import urllib2
+        from greendizer.clients import transport
+        request = transport.HttpRequest(self.uri.geturl(),
+                                        data=data,
+                                        method=method, headers=headers,
+                                        read_timeout=read_timeout,
+                                        follow_redirects=self.follow_redirects)
+
+        started = time.time()
         try:
-            response = urllib2.urlopen(request)
-            return Response(self,
-                            200,
-                            response.read(),
-                            response.info())
+            channel = Channel.current()
+            opener = (getattr(self.__client, 'opener', None) or
+                      (channel and channel.opener) or transport.OPENER)
+            response = opener.open(request, timeout=connect_timeout)
+            status_code, body = response.getcode(), response.read()
+            event.retries = getattr(response, 'retries', 0)
+            event.record('network', time.time() - started)
+            return Response(self, status_code, body, response.info())
 
         except(urllib2.HTTPError), e:
-            instance = Response(self, e.code, e.read(), e.info())
-            if e.code not in [201, 202, 204, 206, 304, 409, 416]:
+            body = e.read()
+            event.retries = getattr(e.fp, 'retries', 0)
+            event.record('network', time.time() - started)
+            instance = Response(self, e.code, body, e.info())
+            if (e.code not in [201, 202, 204, 206, 304, 409, 416] and
+                (self.follow_redirects or e.code not in REDIRECT_CODES)):
                 raise ApiError(instance)
 
             return instance
 
-        except urllib2.URLError:
+        except(urllib2.URLError), e:
+            if isinstance(e.reason, socket.timeout):
+                raise RequestTimeoutError("The server did not answer in time")
             raise Exception("Unable to reach the server")
+
+        except(socket.timeout):
+            raise RequestTimeoutError("The server did not answer in time")
         
 
 class Response(object):
@@ -237,15 +594,27 @@ class Response(object):
         '''
         self.__request = request
         self.__status_code = status_code
+        event = request.event
+        event.status_code = status_code
+        event.bytes_received = len(data or '')
 
         content_encoding = info.getheader("Content-Encoding")
-        if content_encoding == COMPRESSION_DEFLATE:
-            data = zlib.decompress(data)
-        elif content_encoding == COMPRESSION_GZIP:
-            data = GzipFile(fileobj=StringIO(data)).read()
-
+        if data and content_encoding in [COMPRESSION_DEFLATE,
+                                         COMPRESSION_GZIP]:
+            with event.timing('decompress'):
+                if content_encoding == COMPRESSION_DEFLATE:
+                    import zlib
+                    data = zlib.decompress(data)
+                else:
+                    from gzip import GzipFile
+                    from StringIO import StringIO
+                    data = GzipFile(fileobj=StringIO(data)).read()
+
+        event.bytes_received_decompressed = len(data or '')
         self.__data = data
         self.__info = info
+        self.__decoded = False
+        self.__decoded_data = None
 
     def __getitem__(self, header):
         '''
@@ -303,17 +672,30 @@ class Response(object):
         '''
         return self.__request
 
+    @property
+    def event(self):
+        '''
+        Gets the measurements recorded for the request and its response.
+        @return: RequestEvent
+        '''
+        return self.__request.event
+
     @property
     def data(self):
         '''
-        Gets the data found in the body of the response
+        Gets the data found in the body of the response. The body is parsed
+        the first time the data is read.
         @return: dict
         '''
-        try:
-            return json.loads(self.__data)
-        except:
-            raise ValueError('Unable to parse the response received:\n' +
-                             (self.__data or ''))
+        if not self.__decoded:
+            try:
+                with self.event.timing('decode'):
+                    self.__decoded_data = json.loads(self.__data)
+            except:
+                raise ValueError('Unable to parse the response received:\n' +
+                                 (self.__data or ''))
+            self.__decoded = True
+        return self.__decoded_data
 
 
 class Etag(object):
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+import os
+import urlparse
+from datetime import datetime
+from greendizer.clients import http, transport
+from greendizer.clients.concurrency import run_concurrently
+
+
+__all__ = ('PDFExporter', 'EXPORT_DOWNLOADED', 'EXPORT_RESUMED',
+           'EXPORT_SKIPPED')
+
+
+EXPORT_DOWNLOADED = 'downloaded'
+EXPORT_RESUMED = 'resumed'
+EXPORT_SKIPPED = 'skipped'
+CHUNK_SIZE = 64 * 1024
+PARTIAL_SUFFIX = '.part'
+ETAG_SUFFIX = '.etag'
+MAX_REDIRECTS = 5
+REDIRECT_CODES = frozenset([301, 302, 303, 307])
+
+
+class PDFExporter(object):
+    '''
+    Downloads the PDF version of invoices to a directory.
+    The URLs of the PDF files are resolved through the clients of the
+    invoices, and the files downloaded concurrently over pooled connections,
+    streamed to disk in chunks.
+    Interrupted downloads are resumed, and the invoices whose local copy
+    was downloaded for their current ETag are skipped.
+    Usage:
+        exporter = PDFExporter('/var/archive/invoices')
+        for outcome in exporter.export(email.invoices.all):
+            path, status = outcome.get()
+    '''
+    def __init__(self, directory, locale='en', max_workers=4,
+                 chunk_size=CHUNK_SIZE, pool=None):
+        '''
+        Initializes a new instance of the PDFExporter class.
+        @param directory:str Directory in which the files are written.
+        @param locale:str Language in which the PDFs should be rendered.
+        @param max_workers:int Maximum number of concurrent downloads.
+        @param chunk_size:int Number of bytes written at once.
+        @param pool:ConnectionPool Pool of connections to use.
+        '''
+        self.directory = directory
+        self.locale = locale
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
+        self.__pool = pool or transport.POOL
+
+    def path_for(self, invoice):
+        '''
+        Gets the path of the local copy of an invoice.
+        @param invoice:InvoiceBase
+        @return: str
+        '''
+        return os.path.join(self.directory,
+                            '%s-%s.pdf' % (invoice.email.id, invoice.id))
+
+    def is_current(self, invoice):
+        '''
+        Gets a value indicating whether the local copy of an invoice was
+        downloaded for its current ETag.
+        @param invoice:InvoiceBase
+        @return: bool
+        '''
+        path = self.path_for(invoice)
+        if not os.path.exists(path) or not os.path.exists(path + ETAG_SUFFIX):
+            return False
+
+        with open(path + ETAG_SUFFIX) as f:
+            return f.read().strip() == str(invoice.etag)
+
+    def export(self, invoices, callback=None):
+        '''
+        Exports the PDF version of invoices.
+        @param invoices:iterable InvoiceBase instances.
+        @param callback:function Callable notified with every Outcome.
+        @return: list Outcome instances whose values are (path, status)
+        tuples.
+        '''
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+        return run_concurrently(self.export_one, invoices, self.max_workers,
+                                callback)
+
+    def export_one(self, invoice):
+        '''
+        Exports the PDF version of an invoice.
+        @param invoice:InvoiceBase
+        @return: tuple (path, status)
+        '''
+        if invoice.etag.last_modified <= datetime(1970, 1, 1):
+            invoice.load_info()
+
+        path = self.path_for(invoice)
+        if self.is_current(invoice):
+            return path, EXPORT_SKIPPED
+
+        status = self.__download(invoice.get_pdf(self.locale), path)
+        with open(path + ETAG_SUFFIX, 'w') as f:
+            f.write(str(invoice.etag))
+
+        return path, status
+
+    def __download(self, url, path):
+        '''
+        Streams a file to disk, resuming a previous partial download.
+        Redirections are followed up to MAX_REDIRECTS times.
+        @param url:str URL of the file.
+        @param path:str Destination.
+        @return: str Status
+        '''
+        partial = path + PARTIAL_SUFFIX
+        offset = os.path.getsize(partial) if os.path.exists(partial) else 0
+        headers = {'User-Agent': http.USER_AGENT}
+        if offset:
+            headers['Range'] = 'bytes=%d-' % offset
+
+        for _ in xrange(MAX_REDIRECTS + 1):
+            response = self.__pool.urlopen('GET', url, headers=headers)
+            if response.status not in REDIRECT_CODES:
+                break
+            response.read()
+            self.__pool.release(response)
+            url = urlparse.urljoin(url, response.getheader('Location'))
+        else:
+            raise IOError('Unable to download %s (more than %d redirections)'
+                          % (url, MAX_REDIRECTS))
+
+        resumed = False
+        try:
+            if response.status == 416 and offset:  # Already complete
+                response.read()
+                resumed = True
+            elif response.status in [200, 206]:
+                resumed = response.status == 206
+                with open(partial, 'ab' if resumed else 'wb') as f:
+                    while True:
+                        chunk = response.read(self.chunk_size)
+                        if not chunk:
+                            break
+                        f.write(chunk)
+            else:
+                response.read()
+                raise IOError('Unable to download %s (code: %s)' %
+                              (url, response.status))
+        finally:
+            self.__pool.release(response)
+
+        os.rename(partial, path)
+        return EXPORT_RESUMED if resumed else EXPORT_DOWNLOADED
@@ -1,17 +1,17 @@
 # -*- coding: utf-8 -*-
-import re
-import hashlib
-import httplib
-from datetime import date
-from greendizer.clients.http import API_ROOT, USER_AGENT
-from greendizer.clients.helpers import CurrencyMetrics, Address
-from greendizer.clients.base import extract_id_from_uri, timestamp_to_datetime
+import urlparse
+from array import array
+from datetime import date, datetime, time, timedelta
+from greendizer.clients import http
+from greendizer.clients.helpers import (CurrencyMetrics, Address,
+                                        supported_currencies, CURRENCIES)
+from greendizer.clients.base import (extract_id_from_uri, timestamp_to_datetime,
+                                     datetime_to_timestamp)
 from greendizer.clients.dal import Resource, Node
 from greendizer.clients.http import Request
-try:
-    from pyxmli import CURRENCIES
-except ImportError:
-    CURRENCIES = []
+from greendizer.clients.routes import Resolver
+from greendizer.clients.concurrency import (map_concurrently, run_concurrently,
+                                            DEFAULT_MAX_WORKERS)
 
 
 PAYMENT_METHOD_GREENDIZER = 'greendizer'
@@ -28,6 +28,8 @@ class User(Resource):
     '''
     Represents a generic user on Greendizer.
     '''
+    route = 'user'
+
     def __init__(self, client):
         '''
         Initializes a new instance of the User class.
@@ -35,9 +37,18 @@ class User(Resource):
         super(User, self).__init__(client, "me")
         self.__company = Employer(self)
         self.__settings = Settings(self)
-        self.__balances = Node(client,
-                               self.uri + 'balances/',
-                               Balance)
+        self.__balances = BalanceNode(self)
+        self.__resolver = None
+
+    @property
+    def resolver(self):
+        '''
+        Gets the resolver turning URIs into resources of this user.
+        @return: Resolver
+        '''
+        if not self.__resolver:
+            self.__resolver = Resolver(self)
+        return self.__resolver
 
     @property
     def balances(self):
@@ -108,6 +119,8 @@ class Settings(Resource):
     '''
     Represents generic settings attached a user's account.
     '''
+    route = 'settings'
+
     def __init__(self, user):
         '''
         Initializes a new instance of the Settings class.
@@ -153,13 +166,15 @@ class Company(Resource):
     '''
     Represents a generic company's profile on Greendizer.
     '''
+    route = 'company'
+
     @property
     def uri(self):
         '''
         Gets the URI of the resource.
         @return: str
         '''
-        return "/companies/%s/" + self.id
+        return "companies/%s/" % self.id
 
     @property
     def name(self):
@@ -215,6 +230,8 @@ class Employer(Company):
     '''
     Represents the company employing a user on Greendizer.
     '''
+    route = 'employer'
+
     def __init__(self, user):
         '''
         Initializes a new instance of the Settings class.
@@ -236,6 +253,8 @@ class EmailBase(Resource):
     '''
     Represent an email address on Greendizer
     '''
+    route = 'email'
+
     def __init__(self, user, identifier):
         '''
         Initializes a new instance of the Email class
@@ -243,6 +262,7 @@ class EmailBase(Resource):
         @param identifier:str ID of the email resource.
         '''
         if "@" in identifier:
+            import hashlib
             identifier = hashlib.sha1(identifier.lower()).hexdigest()
 
         super(EmailBase, self).__init__(user.client, identifier)
@@ -281,6 +301,8 @@ class InvoiceBase(Resource):
     '''
     Represent an email address on Greendizer
     '''
+    route = 'invoice'
+
     def __init__(self, email, identifier):
         '''
         Initializes a new instance of the Email class
@@ -344,14 +366,18 @@ class InvoiceBase(Resource):
     def remaining(self):
         '''
         Gets the remaining amount to this invoice.
+        Use Client.deadline() to bound the time spent loading the invoice
+        and its payments, and remaining_for() to compute the remaining
+        amounts of many invoices at once.
         @return: float
         '''
         if self.paid:
             return 0.0
 
-        self.payments.all.populate(offset=None, limit=None)
-        return float(sum([payment.amount for payment in self.payments.all]))
-
+        payments = self.payments.all
+        payments.populate(offset=None, limit=None)
+        return float(self.total or 0) - sum([float(payment.amount or 0)
+                                             for payment in payments])
 
     @property
     def body(self):
@@ -452,43 +478,52 @@ class InvoiceBase(Resource):
     archived = property(__get_archived, __set_archived)
     read = property(__get_read, __set_read)
     flagged = property(__get_flagged, __set_flagged)
-    paid = property(__get_flagged, __set_flagged)
+    paid = property(__get_paid, __set_paid)
     
     def get_pdf(self, locale='en'):
         '''
         Gets the URI of the PDF version of the invoice
+        @param locale:str Language in which the PDF should be rendered.
         @return: str
         '''
-        http = httplib.HTTP(API_ROOT)
-        http.request('GET', self.uri)
-        http.putheader('Accept', 'application/pdf')
-        http.putheader('Accept-Language', locale)
-        http.putheader('User-Agent', USER_AGENT)
-        response = http.getresponse()
-        if response.status != 302:
-            raise PDFError
-        return response.headers['Location'] 
+        request = Request(self.client, uri=self.uri, follow_redirects=False)
+        request["Accept"] = "application/pdf"
+        request["Accept-Language"] = locale
+        response = request.get_response()
+        if response.status_code not in http.REDIRECT_CODES:
+            raise PDFError('Unexpected response from the server (code: %s)'
+                           % response.status_code)
+
+        return urlparse.urljoin(request.uri.geturl(), response["Location"])
 
     @classmethod
     def from_uri(cls, user, uri):
         '''
-        Instantiates an Invoice class instance using a URI.
+        Gets the invoice addressed by a URI. The instance is shared with the
+        other callers resolving the same URI (see Resolver.resolve).
         @param user:User instance
         @param uri:str URI
-        @return: InvoiceBase
+        @return: InvoiceBase or None if the URI does not address an invoice
+        of the user.
         '''
-        if '/me/' in user.uri:
-            user.load_info()
-            
-        match = re.compile('/' + user.uri +
-                           'emails\/(?P<email>.+)\/invoices' +
-                           '\/(?P<id>.+)\/$',
-                           re.LOCALE).search(uri)
-        if not match:
-            return
-        
-        return cls(user.emails[match.groupdict()['email']],
-                   match.groupdict()['id'])
+        instance = user.resolver.resolve(uri)
+        return instance if isinstance(instance, cls) else None
+
+
+def remaining_for(invoices, max_workers=DEFAULT_MAX_WORKERS):
+    '''
+    Computes the remaining amounts of many invoices, fetching their payments
+    concurrently. Payment collections are requested conditionally, so the
+    invoices whose payments did not change since the previous call with
+    the same instances only cost a '304 Not Modified' response.
+    @param invoices:iterable InvoiceBase instances.
+    @param max_workers:int Maximum number of concurrent requests.
+    @return: array Remaining amounts as an array of doubles, in the order of
+    the invoices. It exposes the buffer interface, so numpy.frombuffer()
+    wraps it without copy.
+    '''
+    return array('d', map_concurrently(lambda invoice: invoice.remaining,
+                                       invoices, max_workers))
 
 
 class InvoiceNodeBase(Node):
@@ -577,6 +612,8 @@ class Payment(Resource):
     '''
     Represents a payment recorded for an invoice.
     '''
+    route = 'payment'
+
     def __init__(self, invoice, identifier):
         '''
         Initializes a new instance of the Payment class.
@@ -668,6 +705,15 @@ class PaymentNode(Node):
                                           invoice.uri + 'payments/',
                                           Payment)
 
+    def get(self, identifier, **kwargs):
+        '''
+        Gets a payment by its ID.
+        @param identifier:str ID of the payment.
+        @return: Payment
+        '''
+        return super(PaymentNode, self).get(self.__invoice, identifier,
+                                            **kwargs)
+
     @property
     def invoice(self):
         '''
@@ -704,6 +750,16 @@ class AnalyticsBase(Resource):
     '''
     Represents a resource holding a history for different currencies.
     '''
+    def __init__(self, client, identifier='0'):
+        '''
+        Initializes a new instance of the AnalyticsBase class.
+        @param client:Client Current client instance.
+        @param identifier:str ID of the resource.
+        '''
+        self.__metrics = {}
+        self.__available_currencies = None
+        super(AnalyticsBase, self).__init__(client, identifier)
+
     def __getitem__(self, currency_code):
         '''
         Gets stats about the exchanges made with a specific currency.
@@ -715,22 +771,52 @@ class AnalyticsBase(Resource):
     def get_currency_metrics(self, currency_code):
         '''
         Gets stats about the exchanges made with a specific currency.
+        Metrics are parsed once and cached until the next sync.
         @param currency_code:str 3 letters ISO Currency code.
-        @return: dict
+        @return: CurrencyMetrics
         '''
-        if currency_code not in self.available_currencies:
+        currency_code = currency_code.upper()
+        try:
+            return self.__metrics[currency_code]
+        except KeyError:
+            pass
+
+        if currency_code not in (self.available_currencies or ()):
             raise ValueError("Data is not available in " + currency_code)
 
-        return CurrencyMetrics(currency_code.upper(),
-                               self._get_attribute(currency_code.upper()))
+        metrics = CurrencyMetrics(currency_code,
+                                  self._get_attribute(currency_code))
+        self.__metrics[currency_code] = metrics
+        return metrics
 
     @property
     def available_currencies(self):
         '''
-        Gets the list of currencies for which a digest is available.
-        @return: list
+        Gets the set of currencies for which a digest is available, or None
+        if the server did not provide it.
+        @return: frozenset
+        '''
+        if self.__available_currencies is None:
+            currencies = self._get_attribute('currencies')
+            if currencies is None:
+                return None
+            self.__available_currencies = frozenset(c.upper()
+                                                    for c in currencies)
+        return self.__available_currencies
+
+    def sync(self, data, etag, fields=None, partial=False):
+        '''
+        Updates the current representation with another one, and discards
+        the metrics parsed from the previous one.
+        @param data:dict New representation
+        @param fields:Projection Fields of the new representation.
+        @param partial:bool A value indicating whether the new representation
+        only holds some attributes.
+        @return: bool A value indicating whether the representation has changed.
         '''
-        return self._get_attribute('currencies')
+        self.__metrics = {}
+        self.__available_currencies = None
+        return super(AnalyticsBase, self).sync(data, etag, fields, partial)
 
     @property
     def name(self):
@@ -811,11 +897,59 @@ class TimespanDigestNode(Node):
         return super(TimespanDigestNode, self).get(self.__entry, identifier,
                                                    default=default, **kwargs)
 
+    def range(self, start, end, currencies=None, fill_value=0.0,
+              max_workers=DEFAULT_MAX_WORKERS):
+        '''
+        Gets the digests of every period between two dates, fetched
+        concurrently, as dense series indexed by time and currency.
+        Dates stand for whole days.
+        @param start:datetime|date First period (included).
+        @param end:datetime|date Last period (included).
+        @param currencies:list Currencies to include. Defaults to all.
+        @param fill_value:float Value of the periods without digest.
+        @param max_workers:int Maximum number of concurrent requests.
+        @return: greendizer.clients.analytics.DigestSeries
+        '''
+        from greendizer.clients.analytics import DigestSeries
+        if not isinstance(start, datetime):
+            start = datetime.combine(start, time.min)
+        if not isinstance(end, datetime):
+            end = datetime.combine(end, time.max)
+
+        times, current = [], self._resource_cls.truncate(start)
+        while current <= end:
+            times.append(current)
+            current += self._resource_cls.span
+
+        digests = [outcome.get() for outcome in run_concurrently(
+                   lambda t: self.get(str(datetime_to_timestamp(t))),
+                   times, max_workers)]
+        return DigestSeries(times, digests, currencies, fill_value)
+
 
 class DailyDigest(TimespanDigest):
     '''
     Represents daily spanning over a day.
     '''
+    span = timedelta(days=1)
+
+    @classmethod
+    def truncate(cls, value):
+        '''
+        Gets the beginning of the day of a datetime.
+        @param value:datetime
+        @return: datetime
+        '''
+        return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    @property
+    def route(self):
+        '''
+        Gets the name of the route of the digest.
+        @return: str
+        '''
+        return self._entry.route + '.day'
+
     @property
     def uri(self):
         '''
@@ -829,6 +963,25 @@ class HourlyDigest(TimespanDigest):
     '''
     Represents daily spanning over an hour.
     '''
+    span = timedelta(hours=1)
+
+    @classmethod
+    def truncate(cls, value):
+        '''
+        Gets the beginning of the hour of a datetime.
+        @param value:datetime
+        @return: datetime
+        '''
+        return value.replace(minute=0, second=0, microsecond=0)
+
+    @property
+    def route(self):
+        '''
+        Gets the name of the route of the digest.
+        @return: str
+        '''
+        return self._entry.route + '.hour'
+
     @property
     def uri(self):
         '''
@@ -842,6 +995,8 @@ class Balance(Resource):
     '''
     Represents the balance of a user in a specific currency.
     '''
+    route = 'balance'
+
     def __init__(self, user, currency):
         '''
         Initializes a new instance of the Balance class.
@@ -849,7 +1004,8 @@ class Balance(Resource):
         @param currency:str Currency code.
         '''
         currency = currency.upper()
-        if len(CURRENCIES) and currency not in CURRENCIES:
+        currencies = supported_currencies()
+        if currencies and currency not in currencies:
             raise ValueError('Invalid currency code')
 
         self.__user = user
@@ -863,7 +1019,7 @@ class Balance(Resource):
         Gets the URI of the balance
         @returns: str
         '''
-        return '%balances/%s' % (self.__user.uri, self.currency)
+        return '%sbalances/%s/' % (self.__user.uri, self.currency)
 
     @property
     def user(self):
@@ -898,10 +1054,34 @@ class Balance(Resource):
         return self.__transactions
 
 
+class BalanceNode(Node):
+    '''
+    Node giving access to the balances of a user.
+    '''
+    def __init__(self, user):
+        '''
+        Initializes a new instance of the BalanceNode class.
+        @param user:User Currently authenticated user.
+        '''
+        self.__user = user
+        super(BalanceNode, self).__init__(user.client, user.uri + 'balances/',
+                                          Balance)
+
+    def get(self, currency, **kwargs):
+        '''
+        Gets the balance of a currency.
+        @param currency:str Currency code.
+        @return: Balance
+        '''
+        return super(BalanceNode, self).get(self.__user, currency, **kwargs)
+
+
 class Transaction(Resource):
     '''
     Represents a payment transaction attached to a specific balance.
     '''
+    route = 'transaction'
+
     def __init__(self, balance, identifier):
         '''
         Initializes a new instance of the Transaction class.
@@ -977,32 +1157,26 @@ class Transaction(Resource):
         Gets the status of the transaction.
         @return: str
         '''
-        if self.type is not TRANSACTION_TYPE_PAYMENT:
+        if self.type != TRANSACTION_TYPE_PAYMENT:
             return []
 
-        return [InvoiceBase.from_uri(self.balance.user, uri)
-                for uri in self._get_attribute('invoices')]
+        return [invoice for invoice in self.balance.user.resolver.resolve_all(
+                    self._get_attribute('invoices')) if invoice]
 
     rank = property(__get_rank, __set_rank)
 
     @classmethod
     def from_uri(cls, user, uri):
         '''
-        Instantiates a Transaction class instance using a URI.
+        Gets the transaction addressed by a URI. The instance is shared with
+        the other callers resolving the same URI (see Resolver.resolve).
         @param user:User instance
         @param uri:str URI
-        @return: Transaction
+        @return: Transaction or None if the URI does not address a
+        transaction of the user.
         '''
-        match = re.compile('^' + user.uri +
-                           'balances\/(?P<currency>[a-z]{3})\/transactions' +
-                           '\/(?P<id>\d+)\/$',
-                           re.IGNORECASE).match(uri)
-
-        if not match:
-            return
-
-        return cls(user.balances[match.groupdict()['currency']],
-                   match.groupdict()['id'])
+        instance = user.resolver.resolve(uri)
+        return instance if isinstance(instance, cls) else None
 
 
 class TransactionNode(Node):
@@ -1018,6 +1192,15 @@ class TransactionNode(Node):
                                               balance.uri + 'transactions/',
                                               Transaction)
 
+    def get(self, identifier, **kwargs):
+        '''
+        Gets a transaction by its ID.
+        @param identifier:str ID of the transaction.
+        @return: Transaction
+        '''
+        return super(TransactionNode, self).get(self.__balance, identifier,
+                                                **kwargs)
+
     @property
     def balance(self):
         '''
@@ -1061,3 +1244,34 @@ class TransactionNode(Node):
         '''
         return self.__create_transaction(trans_type=TRANSACTION_TYPE_WITHDRAWAL,
                                          amount=amount)
+
+
+def _resolve_buyer(resolver, params):
+    buyers = getattr(resolver.user, 'buyers', None)
+    return buyers[params['buyer']] if buyers else None
+
+
+def _resolve_seller(resolver, params):
+    sellers = getattr(resolver.get('email', params), 'sellers', None)
+    return sellers[params['seller']] if sellers else None
+
+
+for name, factory in [
+    ('user', lambda r, p: r.user),
+    ('settings', lambda r, p: r.user.settings),
+    ('employer', lambda r, p: r.user.company),
+    ('company', lambda r, p: Company(r.user.client, p['company'])),
+    ('email', lambda r, p: r.user.emails[p['email']]),
+    ('invoice', lambda r, p: r.get('email', p).invoices[p['invoice']]),
+    ('payment', lambda r, p: r.get('invoice', p).payments[p['payment']]),
+    ('balance', lambda r, p: r.user.balances[p['currency']]),
+    ('transaction',
+     lambda r, p: r.get('balance', p).transactions[p['transaction']]),
+    ('buyer', _resolve_buyer),
+    ('buyer.day', lambda r, p: r.get('buyer', p).days[p['day']]),
+    ('buyer.hour', lambda r, p: r.get('buyer', p).hours[p['hour']]),
+    ('seller', _resolve_seller),
+    ('seller.day', lambda r, p: r.get('seller', p).days[p['day']]),
+    ('seller.hour', lambda r, p: r.get('seller', p).hours[p['hour']])]:
+    Resolver.register(name, factory)
+del name, factory
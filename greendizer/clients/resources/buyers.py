@@ -132,6 +132,8 @@ class Seller(AnalyticsBase):
     Represents a seller who has invoiced the currently authenticated user
     in the past.
     '''
+    route = 'seller'
+
     def __init__(self, email, identifier):
         '''
         Initializes a new instance of the Seller class.
@@ -140,8 +142,8 @@ class Seller(AnalyticsBase):
         '''
         self.__email = email
         super(Seller, self).__init__(email.client, identifier)
-        self.__days = TimespanDigestNode(self, 'days/', DailyDigest)
-        self.__hours = TimespanDigestNode(self, 'hours/', HourlyDigest)
+        self.__days = TimespanDigestNode(self, 'days', DailyDigest)
+        self.__hours = TimespanDigestNode(self, 'hours', HourlyDigest)
 
 
     @property
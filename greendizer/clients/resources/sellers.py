@@ -1,9 +1,9 @@
 # -*- coding: utf-8 -*-
-import logging
 from greendizer.clients.helpers import Address
 from greendizer.clients.base import (extract_id_from_uri, size_in_bytes)
-from greendizer.clients.http import Request
+from greendizer.clients.http import Request, deadline_scope
 from greendizer.clients.dal import Node
+from greendizer.clients.concurrency import map_concurrently, DEFAULT_MAX_WORKERS
 from greendizer.clients.resources import (User, EmailBase, InvoiceBase,
                                   InvoiceNodeBase, AnalyticsBase, DailyDigest,
                                   HourlyDigest, TimespanDigestNode)
@@ -135,12 +135,24 @@ class InvoiceNode(InvoiceNodeBase):
 
         return collection[0]
     
-    def send(self, invoice, signature=True):
+    def send(self, invoice, signature=True, deadline=None):
         '''
         Sends an invoice
         @param invoices:list List of invoices to send.
+        @param deadline:object Deadline or number of seconds within which the
+        company info must be loaded and the invoice sent.
         @return: InvoiceReport
         '''
+        with deadline_scope(deadline):
+            return self.__send(invoice, signature)
+
+    def __send(self, invoice, signature):
+        '''
+        Sends an invoice
+        @param invoice:pyxmli.Invoice Invoice to send.
+        @param signature:bool A value indicating whether to sign the invoice.
+        @return: Invoice
+        '''
         from pyxmli import Invoice as XMLiInvoice
         if not issubclass(invoice.__class__, XMLiInvoice):
             raise ValueError('\'invoice\' is not an instance of ' \
@@ -148,6 +160,7 @@ class InvoiceNode(InvoiceNodeBase):
         private_key, public_key = self.email.client.keys
         enable_signature = signature and private_key and public_key
         if enable_signature != signature:
+            import logging
             logging.warn('Missing private and/or public key(s). Invoices ' \
                          'will not be signed.') 
         
@@ -287,11 +300,33 @@ class BuyerNode(Node):
         '''
         return super(BuyerNode, self).get(self.__seller, identifier, **kwargs)
 
+    def analytics(self, currencies=None, max_workers=DEFAULT_MAX_WORKERS):
+        '''
+        Loads the analytics of every buyer into a table with one row per
+        buyer and currency. Buyers are retrieved page by page, and the ones
+        whose analytics were not included in the pages are loaded
+        concurrently.
+        @param currencies:list Currencies to include. Defaults to all.
+        @param max_workers:int Maximum number of concurrent requests.
+        @return: greendizer.clients.analytics.AnalyticsTable
+        '''
+        from greendizer.clients.analytics import AnalyticsTable
+        collection = self.all
+        collection.retrieve_all()
+        buyers = list(collection)
+        map_concurrently(lambda buyer: buyer.load(),
+                         [buyer for buyer in buyers
+                          if buyer.available_currencies is None],
+                         max_workers)
+        return AnalyticsTable(buyers, currencies)
+
 
 class Buyer(AnalyticsBase):
     '''
     Represents a customer of the seller.
     '''
+    route = 'buyer'
+
     def __init__(self, seller, identifier):
         '''
         Initializes a new instance of the Buyer class.
@@ -300,8 +335,8 @@ class Buyer(AnalyticsBase):
         self.__address = None
         self.__delivery_address = None
         super(Buyer, self).__init__(seller.client, identifier)
-        self.__days = TimespanDigestNode(self, 'days/', DailyDigest)
-        self.__hours = TimespanDigestNode(self, 'hours/', HourlyDigest)
+        self.__days = TimespanDigestNode(self, 'days', DailyDigest)
+        self.__hours = TimespanDigestNode(self, 'hours', HourlyDigest)
 
 
     @property
@@ -0,0 +1,426 @@
+# -*- coding: utf-8 -*-
+import re
+from weakref import WeakValueDictionary
+
+
+__all__ = ('Route', 'RouteMatch', 'Router', 'Resolver', 'ROUTER')
+
+
+PLACEHOLDER_PATTERN = re.compile(r'\{(?P<name>\w+)(?::(?P<choices>[\w|]+))?\}')
+MATCH_CACHE_SIZE = 10000
+
+
+def split_uri(uri):
+    '''
+    Splits a URI into its path segments, ignoring the API root, the query
+    string and the slashes.
+    @param uri:str URI
+    @return: list
+    '''
+    uri = uri.split('?', 1)[0]
+    if '://' in uri:
+        uri = uri.split('://', 1)[1].split('/', 1)[-1]
+    return [segment for segment in uri.split('/') if segment]
+
+
+class Route(object):
+    '''
+    Represents a named URI template such as
+    'sellers/{user}/emails/{email}/invoices/{invoice}/'.
+    Placeholders can restrict the values they accept: {role:sellers|buyers}.
+    '''
+    def __init__(self, name, template):
+        '''
+        Initializes a new instance of the Route class.
+        @param name:str Name of the route.
+        @param template:str URI template.
+        '''
+        self.__name = name
+        self.__template = template
+        self.__format = PLACEHOLDER_PATTERN.sub(r'%(\g<name>)s', template)
+        self.__segments = []
+        for segment in template.split('/'):
+            if not segment:
+                continue
+            match = PLACEHOLDER_PATTERN.match(segment)
+            if not match:
+                self.__segments.append((segment, None, None))
+                continue
+            choices = match.group('choices')
+            self.__segments.append((None, match.group('name'),
+                                    choices.split('|') if choices else None))
+
+    @property
+    def name(self):
+        '''
+        Gets the name of the route.
+        @return: str
+        '''
+        return self.__name
+
+    @property
+    def template(self):
+        '''
+        Gets the URI template.
+        @return: str
+        '''
+        return self.__template
+
+    @property
+    def params(self):
+        '''
+        Gets the names of the placeholders of the template.
+        @return: list
+        '''
+        return [param for _, param, _ in self.__segments if param]
+
+    @property
+    def segments(self):
+        '''
+        Gets the parsed segments of the template as (literal, parameter,
+        choices) tuples.
+        @return: list
+        '''
+        return self.__segments
+
+    def build(self, **params):
+        '''
+        Builds a URI from the values of the placeholders.
+        @return: str
+        '''
+        return self.__format % params
+
+    def __repr__(self):
+        return '<Route %s %s>' % (self.__name, self.__template)
+
+
+class RouteMatch(object):
+    '''
+    Represents the result of the parsing of a URI.
+    '''
+    __slots__ = ('route', 'params')
+
+    def __init__(self, route, params):
+        '''
+        Initializes a new instance of the RouteMatch class.
+        @param route:Route Matching route.
+        @param params:dict Values of the placeholders.
+        '''
+        self.route = route
+        self.params = params
+
+    @property
+    def name(self):
+        '''
+        Gets the name of the matching route.
+        @return: str
+        '''
+        return self.route.name
+
+    @property
+    def key(self):
+        '''
+        Gets a hashable key identifying the resource addressed by the URI.
+        @return: tuple
+        '''
+        return (self.route.name,) + tuple(sorted(self.params.items()))
+
+
+class _Node(object):
+    '''
+    Represents a node of the segments tree.
+    '''
+    __slots__ = ('literals', 'wildcard', 'route')
+
+    def __init__(self):
+        self.literals = {}
+        self.wildcard = None
+        self.route = None
+
+
+class Router(object):
+    '''
+    Maps URIs to named routes. Templates are compiled once into a tree of
+    path segments so that parsing a URI costs one dictionary lookup per
+    segment, and recent results are memoized.
+    '''
+    def __init__(self):
+        '''
+        Initializes a new instance of the Router class.
+        '''
+        self.__root = _Node()
+        self.__routes = {}
+        self.__cache = {}
+
+    def __getitem__(self, name):
+        '''
+        Gets a route by its name.
+        @param name:str Name of the route.
+        @return: Route
+        '''
+        return self.__routes[name]
+
+    def __contains__(self, name):
+        return name in self.__routes
+
+    def __iter__(self):
+        return iter(self.__routes.values())
+
+    def add(self, name, template):
+        '''
+        Registers a route.
+        @param name:str Name of the route.
+        @param template:str URI template.
+        @return: Route
+        '''
+        route = Route(name, template)
+        nodes = [self.__root]
+        for literal, param, choices in route.segments:
+            following = []
+            for node in nodes:
+                if literal is not None:
+                    edges = [(literal, None)]
+                elif choices:
+                    edges = [(choice, param) for choice in choices]
+                else:
+                    if not node.wildcard:
+                        node.wildcard = (_Node(), param)
+                    if node.wildcard[1] != param:
+                        raise ValueError('Ambiguous placeholder \'%s\' in %s'
+                                         % (param, template))
+                    following.append(node.wildcard[0])
+                    continue
+
+                for segment, edge_param in edges:
+                    if segment not in node.literals:
+                        node.literals[segment] = (_Node(), edge_param)
+                    child, existing = node.literals[segment]
+                    if existing != edge_param:
+                        raise ValueError('Ambiguous segment \'%s\' in %s' %
+                                         (segment, template))
+                    following.append(child)
+            nodes = following
+
+        for node in nodes:
+            node.route = route
+
+        self.__routes[name] = route
+        self.__cache = {}
+        return route
+
+    def build(self, name, **params):
+        '''
+        Builds the URI of a route.
+        @param name:str Name of the route.
+        @return: str
+        '''
+        return self.__routes[name].build(**params)
+
+    def match(self, uri):
+        '''
+        Parses a URI.
+        @param uri:str URI
+        @return: RouteMatch or None
+        '''
+        try:
+            return self.__cache[uri]
+        except KeyError:
+            pass
+
+        result = self.__match(self.__root, split_uri(uri), 0)
+        if result:
+            route, params = result
+            result = RouteMatch(route, dict(params))
+
+        if len(self.__cache) >= MATCH_CACHE_SIZE:
+            self.__cache = {}
+        self.__cache[uri] = result
+        return result
+
+    def __match(self, node, segments, index):
+        '''
+        Walks the tree of segments, preferring literals over placeholders.
+        @return: tuple (Route, list) or None
+        '''
+        if index == len(segments):
+            return (node.route, []) if node.route else None
+
+        segment = segments[index]
+        edge = node.literals.get(segment)
+        if edge:
+            result = self.__match(edge[0], segments, index + 1)
+            if result:
+                if edge[1]:
+                    result[1].append((edge[1], segment))
+                return result
+
+        if node.wildcard:
+            result = self.__match(node.wildcard[0], segments, index + 1)
+            if result:
+                result[1].append((node.wildcard[1], segment))
+                return result
+
+
+class Resolver(object):
+    '''
+    Turns API URIs into resource instances relative to a user, without any
+    request to the server. Parent resources (emails, invoices, balances...)
+    are instantiated once and shared by all the URIs referencing them, which
+    makes the resolution of thousands of references cheap. Instances are
+    cached as long as they are referenced.
+    URIs of other users are not resolved. While the user is only known as
+    'me', the first URI carrying another user ID loads the user to learn
+    its ID.
+    '''
+    FACTORIES = {}
+
+    def __init__(self, user, router=None):
+        '''
+        Initializes a new instance of the Resolver class.
+        @param user:User User relative to whom URIs are resolved.
+        @param router:Router Router used to parse the URIs.
+        '''
+        self.__user = user
+        self.__router = router or ROUTER
+        self.__instances = WeakValueDictionary()
+        self.__user_loaded = False
+
+    @property
+    def user(self):
+        '''
+        Gets the user relative to whom URIs are resolved.
+        @return: User
+        '''
+        return self.__user
+
+    @classmethod
+    def register(cls, name, factory):
+        '''
+        Registers the callable instantiating the resources of a route.
+        @param name:str Name of the route.
+        @param factory:function Callable(resolver, params) returning a
+        resource instance or None.
+        '''
+        cls.FACTORIES[name] = factory
+
+    def get(self, name, params):
+        '''
+        Gets the resource of a route, instantiating it if needed.
+        @param name:str Name of the route.
+        @param params:dict Values of the placeholders.
+        @return: Resource or None
+        '''
+        route = self.__router[name]
+        key = (name,) + tuple(params[param] for param in route.params)
+        instance = self.__instances.get(key)
+        if instance is not None:
+            return instance
+
+        factory = self.FACTORIES.get(name)
+        instance = factory(self, params) if factory else None
+        if instance is not None:
+            instance = self.__instances.setdefault(key, instance)
+        return instance
+
+    def resolve(self, uri):
+        '''
+        Gets the resource addressed by a URI. Instances are cached and
+        shared: resolving a URI twice returns the same instance, along with
+        whatever was loaded or changed on it in between.
+        @param uri:str URI
+        @return: Resource or None if the URI is unknown or belongs to
+        another user.
+        '''
+        match = self.__router.match(uri)
+        if not match:
+            return None
+
+        params = match.params
+        role = params.get('role')
+        if role and not self.__user.uri.startswith(role + '/'):
+            return None
+
+        if 'user' in params:
+            if not self.__is_user(params['user']):
+                return None
+            params = dict(params, user='me')
+
+        return self.get(match.name, params)
+
+    def __is_user(self, identifier):
+        '''
+        Gets a value indicating whether a user ID designates the user of the
+        resolver.
+        @param identifier:str User ID found in a URI.
+        @return: bool
+        '''
+        if identifier in ['me', self.__user.id]:
+            return True
+
+        if self.__user.id == 'me' and not self.__user_loaded:
+            self.__user_loaded = True
+            self.__user.load_info()
+        return identifier == self.__user.id
+
+    def resolve_all(self, uris):
+        '''
+        Gets the resources addressed by a list of URIs.
+        @param uris:iterable URIs
+        @return: list
+        '''
+        return [self.resolve(uri) for uri in uris]
+
+
+ROUTER = Router()
+
+
+'''
+Routes of the resources exposed by the API. The names are the ones used
+to aggregate metrics, and are referenced by the `route` attribute of the
+resource classes.
+'''
+USER = '{role:sellers|buyers}/{user}/'
+EMAIL = USER + 'emails/{email}/'
+INVOICE = EMAIL + 'invoices/{invoice}/'
+BUYER = USER + 'buyers/{buyer}/'
+SELLER = EMAIL + 'sellers/{seller}/'
+BALANCE = USER + 'balances/{currency}/'
+
+for name, template in [('user', USER),
+                       ('settings', USER + 'settings/'),
+                       ('employer', USER + 'company/'),
+                       ('company', 'companies/{company}/'),
+                       ('emails', USER + 'emails/'),
+                       ('email', EMAIL),
+                       ('invoices', EMAIL + 'invoices/'),
+                       ('invoice', INVOICE),
+                       ('payments', INVOICE + 'payments/'),
+                       ('payment', INVOICE + 'payments/{payment}'),
+                       ('buyers', USER + 'buyers/'),
+                       ('buyer', BUYER),
+                       ('buyer.days', BUYER + 'days/'),
+                       ('buyer.day', BUYER + 'days/{day}'),
+                       ('buyer.hours', BUYER + 'hours/'),
+                       ('buyer.hour', BUYER + 'hours/{hour}'),
+                       ('sellers', EMAIL + 'sellers/'),
+                       ('seller', SELLER),
+                       ('seller.days', SELLER + 'days/'),
+                       ('seller.day', SELLER + 'days/{day}'),
+                       ('seller.hours', SELLER + 'hours/'),
+                       ('seller.hour', SELLER + 'hours/{hour}'),
+                       ('balances', USER + 'balances/'),
+                       ('balance', BALANCE),
+                       ('transactions', BALANCE + 'transactions/'),
+                       ('transaction', BALANCE + 'transactions/{transaction}/'),
+                       ]:
+    ROUTER.add(name, template)
+del name, template
+
+
+def match(uri):
+    '''
+    Parses a URI with the default router.
+    @param uri:str URI
+    @return: RouteMatch or None
+    '''
+    return ROUTER.match(uri)
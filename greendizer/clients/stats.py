@@ -0,0 +1,417 @@
+# -*- coding: utf-8 -*-
+import sys
+import math
+import time
+import threading
+from greendizer.clients import http
+
+
+__all__ = ('Histogram', 'LatencyAggregator', 'ClientStats', 'Profile')
+
+
+PERCENTILES = (50, 95, 99)
+
+
+class Histogram(object):
+    '''
+    Represents a histogram of durations using logarithmic buckets, so that
+    memory stays constant whatever the number of samples recorded.
+    '''
+    def __init__(self, precision=0.05, smallest=1e-6):
+        '''
+        Initializes a new instance of the Histogram class.
+        @param precision:float Relative width of a bucket.
+        @param smallest:float Smallest value distinguished, in seconds.
+        '''
+        self.__base = math.log(1 + precision)
+        self.__smallest = smallest
+        self.__buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        '''
+        Records a value.
+        @param value:float Value to record.
+        '''
+        index = int(math.log(max(value, self.__smallest) / self.__smallest) /
+                    self.__base)
+        self.__buckets[index] = self.__buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    @property
+    def mean(self):
+        '''
+        Gets the average of the values recorded.
+        @return: float
+        '''
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, p):
+        '''
+        Gets an estimation of a percentile.
+        @param p:float Percentile between 0 and 100.
+        @return: float
+        '''
+        if not self.count:
+            return 0.0
+
+        rank, seen = math.ceil(self.count * p / 100.0), 0
+        for index in sorted(self.__buckets):
+            seen += self.__buckets[index]
+            if seen >= rank:
+                upper = self.__smallest * math.exp((index + 1) * self.__base)
+                return min(max(upper, self.min), self.max)
+
+        return self.max
+
+    def summary(self):
+        '''
+        Gets the count, mean and percentiles of the histogram.
+        @return: dict
+        '''
+        summary = {'count': self.count, 'mean': self.mean,
+                   'min': self.min or 0.0, 'max': self.max or 0.0}
+        for p in PERCENTILES:
+            summary['p%d' % p] = self.percentile(p)
+        return summary
+
+
+class LatencyAggregator(object):
+    '''
+    Aggregates the measurements of the requests sent by the library into
+    histograms per endpoint and phase.
+    Usage:
+        aggregator = LatencyAggregator().install()
+        ...
+        print aggregator.report()
+    '''
+    def __init__(self):
+        '''
+        Initializes a new instance of the LatencyAggregator class.
+        '''
+        self.__lock = threading.Lock()
+        self.__histograms = {}
+        self.__counters = {}
+
+    def __call__(self, event, phase, seconds):
+        '''
+        Records the duration of a phase.
+        @param event:RequestEvent Request measured.
+        @param phase:str Name of the phase.
+        @param seconds:float Duration.
+        '''
+        key = (event.method, event.route)
+        with self.__lock:
+            histogram = self.__histograms.get(key + (phase,))
+            if not histogram:
+                histogram = self.__histograms[key + (phase,)] = Histogram()
+            histogram.add(seconds)
+
+            if phase == 'total':
+                counters = self.__counters.setdefault(key, {
+                    'requests': 0, 'retries': 0, 'bytes_sent': 0,
+                    'bytes_sent_compressed': 0, 'bytes_received': 0,
+                    'bytes_received_decompressed': 0, 'status_codes': {}})
+                counters['requests'] += 1
+                counters['retries'] += event.retries
+                for name in ['bytes_sent', 'bytes_sent_compressed',
+                             'bytes_received', 'bytes_received_decompressed']:
+                    counters[name] += getattr(event, name)
+                codes = counters['status_codes']
+                codes[event.status_code] = codes.get(event.status_code, 0) + 1
+
+    def install(self):
+        '''
+        Registers the aggregator as a request hook.
+        @return: LatencyAggregator
+        '''
+        http.add_hook(self)
+        return self
+
+    def uninstall(self):
+        '''
+        Unregisters the aggregator.
+        '''
+        http.remove_hook(self)
+
+    def reset(self):
+        '''
+        Discards everything recorded so far.
+        '''
+        with self.__lock:
+            self.__histograms = {}
+            self.__counters = {}
+
+    def histogram(self, method, route, phase='total'):
+        '''
+        Gets the histogram of a phase for an endpoint.
+        @param method:str HTTP method.
+        @param route:str Endpoint.
+        @param phase:str Name of the phase.
+        @return: Histogram
+        '''
+        return self.__histograms.get((method.upper(), route, phase))
+
+    def report(self):
+        '''
+        Gets a summary per endpoint of the counters recorded and of the
+        percentiles of each phase.
+        @return: list
+        '''
+        with self.__lock:
+            entries = {}
+            for (method, route, phase), histogram in self.__histograms.items():
+                entry = entries.setdefault((method, route), {
+                    'method': method, 'route': route, 'phases': {}})
+                entry['phases'][phase] = histogram.summary()
+                entry.update(self.__counters.get((method, route), {}))
+
+        return sorted(entries.values(),
+                      key=lambda e: e['phases'].get('total', {})
+                                     .get('mean', 0) * e.get('requests', 0),
+                      reverse=True)
+
+
+class ClientStats(object):
+    '''
+    Counts the requests sent by a client per method and route, along with
+    the bytes exchanged, the conditional requests answered from the cache
+    of the server (304) and the resources lazily loaded when one of their
+    attributes was read, per class and call site.
+    '''
+    def __init__(self):
+        '''
+        Initializes a new instance of the ClientStats class.
+        '''
+        self.__lock = threading.Lock()
+        self.__listeners = []
+        self.reset()
+
+    def reset(self):
+        '''
+        Discards everything counted so far.
+        '''
+        with self.__lock:
+            self.__routes = {}
+            self.__lazy_loads = {}
+            self.__lazy_load_sites = {}
+            self.requests = 0
+            self.errors = 0
+            self.time = 0.0
+            self.bytes_sent = 0
+            self.bytes_received = 0
+            self.conditional_requests = 0
+            self.cache_hits = 0
+
+    def attach(self, listener):
+        '''
+        Forwards everything counted from now on to other statistics.
+        @param listener:ClientStats
+        '''
+        with self.__lock:
+            self.__listeners = self.__listeners + [listener]
+
+    def detach(self, listener):
+        '''
+        Stops forwarding to other statistics.
+        @param listener:ClientStats
+        '''
+        with self.__lock:
+            self.__listeners = [l for l in self.__listeners
+                                if l is not listener]
+
+    def record(self, event):
+        '''
+        Counts a request once it has completed.
+        @param event:RequestEvent Measurements of the request.
+        '''
+        seconds = event.timings.get('total', 0.0)
+        headers = event.request.headers
+        conditional = 'If-None-Match' in headers or 'If-Match' in headers
+        failed = not event.status_code or event.status_code >= 400
+        with self.__lock:
+            route = self.__routes.get((event.method, event.route))
+            if not route:
+                route = self.__routes[(event.method, event.route)] = {
+                    'method': event.method, 'route': event.route,
+                    'requests': 0, 'errors': 0, 'time': 0.0,
+                    'bytes_sent': 0, 'bytes_received': 0}
+            route['requests'] += 1
+            route['errors'] += failed
+            route['time'] += seconds
+            route['bytes_sent'] += event.bytes_sent_compressed
+            route['bytes_received'] += event.bytes_received
+            self.requests += 1
+            self.errors += failed
+            self.time += seconds
+            self.bytes_sent += event.bytes_sent_compressed
+            self.bytes_received += event.bytes_received
+            if conditional:
+                self.conditional_requests += 1
+                self.cache_hits += event.status_code == 304
+            listeners = self.__listeners
+
+        for listener in listeners:
+            listener.record(event)
+
+    def record_lazy_load(self, resource, call_site=None):
+        '''
+        Counts a resource loaded because one of its attributes was read
+        before it was retrieved.
+        @param resource:Resource
+        @param call_site:str Location of the code which read the attribute.
+        '''
+        name = type(resource).__name__
+        key = (name, call_site)
+        with self.__lock:
+            self.__lazy_loads[name] = self.__lazy_loads.get(name, 0) + 1
+            self.__lazy_load_sites[key] = self.__lazy_load_sites.get(key, 0) + 1
+            listeners = self.__listeners
+
+        for listener in listeners:
+            listener.record_lazy_load(resource, call_site)
+
+    @property
+    def cache_hit_ratio(self):
+        '''
+        Gets the share of the conditional requests answered with a 304.
+        @return: float
+        '''
+        if not self.conditional_requests:
+            return 0.0
+        return float(self.cache_hits) / self.conditional_requests
+
+    @property
+    def lazy_loads(self):
+        '''
+        Gets the number of lazy loads per resource class.
+        @return: dict
+        '''
+        with self.__lock:
+            return dict(self.__lazy_loads)
+
+    def avoidable_loads(self):
+        '''
+        Gets the call sites which lazily loaded several resources of the
+        same class, along with the number of requests that retrieving them
+        by pages beforehand would have saved.
+        @return: list Dicts, by decreasing number of avoidable requests.
+        '''
+        from greendizer.clients.dal import RESPONSE_SIZE_LIMIT
+        with self.__lock:
+            sites = self.__lazy_load_sites.items()
+
+        avoidable = []
+        for (name, call_site), loads in sites:
+            pages = int(math.ceil(float(loads) / RESPONSE_SIZE_LIMIT))
+            if loads > pages:
+                avoidable.append({'resource': name, 'call_site': call_site,
+                                  'loads': loads, 'avoidable': loads - pages})
+        return sorted(avoidable, key=lambda a: a['avoidable'], reverse=True)
+
+    def routes(self):
+        '''
+        Gets the counters of each method and route, by decreasing
+        cumulative time.
+        @return: list
+        '''
+        with self.__lock:
+            routes = [dict(route) for route in self.__routes.values()]
+        return sorted(routes, key=lambda r: r['time'], reverse=True)
+
+    def summary(self):
+        '''
+        Gets a serializable version of the statistics.
+        @return: dict
+        '''
+        return {'requests': self.requests,
+                'errors': self.errors,
+                'time': self.time,
+                'bytes_sent': self.bytes_sent,
+                'bytes_received': self.bytes_received,
+                'conditional_requests': self.conditional_requests,
+                'cache_hits': self.cache_hits,
+                'cache_hit_ratio': self.cache_hit_ratio,
+                'lazy_loads': self.lazy_loads,
+                'avoidable_loads': self.avoidable_loads(),
+                'routes': self.routes()}
+
+    def report(self, limit=10):
+        '''
+        Gets a human readable report of the statistics, listing the routes
+        on which the most time was spent.
+        @param limit:int Maximum number of routes listed.
+        @return: str
+        '''
+        lines = ['%d requests (%d errors) in %.3fs, %d bytes sent, '
+                 '%d bytes received' % (self.requests, self.errors, self.time,
+                                        self.bytes_sent, self.bytes_received),
+                 'Cache hits: %d/%d (%.0f%%)' % (self.cache_hits,
+                                                 self.conditional_requests,
+                                                 self.cache_hit_ratio * 100)]
+        lazy_loads = sorted(self.lazy_loads.items(), key=lambda i: -i[1])
+        if lazy_loads:
+            lines.append('Lazy loads: ' + ', '.join('%s %d' % item
+                                                    for item in lazy_loads))
+        for site in self.avoidable_loads()[:limit]:
+            lines.append('  %(loads)d %(resource)s loads at %(call_site)s, '
+                         '%(avoidable)d avoidable by loading them by pages'
+                         % site)
+
+        routes = self.routes()[:limit]
+        if routes:
+            lines.append('%10s %6s %8s %11s  %s' % ('time', '%', 'requests',
+                                                   'mean', 'route'))
+        for route in routes:
+            lines.append('%9.3fs %5.1f%% %8d %9.2fms  %s %s' % (
+                            route['time'],
+                            route['time'] * 100 / (self.time or 1),
+                            route['requests'],
+                            route['time'] * 1000 / route['requests'],
+                            route['method'], route['route']))
+        return '\n'.join(lines)
+
+
+class Profile(object):
+    '''
+    Counts the requests sent by a client within a block and prints the
+    routes on which the most time was spent when leaving it.
+    Usage:
+        with client.profile() as p:
+            client.seller.emails['e1'].invoices.search().retrieve_all()
+        print p.stats.lazy_loads
+    '''
+    def __init__(self, stats, limit=10, output=None):
+        '''
+        Initializes a new instance of the Profile class.
+        @param stats:ClientStats Statistics of the client profiled.
+        @param limit:int Maximum number of routes printed.
+        @param output:file Stream on which the report is printed. Defaults
+        to the standard output. Nothing is printed if False.
+        '''
+        self.__source = stats
+        self.stats = ClientStats()
+        self.limit = limit
+        self.output = output
+        self.started = None
+        self.elapsed = None
+
+    def __enter__(self):
+        self.started = time.time()
+        self.__source.attach(self.stats)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.__source.detach(self.stats)
+        self.elapsed = time.time() - self.started
+        if self.output is not False:
+            output = self.output or sys.stdout
+            output.write('Profile: %.3fs elapsed\n%s\n' %
+                         (self.elapsed, self.stats.report(self.limit)))
+        return False
@@ -0,0 +1,342 @@
+# -*- coding: utf-8 -*-
+import socket
+import urllib
+import httplib
+import urllib2
+import urlparse
+import threading
+from StringIO import StringIO
+from greendizer.clients import http
+
+
+__all__ = ('HttpRequest', 'ConnectionPool', 'PooledHandler', 'build_opener',
+           'installed_handlers', 'add_handler', 'remove_handler', 'OPENER',
+           'POOL')
+
+
+# Methods which can be sent twice without changing the outcome.
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS'])
+
+
+class HttpRequest(urllib2.Request):
+    '''
+    Represents an HTTP request
+    This class inherits from the urllib2 Request class to extend the
+    HTTP methods available beyond the GET and POST already built-in.
+    '''
+    def __init__(self, uri, method="GET", read_timeout=None,
+                 follow_redirects=True, **kwargs):
+        '''
+        Initializes a new instance of the Request class.
+        @param uri:str The URI to which will be bound.
+        @param method:str The HTTP method to use with the request.
+        @param read_timeout:float Socket read timeout in seconds.
+        @param follow_redirects:bool A value indicating whether redirections
+        are followed, or raised as HTTPErrors.
+        '''
+        self.__method = method
+        self.read_timeout = read_timeout
+        self.follow_redirects = follow_redirects
+        urllib2.Request.__init__(self, uri, **kwargs)
+
+    def get_method(self):
+        '''
+        Gets the HTTP method in use.
+        @return: str
+        '''
+        return self.__method.upper()
+
+
+class _HTTPConnection(httplib.HTTPConnection):
+    '''
+    HTTP connection applying distinct connect and read timeouts.
+    '''
+    read_timeout = None
+
+    def connect(self):
+        httplib.HTTPConnection.connect(self)
+        self.sock.settimeout(self.read_timeout)
+
+
+class _HTTPSConnection(httplib.HTTPSConnection):
+    '''
+    HTTPS connection applying distinct connect and read timeouts.
+    '''
+    read_timeout = None
+
+    def connect(self):
+        httplib.HTTPSConnection.connect(self)
+        self.sock.settimeout(self.read_timeout)
+
+
+def _connection_factory(connection_cls, read_timeout):
+    '''
+    Returns a callable instantiating connections with a read timeout.
+    @param connection_cls:Class Connection class.
+    @param read_timeout:float Read timeout in seconds.
+    @return: function
+    '''
+    def factory(host, **kwargs):
+        connection = connection_cls(host, **kwargs)
+        connection.read_timeout = read_timeout
+        return connection
+    return factory
+
+
+class _TimeoutHTTPHandler(urllib2.HTTPHandler):
+    def http_open(self, req):
+        return self.do_open(_connection_factory(_HTTPConnection,
+                                                req.read_timeout), req)
+
+
+class _TimeoutHTTPSHandler(urllib2.HTTPSHandler):
+    def https_open(self, req):
+        return self.do_open(_connection_factory(_HTTPSConnection,
+                                                req.read_timeout), req)
+
+
+class _RedirectHandler(urllib2.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        if not getattr(req, 'follow_redirects', True):
+            return None
+        return urllib2.HTTPRedirectHandler.redirect_request(self, req, fp,
+                                                            code, msg,
+                                                            headers, newurl)
+
+
+_DEFAULT_HANDLERS = (_TimeoutHTTPHandler, _TimeoutHTTPSHandler,
+                     _RedirectHandler)
+
+
+def build_opener(*handlers):
+    '''
+    Builds an opener applying the timeouts and redirection policy of the
+    requests, along with additional handlers.
+    @param handlers:list urllib2 handlers.
+    @return: urllib2.OpenerDirector
+    '''
+    return urllib2.build_opener(*(_DEFAULT_HANDLERS + handlers))
+
+
+OPENER = build_opener()
+_OPENER_LOCK = threading.Lock()
+
+
+def installed_handlers(opener=None):
+    '''
+    Gets the handlers added to an opener on top of the ones build_opener
+    provides by default.
+    @param opener:urllib2.OpenerDirector Defaults to OPENER.
+    @return: list
+    '''
+    return [handler for handler in (opener or OPENER).handlers
+            if handler.__class__.__module__ != 'urllib2' and
+            handler.__class__ not in _DEFAULT_HANDLERS]
+
+
+def add_handler(handler):
+    '''
+    Sends the requests of the library through a handler, along with the
+    handlers already installed.
+    @param handler:urllib2.BaseHandler
+    '''
+    global OPENER
+    with _OPENER_LOCK:
+        handlers = installed_handlers()
+        if handler not in handlers:
+            OPENER = build_opener(*(handlers + [handler]))
+
+
+def remove_handler(handler):
+    '''
+    Stops sending the requests of the library through a handler, keeping
+    the other handlers installed.
+    @param handler:urllib2.BaseHandler Handler previously added.
+    '''
+    global OPENER
+    with _OPENER_LOCK:
+        handlers = installed_handlers()
+        if handler in handlers:
+            handlers.remove(handler)
+            OPENER = build_opener(*handlers)
+
+
+class ConnectionPool(object):
+    '''
+    Represents a pool of persistent HTTP connections, kept alive between
+    requests to the same host.
+    Usage:
+        response = pool.urlopen('GET', url)
+        data = response.read()
+        pool.release(response)
+    '''
+    def __init__(self, max_idle_per_host=8, connect_timeout=None,
+                 read_timeout=None):
+        '''
+        Initializes a new instance of the ConnectionPool class.
+        @param max_idle_per_host:int Maximum number of idle connections kept
+        for each host.
+        @param connect_timeout:float Connect timeout in seconds.
+        @param read_timeout:float Read timeout in seconds.
+        '''
+        self.max_idle_per_host = max_idle_per_host
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.__idle = {}
+        self.__lock = threading.Lock()
+
+    def __acquire(self, key):
+        '''
+        Gets an idle connection to a host or opens a new one.
+        @param key:tuple (scheme, host)
+        @return: tuple (connection, reused)
+        '''
+        with self.__lock:
+            idle = self.__idle.get(key)
+            if idle:
+                return idle.pop(), True
+
+        scheme, host = key
+        connection_cls = (_HTTPSConnection if scheme == 'https'
+                          else _HTTPConnection)
+        connection = connection_cls(host, timeout=(self.connect_timeout or
+                                                   http.CONNECT_TIMEOUT))
+        connection.read_timeout = self.read_timeout or http.READ_TIMEOUT
+        return connection, False
+
+    def urlopen(self, method, url, body=None, headers=None,
+                connect_timeout=None, read_timeout=None):
+        '''
+        Sends a request over a pooled connection. Redirections are not
+        followed. The response must be given back with release() once read.
+        A request failing on an idle connection is sent again on a new one,
+        unless it is not idempotent and may have reached the server. The
+        number of times it was sent again is set as the retries attribute of
+        the response.
+        @param method:str HTTP method.
+        @param url:str Absolute URL.
+        @param body:str Body of the request.
+        @param headers:dict Headers.
+        @param connect_timeout:float Connect timeout in seconds, if a
+        connection is opened. Defaults to the pool's.
+        @param read_timeout:float Read timeout in seconds. Defaults to the
+        pool's.
+        @return: httplib.HTTPResponse
+        '''
+        parts = urlparse.urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        path = (parts.path or '/') + ('?' + parts.query if parts.query else '')
+        retries = 0
+        while True:
+            connection, reused = self.__acquire(key)
+            if connect_timeout:
+                connection.timeout = connect_timeout
+            if read_timeout:
+                connection.read_timeout = read_timeout
+                if connection.sock:
+                    connection.sock.settimeout(read_timeout)
+            sent = False
+            try:
+                connection.request(method.upper(), path, body, headers or {})
+                sent = True
+                response = connection.getresponse()
+            except(socket.timeout):
+                connection.close()
+                raise
+            except(httplib.HTTPException, socket.error):
+                connection.close()
+                # The server may have closed the idle connection. The request
+                # is sent again unless the server may have processed it.
+                if reused and (not sent or
+                               method.upper() in IDEMPOTENT_METHODS):
+                    retries += 1
+                    continue
+                raise
+
+            response.retries = retries
+            response.pool_key = key
+            response.pool_connection = connection
+            return response
+
+    def release(self, response):
+        '''
+        Gives back the connection of a response to the pool, or closes it if
+        the response was not entirely read or cannot be kept alive.
+        @param response:httplib.HTTPResponse
+        '''
+        connection = response.pool_connection
+        if response.will_close or not response.isclosed():
+            connection.close()
+            return
+
+        with self.__lock:
+            idle = self.__idle.setdefault(response.pool_key, [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append(connection)
+                return
+
+        connection.close()
+
+    def clear(self):
+        '''
+        Closes every idle connection.
+        '''
+        with self.__lock:
+            idle, self.__idle = self.__idle, {}
+
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+
+class PooledHandler(urllib2.BaseHandler):
+    '''
+    Sends the requests of an opener over the persistent connections of a
+    pool, so that consecutive requests to the API skip the TCP and TLS
+    handshakes.
+    Usage:
+        add_handler(PooledHandler(POOL))
+    '''
+    handler_order = 400  # Before the handlers opening new connections
+
+    def __init__(self, pool):
+        '''
+        Initializes a new instance of the PooledHandler class.
+        @param pool:ConnectionPool
+        '''
+        self.pool = pool
+
+    def http_open(self, request):
+        headers = dict((name.title(), value)
+                       for name, value in request.header_items())
+        headers['Connection'] = 'keep-alive'
+        try:
+            response = self.pool.urlopen(request.get_method(),
+                                         request.get_full_url(),
+                                         request.get_data(), headers,
+                                         request.timeout,
+                                         getattr(request, 'read_timeout',
+                                                 None))
+        except(socket.error, httplib.HTTPException), e:
+            raise urllib2.URLError(e)
+
+        try:
+            body = response.read()
+        except(socket.error, httplib.HTTPException), e:
+            response.pool_connection.close()
+            raise urllib2.URLError(e)
+        except:
+            response.pool_connection.close()
+            raise
+
+        self.pool.release(response)
+        result = urllib.addinfourl(StringIO(body), response.msg,
+                                   request.get_full_url(), response.status)
+        result.msg = response.reason
+        result.retries = response.retries
+        return result
+
+    https_open = http_open
+
+
+POOL = ConnectionPool()
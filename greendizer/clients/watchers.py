@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+import time
+import random
+import threading
+from greendizer.clients.concurrency import (run_concurrently, start_thread,
+                                            DEFAULT_MAX_WORKERS)
+
+
+__all__ = ('Watch', 'Watcher')
+
+
+MIN_INTERVAL = 10  # seconds
+MAX_INTERVAL = 300  # seconds
+FALLBACK_INTERVAL = 3600  # seconds
+BACKOFF = 1.5
+
+
+class Watch(object):
+    '''
+    Represents a collection watched for changes, and the callable notified
+    of them.
+    '''
+    def __init__(self, watcher, collection, callback, parent=None):
+        '''
+        Initializes a new instance of the Watch class.
+        @param watcher:Watcher Watcher polling the collection.
+        @param collection:Collection Collection watched.
+        @param callback:function Callable(watch, delta) notified with the
+        CollectionDelta of every change.
+        @param parent:Collection Collection of the resources owning the
+        watched collection (see Watcher.watch).
+        '''
+        self.__watcher = watcher
+        self.collection = collection
+        self.callback = callback
+        self.parent = parent
+        self.polls = 0
+        self.changes = 0
+        self.errors = 0
+        self.last_error = None
+        self.last_change = None
+
+    def cancel(self):
+        '''
+        Stops watching the collection.
+        '''
+        self.__watcher.unwatch(self)
+
+
+class _Group(object):
+    '''
+    Represents the watches polled together: the ones sharing a parent, or
+    a single watch without parent.
+    '''
+    def __init__(self, parent, interval):
+        self.parent = parent
+        self.watches = []
+        self.fallbacks = {}  # Time of the next sync, per collection ID
+        self.interval = interval
+        self.due = 0.0
+
+
+class Watcher(object):
+    '''
+    Polls many collections from a single scheduler and notifies changes.
+    Collections are synced incrementally, so a poll of an unchanged
+    collection costs a single conditional request answered with a 304.
+    The interval between the polls of a collection grows while it does not
+    change, and goes back to the minimum as soon as it does.
+    Watches sharing a parent collection are coalesced: only the parent is
+    polled, and the watched collections are synced when the resource which
+    owns them changed. Watching the unread invoices of 500 email addresses
+    costs a request per poll as long as none of them changes.
+    Coalescing assumes that the ETag of a resource changes when a
+    collection below it does, as for resources aggregating their children
+    (an email address counts its invoices). Changes the owner does not
+    reflect are only found by the fallback sync of every watched collection,
+    spread over fallback_interval. Watch a collection without parent when
+    that is too late.
+    Usage:
+        watcher = Watcher().start()
+        emails = client.seller.emails.all
+        for email in emails:
+            watcher.watch(email.invoices.unread, on_change, parent=emails)
+    '''
+    def __init__(self, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL,
+                 backoff=BACKOFF, max_workers=DEFAULT_MAX_WORKERS,
+                 fallback_interval=FALLBACK_INTERVAL):
+        '''
+        Initializes a new instance of the Watcher class.
+        @param min_interval:float Minimum number of seconds between two
+        polls of a collection.
+        @param max_interval:float Maximum number of seconds between two
+        polls.
+        @param backoff:float Factor by which the interval grows after a
+        poll without changes.
+        @param max_workers:int Maximum number of concurrent requests.
+        @param fallback_interval:float Maximum number of seconds between two
+        syncs of a collection with a parent. The first ones are staggered
+        so that the collections are not synced all at once.
+        '''
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.fallback_interval = fallback_interval
+        self.backoff = backoff
+        self.max_workers = max_workers
+        self.__groups = {}
+        self.__condition = threading.Condition()
+        self.__thread = None
+        self.__running = False
+
+    def watch(self, collection, callback, parent=None):
+        '''
+        Starts watching a collection. The collection is synced on the first
+        poll without notification, and the changes found by the next polls
+        are notified.
+        @param collection:Collection Collection to watch.
+        @param callback:function Callable(watch, delta) notified with the
+        CollectionDelta of every change.
+        @param parent:Collection Collection of the resources owning the
+        watched collection, such as the email addresses of a seller for
+        their invoices. Polling it tells which watched collections may
+        have changed.
+        @return: Watch
+        '''
+        watch = Watch(self, collection, callback, parent)
+        key = id(parent) if parent is not None else id(watch)
+        with self.__condition:
+            group = self.__groups.get(key)
+            if not group:
+                group = self.__groups[key] = _Group(parent, self.min_interval)
+            group.watches.append(watch)
+            group.due = 0.0  # Synced on the next poll
+            self.__condition.notify()
+        return watch
+
+    def unwatch(self, watch):
+        '''
+        Stops watching a collection.
+        @param watch:Watch
+        '''
+        with self.__condition:
+            for key, group in self.__groups.items():
+                if watch in group.watches:
+                    group.watches.remove(watch)
+                    if not [other for other in group.watches
+                            if other.collection is watch.collection]:
+                        group.fallbacks.pop(id(watch.collection), None)
+                    if not group.watches:
+                        del self.__groups[key]
+
+    @property
+    def watches(self):
+        '''
+        Gets the active watches.
+        @return: list
+        '''
+        with self.__condition:
+            return [watch for group in self.__groups.values()
+                    for watch in group.watches]
+
+    def poll(self, force=False):
+        '''
+        Polls the collections which are due.
+        @param force:bool Whether to poll every collection now.
+        @return: int Number of collections which changed.
+        '''
+        now = time.time()
+        with self.__condition:
+            groups = [group for group in self.__groups.values()
+                      if force or group.due <= now]
+
+        return sum(outcome.value or 0 for outcome in
+                   run_concurrently(self.__poll, groups, self.max_workers))
+
+    def __poll(self, group):
+        '''
+        Polls a group of watches and schedules its next poll.
+        @param group:_Group
+        @return: int Number of collections which changed.
+        '''
+        with self.__condition:
+            watches = list(group.watches)
+
+        now = time.time()
+        if group.parent is None:
+            due = watches
+        else:
+            try:
+                owners = group.parent.sync()
+            except(Exception), e:
+                for watch in watches:
+                    watch.errors += 1
+                    watch.last_error = e
+                self.__schedule(group, False)
+                return 0
+
+            uris = [r.uri for r in owners.added + owners.changed]
+            due = [watch for watch in watches
+                   if group.fallbacks.get(id(watch.collection), 0) <= now
+                   or any(watch.collection.uri.startswith(uri)
+                          for uri in uris)]
+
+        # Watches of the same collection share its sync.
+        collections = {}
+        for watch in due:
+            collections.setdefault(id(watch.collection), []).append(watch)
+        outcomes = run_concurrently(
+                        lambda watches: self.__sync(group, watches),
+                        collections.values(), self.max_workers)
+        changed = sum(outcome.value or 0 for outcome in outcomes)
+        self.__schedule(group, changed > 0)
+        return changed
+
+    def __sync(self, group, watches):
+        '''
+        Syncs a collection and notifies the watches of its changes.
+        @param group:_Group
+        @param watches:list Watches of the collection.
+        @return: int 1 if the collection changed, else 0.
+        '''
+        collection = watches[0].collection
+        try:
+            delta = collection.sync()
+        except(Exception), e:
+            for watch in watches:
+                watch.polls += 1
+                watch.errors += 1
+                watch.last_error = e
+            return 0
+
+        baseline = id(collection) not in group.fallbacks
+        delay = self.fallback_interval
+        if baseline:
+            delay *= random.uniform(0.5, 1.0)
+        group.fallbacks[id(collection)] = time.time() + delay
+        for watch in watches:
+            watch.polls += 1
+            if baseline or not delta:
+                continue
+            watch.changes += 1
+            watch.last_change = time.time()
+            try:
+                watch.callback(watch, delta)
+            except(Exception), e:
+                watch.errors += 1
+                watch.last_error = e
+        return 0 if baseline or not delta else 1
+
+    def __schedule(self, group, changed):
+        '''
+        Schedules the next poll of a group.
+        @param group:_Group
+        @param changed:bool Whether the last poll found changes.
+        '''
+        with self.__condition:
+            group.interval = (self.min_interval if changed else
+                              min(group.interval * self.backoff,
+                                  self.max_interval))
+            group.due = time.time() + group.interval
+
+    def __run(self):
+        '''
+        Polls the collections as they become due.
+        '''
+        while True:
+            with self.__condition:
+                while self.__running:
+                    due = min([group.due for group in self.__groups.values()]
+                              or [None])
+                    delay = None if due is None else due - time.time()
+                    if delay is not None and delay <= 0:
+                        break
+                    self.__condition.wait(delay)
+
+                if not self.__running:
+                    return
+
+            self.poll()
+
+    def start(self):
+        '''
+        Starts polling in the background.
+        @return: Watcher
+        '''
+        with self.__condition:
+            if self.__thread and self.__thread.is_alive():
+                return self
+            self.__running = True
+            self.__thread = start_thread(self.__run, 'greendizer-watcher')
+        return self
+
+    def stop(self):
+        '''
+        Stops polling in the background.
+        '''
+        with self.__condition:
+            self.__running = False
+            self.__condition.notify()
+        if self.__thread and self.__thread is not threading.current_thread():
+            self.__thread.join()
+        self.__thread = None
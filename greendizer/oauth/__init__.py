@@ -1,5 +1,4 @@
 # -*- coding: utf-8 -*-
-import urllib2
 from urllib import urlencode
 try:
     import simplejson as json
@@ -48,6 +47,7 @@ class OAuthClient(object):
         
     def __do_request(self, grant_type, code_type, code, scope=None,
                      redirect_uri=None):
+        import urllib2
         payload = {'grant_type': grant_type, code_type: code,
                    'scope': scope or self.scope,
                    'redirect_uri': redirect_uri or self.redirect_uri}
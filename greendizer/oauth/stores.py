@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+from contextlib import contextmanager
+from greendizer.oauth.tokens import Token
+try:
+    import simplejson as json
+except ImportError:
+    import json
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+__all__ = ('TokenStore', 'MemoryTokenStore', 'FileTokenStore',
+           'SQLiteTokenStore')
+
+
+class TokenStore(object):
+    '''
+    Represents a storage of tokens shared by the processes using the same
+    OAuth clients. The process holding the lock of a token is the only one
+    refreshing it, the others read the result.
+    '''
+    def load(self, key):
+        '''
+        Loads a token.
+        @param key:str Key of the token.
+        @return: Token or None
+        '''
+        raise NotImplementedError()
+
+    def save(self, key, token):
+        '''
+        Saves a token.
+        @param key:str Key of the token.
+        @param token:Token
+        '''
+        raise NotImplementedError()
+
+    def lock(self, key):
+        '''
+        Returns a context manager holding an exclusive lock on a token.
+        @param key:str Key of the token.
+        @return: context manager
+        '''
+        raise NotImplementedError()
+
+
+class MemoryTokenStore(TokenStore):
+    '''
+    Stores tokens in memory. Only shares them between the threads of the
+    current process.
+    '''
+    def __init__(self):
+        '''
+        Initializes a new instance of the MemoryTokenStore class.
+        '''
+        self.__tokens = {}
+        self.__locks = {}
+        self.__lock = threading.Lock()
+
+    def load(self, key):
+        data = self.__tokens.get(key)
+        return Token.from_dict(data) if data else None
+
+    def save(self, key, token):
+        self.__tokens[key] = token.to_dict()
+
+    def lock(self, key):
+        with self.__lock:
+            return self.__locks.setdefault(key, threading.RLock())
+
+
+class FileTokenStore(TokenStore):
+    '''
+    Stores tokens as JSON files in a directory, using advisory file locks
+    to synchronize the processes of a host.
+    '''
+    def __init__(self, directory):
+        '''
+        Initializes a new instance of the FileTokenStore class.
+        @param directory:str Directory in which the tokens are stored.
+        '''
+        if not fcntl:
+            raise ImportError('The fcntl module is required to share tokens '
+                              'through files. Please use SQLiteTokenStore '
+                              'on this platform.')
+
+        self.directory = directory
+        self.__threads_lock = threading.RLock()
+        self.__local = threading.local()
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def path_for(self, key):
+        '''
+        Gets the path of the file of a token.
+        @param key:str Key of the token.
+        @return: str
+        '''
+        return os.path.join(self.directory,
+                            hashlib.sha1(key).hexdigest() + '.json')
+
+    def load(self, key):
+        try:
+            with open(self.path_for(key)) as f:
+                return Token.from_dict(json.load(f))
+        except(IOError, ValueError):
+            return None
+
+    def save(self, key, token):
+        path = self.path_for(key)
+        temporary = '%s.%d.tmp' % (path, os.getpid())
+        with open(temporary, 'w') as f:
+            json.dump(token.to_dict(), f)
+        os.rename(temporary, path)  # Readers never see a partial file
+
+    @contextmanager
+    def lock(self, key):
+        # flock is held per open file, so threads are serialized first and
+        # only the outermost call of a thread opens and locks the file.
+        with self.__threads_lock:
+            depths = self.__local.__dict__.setdefault('depths', {})
+            depths[key] = depths.get(key, 0) + 1
+            try:
+                if depths[key] > 1:
+                    yield
+                    return
+
+                with open(self.path_for(key) + '.lock', 'a') as f:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                    try:
+                        yield
+                    finally:
+                        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            finally:
+                depths[key] -= 1
+
+
+class SQLiteTokenStore(TokenStore):
+    '''
+    Stores tokens in a SQLite database, relying on its write lock to
+    synchronize the processes.
+    '''
+    def __init__(self, path, timeout=30):
+        '''
+        Initializes a new instance of the SQLiteTokenStore class.
+        @param path:str Path of the database.
+        @param timeout:float Number of seconds to wait for the lock.
+        '''
+        self.path = path
+        self.timeout = timeout
+        self.__local = threading.local()
+        with self.__connection() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS tokens ('
+                               'key TEXT PRIMARY KEY, data TEXT NOT NULL, '
+                               'updated REAL NOT NULL)')
+
+    def __connection(self):
+        '''
+        Gets the connection of the current thread.
+        @return: sqlite3.Connection
+        '''
+        connection = getattr(self.__local, 'connection', None)
+        if not connection:
+            connection = sqlite3.connect(self.path, timeout=self.timeout,
+                                         isolation_level=None)
+            self.__local.connection = connection
+            self.__local.depth = 0
+        return connection
+
+    def load(self, key):
+        row = self.__connection().execute(
+                    'SELECT data FROM tokens WHERE key = ?', (key,)).fetchone()
+        return Token.from_dict(json.loads(row[0])) if row else None
+
+    def save(self, key, token):
+        self.__connection().execute(
+                    'INSERT OR REPLACE INTO tokens (key, data, updated) '
+                    'VALUES (?, ?, ?)',
+                    (key, json.dumps(token.to_dict()), time.time()))
+
+    @contextmanager
+    def lock(self, key):
+        # SQLite locks the whole database: BEGIN IMMEDIATE takes the write
+        # lock, which other processes wait for.
+        connection = self.__connection()
+        self.__local.depth += 1
+        if self.__local.depth == 1:
+            connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except:
+            self.__local.depth -= 1
+            if not self.__local.depth:
+                connection.execute('ROLLBACK')
+            raise
+        else:
+            self.__local.depth -= 1
+            if not self.__local.depth:
+                connection.execute('COMMIT')
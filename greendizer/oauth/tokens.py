@@ -0,0 +1,447 @@
+# -*- coding: utf-8 -*-
+import time
+import threading
+from contextlib import contextmanager
+from greendizer.oauth import AccessTokenError
+
+
+__all__ = ('Token', 'TokenManager')
+
+
+REFRESH_MARGIN = 120
+RETRY_DELAY = 15
+DEFAULT_EXPIRES_IN = 3600
+
+
+@contextmanager
+def _unlocked():
+    '''
+    Context manager used in place of the lock of a store when there is none.
+    '''
+    yield
+
+
+class Token(object):
+    '''
+    Represents an access token along with the refresh token and the times
+    at which it was issued and expires.
+    '''
+    __slots__ = ('access_token', 'refresh_token', 'scope', 'expires_at',
+                 'issued_at')
+
+    def __init__(self, access_token, refresh_token=None, scope=None,
+                 expires_at=None, issued_at=None):
+        '''
+        Initializes a new instance of the Token class.
+        @param access_token:str Access token.
+        @param refresh_token:str Refresh token.
+        @param scope:str Scope granted.
+        @param expires_at:float Epoch time at which the token expires.
+        @param issued_at:float Epoch time at which the token was issued.
+        '''
+        self.access_token = access_token
+        self.refresh_token = refresh_token
+        self.scope = scope
+        self.expires_at = expires_at
+        self.issued_at = issued_at
+
+    @classmethod
+    def from_response(cls, response, scope=None, previous=None, now=None):
+        '''
+        Creates a token from the response of the access endpoint.
+        @param response:dict Response of the OAuth server.
+        @param scope:str Scope requested.
+        @param previous:Token Token refreshed, if any.
+        @param now:float Epoch time at which the response was received.
+        @return: Token
+        '''
+        expires_in = response.get('expires_in') or DEFAULT_EXPIRES_IN
+        now = now or time.time()
+        return cls(response['access_token'],
+                   response.get('refresh_token') or
+                   (previous.refresh_token if previous else None),
+                   response.get('scope') or scope,
+                   now + float(expires_in), now)
+
+    def expires_within(self, seconds, now=None):
+        '''
+        Gets a value indicating whether the token expires within a number
+        of seconds.
+        @param seconds:float Number of seconds.
+        @param now:float Current epoch time.
+        @return: bool
+        '''
+        if self.expires_at is None:
+            return False
+        return (now or time.time()) + seconds >= self.expires_at
+
+    @property
+    def lifetime(self):
+        '''
+        Gets the number of seconds the token is valid for, if known.
+        @return: float
+        '''
+        if self.expires_at is None or self.issued_at is None:
+            return None
+        return self.expires_at - self.issued_at
+
+    def to_dict(self):
+        '''
+        Gets a serializable version of the token.
+        @return: dict
+        '''
+        return {'access_token': self.access_token,
+                'refresh_token': self.refresh_token,
+                'scope': self.scope,
+                'expires_at': self.expires_at,
+                'issued_at': self.issued_at}
+
+    @classmethod
+    def from_dict(cls, data):
+        '''
+        Creates a token from its serialized version.
+        @param data:dict
+        @return: Token
+        '''
+        return cls(data['access_token'], data.get('refresh_token'),
+                   data.get('scope'), data.get('expires_at'),
+                   data.get('issued_at'))
+
+
+class _Entry(object):
+    '''
+    Represents a token managed for a client and a scope.
+    '''
+    __slots__ = ('oauth_client', 'scope', 'token', 'lock', 'subscribers',
+                 'retry_at')
+
+    def __init__(self, oauth_client, scope, token):
+        self.oauth_client = oauth_client
+        self.scope = scope
+        self.token = token
+        self.lock = threading.Lock()
+        self.subscribers = []
+        self.retry_at = None
+
+
+class TokenManager(object):
+    '''
+    Caches access tokens per OAuth client and scope, and refreshes them
+    from a background thread shortly before they expire. API clients bound
+    to a token have their access token swapped as soon as it is renewed, so
+    that no request is sent with an expired token.
+    With a store shared by several processes, a single process refreshes a
+    token and the others pick up the result from the store.
+    Usage:
+        manager = TokenManager().start()
+        manager.add(oauth_client, oauth_client.obtain_token(code))
+        client = SellerClient(oauth_token=manager.get(oauth_client))
+        manager.bind(client, oauth_client)
+
+        # In the other processes
+        manager = TokenManager(store=FileTokenStore('/var/run/tokens'))
+        manager.add(oauth_client)
+    '''
+    def __init__(self, refresh_margin=REFRESH_MARGIN, retry_delay=RETRY_DELAY,
+                 store=None):
+        '''
+        Initializes a new instance of the TokenManager class.
+        @param refresh_margin:float Number of seconds before the expiration
+        of a token at which it is refreshed. Tokens living less than twice
+        as long are refreshed halfway through their lifetime instead.
+        @param retry_delay:float Number of seconds to wait before retrying
+        a refresh which failed.
+        @param store:TokenStore Storage shared with other processes.
+        '''
+        self.refresh_margin = refresh_margin
+        self.retry_delay = retry_delay
+        self.store = store
+        self.__entries = {}
+        self.__condition = threading.Condition()
+        self.__thread = None
+        self.__running = False
+
+    @staticmethod
+    def key(oauth_client, scope=None):
+        '''
+        Gets the key under which the token of a client is cached.
+        @param oauth_client:OAuthClient
+        @param scope:str Scope of the token.
+        @return: tuple
+        '''
+        return (oauth_client.client_id, scope or oauth_client.scope)
+
+    def __store_key(self, entry):
+        '''
+        Gets the key under which the token of an entry is stored.
+        @param entry:_Entry
+        @return: str
+        '''
+        return '%s %s' % (entry.oauth_client.client_id, entry.scope)
+
+    def __entry(self, oauth_client, scope=None):
+        '''
+        Gets the entry of a client and a scope.
+        @return: _Entry
+        '''
+        try:
+            return self.__entries[self.key(oauth_client, scope)]
+        except KeyError:
+            raise AccessTokenError('No token for %s (scope: %s)' %
+                                   self.key(oauth_client, scope))
+
+    def margin(self, token):
+        '''
+        Gets the number of seconds before the expiration of a token at which
+        it is refreshed. The margin is at most half the lifetime of the
+        token, so that short-lived tokens are not refreshed over and over.
+        @param token:Token
+        @return: float
+        '''
+        lifetime = token.lifetime
+        if lifetime is None:
+            return self.refresh_margin
+        return min(self.refresh_margin, lifetime / 2.0)
+
+    def add(self, oauth_client, token=None, scope=None):
+        '''
+        Starts managing a token.
+        @param oauth_client:OAuthClient Client the token was issued to.
+        @param token:Token|dict Token, or response of the access endpoint.
+        Read from the store if omitted.
+        @param scope:str Scope of the token.
+        @return: Token
+        '''
+        scope = scope or oauth_client.scope
+        entry = _Entry(oauth_client, scope, None)
+        if token is None:
+            token = self.store.load(self.__store_key(entry)) \
+                    if self.store else None
+            if not token:
+                raise AccessTokenError('No token stored for %s (scope: %s)' %
+                                       self.key(oauth_client, scope))
+        else:
+            if not isinstance(token, Token):
+                token = Token.from_response(token, scope)
+            if self.store:
+                with self.store.lock(self.__store_key(entry)):
+                    self.store.save(self.__store_key(entry), token)
+
+        with self.__condition:
+            key = self.key(oauth_client, scope)
+            entry = self.__entries.setdefault(key, entry)
+            entry.oauth_client = oauth_client
+            entry.token = token
+            entry.retry_at = None
+            self.__condition.notify()
+
+        self.__publish(entry)
+        return token
+
+    def remove(self, oauth_client, scope=None):
+        '''
+        Stops managing a token.
+        @param oauth_client:OAuthClient
+        @param scope:str Scope of the token.
+        '''
+        with self.__condition:
+            self.__entries.pop(self.key(oauth_client, scope), None)
+
+    def token(self, oauth_client, scope=None):
+        '''
+        Gets a valid token, refreshing it first if it is about to expire.
+        @param oauth_client:OAuthClient
+        @param scope:str Scope of the token.
+        @return: Token
+        '''
+        entry = self.__entry(oauth_client, scope)
+        token = entry.token
+        if token.expires_within(self.margin(token)):
+            token = self.refresh(oauth_client, scope,
+                                 raise_errors=token.expires_within(0))
+        return token
+
+    def get(self, oauth_client, scope=None):
+        '''
+        Gets a valid access token.
+        @param oauth_client:OAuthClient
+        @param scope:str Scope of the token.
+        @return: str
+        '''
+        return self.token(oauth_client, scope).access_token
+
+    def bind(self, client, oauth_client, scope=None):
+        '''
+        Keeps the access token of an API client up to date.
+        @param client:Client API client.
+        @param oauth_client:OAuthClient
+        @param scope:str Scope of the token.
+        @return: Client
+        '''
+        entry = self.__entry(oauth_client, scope)
+        with entry.lock:
+            if client not in entry.subscribers:
+                entry.subscribers.append(client)
+        client.access_token = self.get(oauth_client, scope)
+        return client
+
+    def unbind(self, client, oauth_client, scope=None):
+        '''
+        Stops updating the access token of an API client.
+        @param client:Client API client.
+        @param oauth_client:OAuthClient
+        @param scope:str Scope of the token.
+        '''
+        entry = self.__entry(oauth_client, scope)
+        with entry.lock:
+            if client in entry.subscribers:
+                entry.subscribers.remove(client)
+
+    def refresh(self, oauth_client, scope=None, raise_errors=True):
+        '''
+        Refreshes a token. Concurrent calls for the same token result in a
+        single request to the OAuth server.
+        @param oauth_client:OAuthClient
+        @param scope:str Scope of the token.
+        @param raise_errors:bool Whether to raise the errors of the OAuth
+        server or of the store rather than keeping the current token.
+        @return: Token
+        '''
+        entry = self.__entry(oauth_client, scope)
+        previous = entry.token
+        with entry.lock:
+            if entry.token is not previous:  # Refreshed in the meantime
+                return entry.token
+
+            key = self.__store_key(entry)
+            try:
+                with self.store.lock(key) if self.store else _unlocked():
+                    stored = self.store.load(key) if self.store else None
+                    if (stored and stored.access_token != previous.access_token
+                        and not stored.expires_within(self.margin(stored))):
+                        # Refreshed by another process
+                        entry.token = stored
+                        entry.retry_at = None
+                    elif not previous.refresh_token:
+                        if raise_errors:
+                            raise AccessTokenError('The token of %s (scope: '
+                                                   '%s) cannot be refreshed' %
+                                                   self.key(oauth_client,
+                                                            scope))
+                        return previous
+                    else:
+                        now = time.time()
+                        response = entry.oauth_client.refresh_token(
+                                        (stored or previous).refresh_token,
+                                        scope=entry.scope)
+                        entry.token = Token.from_response(response,
+                                                          entry.scope,
+                                                          stored or previous,
+                                                          now)
+                        entry.retry_at = None
+                        if self.store:
+                            self.store.save(key, entry.token)
+            except(Exception):
+                if entry.token is previous:
+                    entry.retry_at = time.time() + self.retry_delay
+                    if raise_errors:
+                        raise
+                    return previous
+
+                # Refreshed, but not stored: the other processes will
+                # refresh the token on their own.
+                import logging
+                logging.getLogger(__name__).exception('Could not store the '
+                                                      'token of %s (scope: '
+                                                      '%s)' % self.key(
+                                                      oauth_client, scope))
+
+        self.__publish(entry)
+        with self.__condition:
+            self.__condition.notify()
+        return entry.token
+
+    def __publish(self, entry):
+        '''
+        Swaps the access token of the API clients bound to an entry.
+        @param entry:_Entry
+        '''
+        with entry.lock:
+            subscribers = list(entry.subscribers)
+            access_token = entry.token.access_token
+
+        for client in subscribers:
+            client.access_token = access_token
+
+    def __next_refresh(self):
+        '''
+        Gets the entry to refresh next and the epoch time at which it is due.
+        @return: tuple (_Entry, float) or (None, None)
+        '''
+        due = (None, None)
+        for entry in self.__entries.values():
+            if entry.token.expires_at is None or not entry.token.refresh_token:
+                continue
+            at = entry.retry_at or (entry.token.expires_at -
+                                    self.margin(entry.token))
+            if due[1] is None or at < due[1]:
+                due = (entry, at)
+        return due
+
+    def __run(self):
+        '''
+        Refreshes the tokens as they come close to their expiration.
+        '''
+        while True:
+            with self.__condition:
+                while self.__running:
+                    entry, at = self.__next_refresh()
+                    delay = None if at is None else at - time.time()
+                    if delay is not None and delay <= 0:
+                        break
+                    self.__condition.wait(delay)
+
+                if not self.__running:
+                    return
+
+            try:
+                self.refresh(entry.oauth_client, entry.scope,
+                             raise_errors=False)
+            except(Exception):
+                with self.__condition:
+                    if entry not in self.__entries.values():
+                        continue  # Removed in the meantime
+                    entry.retry_at = time.time() + self.retry_delay
+
+                import logging
+                logging.getLogger(__name__).exception('Could not refresh the '
+                                                      'token of %s (scope: '
+                                                      '%s)' % self.key(
+                                                      entry.oauth_client,
+                                                      entry.scope))
+
+    def start(self):
+        '''
+        Starts refreshing the tokens in the background.
+        @return: TokenManager
+        '''
+        with self.__condition:
+            if self.__thread and self.__thread.is_alive():
+                return self
+            self.__running = True
+            self.__thread = threading.Thread(target=self.__run,
+                                             name='greendizer-token-refresh')
+            self.__thread.daemon = True
+            self.__thread.start()
+        return self
+
+    def stop(self):
+        '''
+        Stops refreshing the tokens in the background.
+        '''
+        with self.__condition:
+            self.__running = False
+            self.__condition.notify()
+        if self.__thread and self.__thread is not threading.current_thread():
+            self.__thread.join()
+        self.__thread = None
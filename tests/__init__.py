@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the library, run against an in-process sandbox of the API.
+Usage:
+    python -m unittest discover -s tests -t .
+'''
+import unittest
+from greendizer.clients import SellerClient, BuyerClient
+from tests.sandbox import SandboxServer, SandboxData
+
+
+class SandboxTestCase(unittest.TestCase):
+    '''
+    Starts a sandbox before every test and gives access to clients of its
+    seller and buyer accounts.
+    '''
+    emails = 2
+    invoices = 20
+    payments = 1
+    buyers = 5
+
+    def setUp(self):
+        self.data = SandboxData.generate(emails=self.emails,
+                                         invoices=self.invoices,
+                                         payments=self.payments,
+                                         buyers=self.buyers)
+        self.server = SandboxServer(self.data).start().install()
+        self.addCleanup(self.server.stop)
+        self.addCleanup(self.server.uninstall)
+
+    def seller_client(self, **kwargs):
+        '''
+        Creates a client of the seller account of the sandbox.
+        @return: SellerClient
+        '''
+        return SellerClient(oauth_token='sandbox', **kwargs)
+
+    def buyer_client(self, **kwargs):
+        '''
+        Creates a client of the buyer account of the sandbox.
+        @return: BuyerClient
+        '''
+        return BuyerClient(oauth_token='sandbox', **kwargs)
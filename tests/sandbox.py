@@ -0,0 +1,763 @@
+# -*- coding: utf-8 -*-
+import re
+import sys
+import time
+import zlib
+import random
+import socket
+import urllib
+import urlparse
+import threading
+import SocketServer
+import BaseHTTPServer
+from gzip import GzipFile
+from StringIO import StringIO
+from datetime import datetime, timedelta
+from greendizer.clients import http
+from greendizer.clients.base import datetime_to_timestamp
+from greendizer.clients.routes import ROUTER
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+
+__all__ = ('SandboxData', 'SandboxServer')
+
+
+COLLECTION_ROUTES = frozenset(['emails', 'invoices', 'payments', 'buyers',
+                               'sellers', 'balances', 'transactions',
+                               'buyer.days', 'buyer.hours', 'seller.days',
+                               'seller.hours'])
+DIGEST_ROUTES = frozenset(['buyer.day', 'buyer.hour', 'seller.day',
+                           'seller.hour'])
+DIGESTS_LISTED = 30
+FILTER_PATTERN = re.compile(r'^(?P<field>\w+)(?P<operator>==|<<|>>)'
+                            r'(?P<value>.*)$')
+PDF_PATH = 'files/'
+
+
+def _normalize(path):
+    '''
+    Gets the key of a path in the sandbox.
+    @param path:str Path, relative to the root of the API.
+    @return: str
+    '''
+    return path.strip('/')
+
+
+def _coerce(value):
+    '''
+    Parses a value received in a form or a filter.
+    @param value:str
+    @return: object
+    '''
+    if value in ['True', 'true']:
+        return True
+    if value in ['False', 'false']:
+        return False
+    for parse in [int, float]:
+        try:
+            return parse(value)
+        except ValueError:
+            pass
+    try:
+        return datetime_to_timestamp(datetime.strptime(value[:10], '%Y-%m-%d'))
+    except ValueError:
+        return value
+
+
+class SandboxData(object):
+    '''
+    Stores the resources served by a SandboxServer. Resources are stored by
+    path, along with the time at which they were last modified, and every
+    path is registered in the collection of its parent.
+    '''
+    def __init__(self):
+        '''
+        Initializes a new instance of the SandboxData class.
+        '''
+        self.__lock = threading.RLock()
+        self.__resources = {}
+        self.__collections = {}
+        self.__clock = 0
+
+    def __tick(self):
+        '''
+        Gets a modification time, strictly increasing.
+        @return: long Timestamp in milliseconds.
+        '''
+        self.__clock = max(self.__clock + 1,
+                           datetime_to_timestamp(datetime.now()))
+        return self.__clock
+
+    @staticmethod
+    def etag(path, modified):
+        '''
+        Gets the ETag of a resource.
+        @param path:str Path of the resource.
+        @param modified:long Time of the last modification in milliseconds.
+        @return: str
+        '''
+        return '%d-%s' % (modified, path.rsplit('/', 1)[-1])
+
+    def put(self, path, data):
+        '''
+        Adds or replaces a resource.
+        @param path:str Path of the resource.
+        @param data:dict Representation of the resource.
+        @return: str ETag
+        '''
+        path = _normalize(path)
+        with self.__lock:
+            if path not in self.__resources:
+                parent, identifier = path.rsplit('/', 1)
+                self.__collections.setdefault(parent, []).append(identifier)
+            modified = self.__tick()
+            self.__resources[path] = (dict(data), modified)
+            return self.etag(path, modified)
+
+    def get(self, path):
+        '''
+        Gets a resource.
+        @param path:str Path of the resource.
+        @return: tuple (dict, long) or None
+        '''
+        return self.__resources.get(_normalize(path))
+
+    def update(self, path, changes):
+        '''
+        Changes attributes of a resource.
+        @param path:str Path of the resource.
+        @param changes:dict New values of the attributes.
+        @return: str ETag
+        '''
+        path = _normalize(path)
+        with self.__lock:
+            data = dict(self.__resources[path][0])
+            data.update(changes)
+            modified = self.__tick()
+            self.__resources[path] = (data, modified)
+            return self.etag(path, modified)
+
+    def delete(self, path):
+        '''
+        Deletes a resource and the resources below it.
+        @param path:str Path of the resource.
+        '''
+        path = _normalize(path)
+        with self.__lock:
+            parent, identifier = path.rsplit('/', 1)
+            self.__resources.pop(path, None)
+            if identifier in self.__collections.get(parent, []):
+                self.__collections[parent].remove(identifier)
+            for key in [key for key in self.__resources
+                        if key.startswith(path + '/')]:
+                del self.__resources[key]
+
+    def children(self, path):
+        '''
+        Gets the resources of a collection, in the order they were added.
+        @param path:str Path of the collection.
+        @return: list (path, data, modified) tuples.
+        '''
+        path = _normalize(path)
+        with self.__lock:
+            paths = [path + '/' + identifier
+                     for identifier in self.__collections.get(path, [])]
+            return [(child,) + self.__resources[child] for child in paths]
+
+    def __len__(self):
+        return len(self.__resources)
+
+    @classmethod
+    def generate(cls, emails=2, invoices=200, payments=1, buyers=20,
+                 transactions=20, currencies=('EUR', 'USD'), seed=0):
+        '''
+        Creates a data set for a seller and a buyer account, both identified
+        by 'me'.
+        @param emails:int Number of email addresses per account.
+        @param invoices:int Number of invoices per email address.
+        @param payments:int Number of payments per invoice.
+        @param buyers:int Number of buyers of the seller, and of sellers
+        per email address of the buyer.
+        @param transactions:int Number of transactions per balance.
+        @param currencies:tuple Currencies of the invoices and balances.
+        @param seed:int Seed of the random values.
+        @return: SandboxData
+        '''
+        rand = random.Random(seed)
+        data = cls()
+        now = datetime.now()
+        for role in ['sellers', 'buyers']:
+            user = '%s/me' % role
+            data.put(user, {'firstname': 'Sandbox', 'lastname': role.title(),
+                            'avatar': None,
+                            'birthday': datetime_to_timestamp(
+                                                    datetime(1980, 1, 1))})
+            data.put(user + '/settings', {'language': 'en', 'region': 'US',
+                                          'currency': currencies[0]})
+            data.put(user + '/company', _company(role))
+
+            for currency in currencies:
+                balance = '%s/balances/%s' % (user, currency)
+                data.put(balance, {'amount': round(rand.uniform(0, 1e5), 2)})
+                for n in xrange(transactions):
+                    data.put('%s/transactions/%d' % (balance, n + 1), {
+                        'status': rand.choice(['pending', 'completed']),
+                        'rank': n, 'type': rand.choice(['credit', 'debit']),
+                        'amount': round(rand.uniform(1, 1000), 2),
+                        'eta': datetime_to_timestamp(now + timedelta(n)),
+                        'invoices': []})
+
+            for e in xrange(emails):
+                email = '%s/emails/e%d' % (user, e + 1)
+                data.put(email, {'label': 'sandbox%d@example.com' % (e + 1)})
+                for n in xrange(invoices):
+                    invoice = '%s/invoices/%d' % (email, n + 1)
+                    currency = rand.choice(currencies)
+                    issued = now - timedelta(days=rand.randint(0, 365))
+                    paid = rand.random() < 0.5
+                    buyer = '%d' % (rand.randint(1, buyers) if buyers else 0)
+                    data.put(invoice, {
+                        'name': 'Invoice %d' % (n + 1),
+                        'description': 'Sandbox invoice',
+                        'customId': 'C%05d' % (n + 1),
+                        'total': round(rand.uniform(10, 5000), 2),
+                        'currency': currency,
+                        'date': datetime_to_timestamp(issued),
+                        'dueDate': datetime_to_timestamp(issued +
+                                                         timedelta(30)),
+                        'read': rand.random() < 0.5,
+                        'flagged': rand.random() < 0.1,
+                        'paid': paid, 'canceled': False,
+                        'location': rand.choice([0, 0, 0, 1, 2]),
+                        'secretKey': '%032x' % rand.getrandbits(128),
+                        'buyer': {'name': 'Buyer %s' % buyer,
+                                  'email': 'buyer%s@example.com' % buyer,
+                                  'uri': 'sellers/me/buyers/%s/' % buyer,
+                                  'address': _address(),
+                                  'delivery': _address()}})
+                    for p in xrange(payments if paid else 0):
+                        data.put('%s/payments/%d' % (invoice, p + 1), {
+                            'date': datetime_to_timestamp(issued),
+                            'amount': round(rand.uniform(1, 100), 2),
+                            'method': 'transfer', 'ref': None})
+
+                if role == 'buyers':
+                    for n in xrange(buyers):
+                        data.put('%s/sellers/%d' % (email, n + 1), dict(
+                            _analytics(rand, currencies),
+                            name='Seller %d' % (n + 1),
+                            companyURI='companies/%d/' % (n + 1)))
+
+            if role == 'sellers':
+                for n in xrange(buyers):
+                    data.put('%s/buyers/%d' % (user, n + 1), dict(
+                        _analytics(rand, currencies), name='Buyer %d' % (n + 1),
+                        email='buyer%d@example.com' % (n + 1),
+                        address=_address(), delivery=_address()))
+
+        for n in xrange(buyers):
+            data.put('companies/%d' % (n + 1), _company('Seller %d' % (n + 1)))
+
+        return data
+
+
+def _address():
+    '''
+    Gets the representation of an address.
+    @return: dict
+    '''
+    return {'streetAddress': '1 Sandbox street', 'city': 'Paris',
+            'zipcode': '75001', 'state': None, 'country': 'FR'}
+
+
+def _company(name):
+    '''
+    Gets the representation of a company.
+    @param name:str Name of the company.
+    @return: dict
+    '''
+    return {'name': name.title(), 'description': 'Sandbox company',
+            'smallLogo': None, 'largeLogo': None, 'address': _address(),
+            'legalMentions': 'Sandbox'}
+
+
+def _analytics(rand, currencies):
+    '''
+    Gets random analytics for the given currencies.
+    @param rand:random.Random Generator of the values.
+    @param currencies:tuple Currencies.
+    @return: dict
+    '''
+    analytics = {'currencies': list(currencies), 'invoicesCount': 0}
+    for currency in currencies:
+        count = rand.randint(1, 50)
+        amounts = [round(rand.uniform(10, 5000), 2) for _ in xrange(count)]
+        analytics['invoicesCount'] += count
+        analytics[currency] = {
+            'sum': sum(amounts), 'min': min(amounts), 'max': max(amounts),
+            'average': sum(amounts) / count, 'invoicesCount': count,
+            'items': count * 3,
+            'totalTaxes': round(sum(amounts) * 0.2, 2),
+            'totalDiscounts': round(sum(amounts) * 0.05, 2),
+            'taxes': [{'type': 'percentage', 'name': 'VAT', 'value': 20}],
+            'discounts': []}
+    return analytics
+
+
+class _Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128  # Concurrent clients must not see refusals
+
+    def handle_error(self, request, client_address):
+        # Clients giving up on a request, as timeouts do, close the
+        # connection before the answer is written.
+        if not isinstance(sys.exc_info()[1], socket.error):
+            BaseHTTPServer.HTTPServer.handle_error(self, request,
+                                                   client_address)
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    '''
+    Handles the requests received by a SandboxServer.
+    '''
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.sandbox._handle(self)
+
+    do_HEAD = do_POST = do_PUT = do_PATCH = do_DELETE = do_GET
+
+
+class SandboxServer(object):
+    '''
+    Serves the Greendizer API from memory, in a background thread, so that
+    the library can be exercised and measured without any network access.
+    Latency, errors and compression of the responses can be configured.
+    Usage:
+        with SandboxServer(latency=0.01) as server:
+            client = SellerClient(oauth_token='sandbox')
+            print client.seller.emails.all.count
+    '''
+    def __init__(self, data=None, host='127.0.0.1', port=0, latency=0,
+                 error_rate=0.0, error_codes=(500, 503),
+                 compression=http.COMPRESSION_GZIP, pdf_size=64 * 1024,
+                 seed=None):
+        '''
+        Initializes a new instance of the SandboxServer class.
+        @param data:SandboxData Resources served. Generated if omitted.
+        @param host:str Interface to listen on.
+        @param port:int Port to listen on. A free port is used by default.
+        @param latency:float|tuple Seconds, or (min, max) range of seconds,
+        to wait before answering.
+        @param error_rate:float Probability for a request to fail.
+        @param error_codes:tuple Status codes of the failures injected.
+        @param compression:str Encoding of the responses when accepted by
+        the client (gzip, deflate or None).
+        @param pdf_size:int Size in bytes of the PDF files served.
+        @param seed:int Seed of the injected latencies and errors.
+        '''
+        self.data = data if data is not None else SandboxData.generate()
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_codes = error_codes
+        self.compression = compression
+        self.pdf_size = pdf_size
+        self.requests = 0
+        self.__random = random.Random(seed)
+        self.__lock = threading.Lock()
+        self.__failures = []
+        self.__previous_root = None
+        self.__thread = None
+        self.__server = _Server((host, port), _Handler)
+        self.__server.sandbox = self
+
+    def __enter__(self):
+        return self.start().install()
+
+    def __exit__(self, *exc_info):
+        self.uninstall()
+        self.stop()
+        return False
+
+    @property
+    def url(self):
+        '''
+        Gets the root URL of the API served.
+        @return: str
+        '''
+        host, port = self.__server.server_address
+        return 'http://%s:%d/' % (host, port)
+
+    def start(self):
+        '''
+        Starts serving requests.
+        @return: SandboxServer
+        '''
+        if not self.__thread:
+            self.__thread = threading.Thread(target=self.__server.serve_forever,
+                                             args=(0.05,),
+                                             name='greendizer-sandbox')
+            self.__thread.daemon = True
+            self.__thread.start()
+        return self
+
+    def stop(self):
+        '''
+        Stops serving requests.
+        '''
+        if self.__thread:
+            self.__server.shutdown()
+            self.__thread.join()
+            self.__thread = None
+        self.__server.server_close()
+
+    def install(self):
+        '''
+        Sends the requests of the library to the sandbox.
+        @return: SandboxServer
+        '''
+        if self.__previous_root is None:
+            self.__previous_root = http.API_ROOT
+        http.API_ROOT = self.url
+        return self
+
+    def uninstall(self):
+        '''
+        Sends the requests of the library to the API they were sent to
+        before the sandbox was installed.
+        '''
+        if self.__previous_root is not None:
+            http.API_ROOT = self.__previous_root
+            self.__previous_root = None
+
+    def fail_next(self, count=1, code=503):
+        '''
+        Makes the next requests fail.
+        @param count:int Number of requests to fail.
+        @param code:int Status code of the failures.
+        '''
+        with self.__lock:
+            self.__failures.extend([code] * count)
+
+    def __injected_error(self):
+        '''
+        Gets the status code of the error to answer with, if any.
+        @return: int or None
+        '''
+        with self.__lock:
+            self.requests += 1
+            if self.__failures:
+                return self.__failures.pop(0)
+            if self.error_rate and self.__random.random() < self.error_rate:
+                return self.__random.choice(self.error_codes)
+            latency = self.latency
+            if isinstance(latency, (tuple, list)):
+                latency = self.__random.uniform(*latency)
+        if latency:
+            time.sleep(latency)
+
+    def _handle(self, handler):
+        '''
+        Answers a request.
+        @param handler:BaseHTTPRequestHandler
+        '''
+        url = urlparse.urlsplit(handler.path)
+        query = dict(urlparse.parse_qsl(url.query))
+        path = _normalize(urllib.unquote(url.path))
+        method = handler.command.upper()
+        if method == 'POST':
+            method = (handler.headers.get('X-HTTP-Method-Override') or
+                      method).upper()
+
+        body = self.__read_body(handler)
+        error = self.__injected_error()
+        if error:
+            return self.__send(handler, error,
+                               {'desc': 'Injected failure (code: %d)' % error})
+
+        if path.startswith(PDF_PATH):
+            return self.__send_pdf(handler, path)
+
+        match = ROUTER.match(path)
+        if not match:
+            return self.__send(handler, 404, {'desc': 'Not found'})
+
+        if match.name in DIGEST_ROUTES:
+            return self.__send_digest(handler, method, path, match)
+
+        if match.name in COLLECTION_ROUTES:
+            if method in ['GET', 'HEAD']:
+                return self.__send_collection(handler, path, match, query)
+            if method == 'POST' and match.name == 'invoices':
+                return self.__create_invoice(handler, path, body)
+            return self.__send(handler, 405, {'desc': 'Method not allowed'})
+
+        entry = self.data.get(path)
+        if not entry:
+            return self.__send(handler, 404, {'desc': 'Not found'})
+        data, modified = entry
+        etag = SandboxData.etag(path, modified)
+
+        if_match = handler.headers.get('If-Match')
+        if method in ['GET', 'HEAD']:
+            if if_match and if_match != etag:
+                return self.__send(handler, 412,
+                                   {'desc': 'Precondition failed'},
+                                   {'Etag': etag})
+            if 'application/pdf' in (handler.headers.get('Accept') or ''):
+                return self.__send(handler, 302, headers={
+                                'Location': '/%s%s.pdf' % (PDF_PATH, path)})
+            if handler.headers.get('If-None-Match') == etag:
+                return self.__send(handler, 304, headers={'Etag': etag})
+            return self.__send(handler, 200, _project(data, query),
+                               {'Etag': etag})
+
+        if method in ['PATCH', 'DELETE'] and if_match and if_match != etag:
+            return self.__send(handler, 409, {'desc': 'Conflict'},
+                               {'Etag': etag})
+
+        if method == 'PATCH':
+            etag = self.data.update(path, body if isinstance(body, dict)
+                                    else {})
+            return self.__send(handler, 204, headers={'Etag': etag})
+
+        if method == 'DELETE':
+            self.data.delete(path)
+            return self.__send(handler, 204)
+
+        return self.__send(handler, 405, {'desc': 'Method not allowed'})
+
+    def __read_body(self, handler):
+        '''
+        Reads and decodes the body of a request.
+        @param handler:BaseHTTPRequestHandler
+        @return: dict or str
+        '''
+        length = int(handler.headers.get('Content-Length') or 0)
+        body = handler.rfile.read(length) if length else ''
+        if handler.headers.get('Content-Encoding') == http.COMPRESSION_GZIP:
+            body = GzipFile(fileobj=StringIO(body)).read()
+
+        content_type = handler.headers.get('Content-Type') or ''
+        if content_type.startswith('application/x-www-form-urlencoded'):
+            return dict((name, _coerce(value))
+                        for name, value in urlparse.parse_qsl(body))
+        if content_type.startswith('application/json') and body:
+            return json.loads(body)
+        return body
+
+    def __send_collection(self, handler, path, match, query):
+        '''
+        Answers a request for a page of a collection.
+        '''
+        if match.name in ['buyer.days', 'buyer.hours', 'seller.days',
+                          'seller.hours']:
+            items = self.__digests(path, match)
+        else:
+            items = [(child, _project(data, query), modified)
+                     for child, data, modified in self.data.children(path)
+                     if _matches(data, modified, query.get('q'))]
+
+        modified = max([item[2] for item in items] or [0])
+        etag = '%d-%d' % (modified, len(items))
+        if handler.headers.get('If-None-Match') == etag:
+            return self.__send(handler, 304, headers={'Etag': etag})
+        if not items:
+            return self.__send(handler, 204, headers={
+                        'Content-Range': 'resources 0-0/0', 'Etag': etag})
+
+        offset, limit = 0, len(items)
+        requested = re.match(r'^\w+=(\d+)-(\d+)$',
+                             handler.headers.get('Range') or '')
+        if requested:
+            offset, limit = map(int, requested.groups())
+        page = items[offset:offset + limit]
+        if not page:
+            return self.__send(handler, 416, {'desc': 'Out of range'}, {
+                    'Content-Range': 'resources %d-%d/%d' % (offset, offset,
+                                                             len(items)),
+                    'Etag': etag})
+
+        body = [dict(data, etag=SandboxData.etag(child, item_modified))
+                for child, data, item_modified in page]
+        return self.__send(handler, 206 if requested else 200, body, {
+                    'Content-Range': 'resources %d-%d/%d' %
+                                     (offset, offset + len(page) - 1,
+                                      len(items)),
+                    'Etag': etag})
+
+    def __digests(self, path, match):
+        '''
+        Gets the digests listed in a days or hours collection.
+        @return: list (path, data, modified) tuples.
+        '''
+        entry = self.data.get(path.rsplit('/', 1)[0])
+        if not entry:
+            return []
+        span = timedelta(days=1) if path.endswith('days') else \
+               timedelta(hours=1)
+        current = datetime.now().replace(minute=0, second=0, microsecond=0)
+        if span.days:
+            current = current.replace(hour=0)
+        items = []
+        for n in xrange(DIGESTS_LISTED):
+            timestamp = datetime_to_timestamp(current - span * n)
+            items.append(('%s/%d' % (path, timestamp),
+                          _digest('%s/%d' % (path, timestamp),
+                                  entry[0].get('currencies') or []),
+                          timestamp))
+        return items
+
+    def __send_digest(self, handler, method, path, match):
+        '''
+        Answers a request for a daily or hourly digest, computed on the fly.
+        '''
+        entry = self.data.get(path.rsplit('/', 2)[0])
+        if not entry or method not in ['GET', 'HEAD']:
+            return self.__send(handler, 404, {'desc': 'Not found'})
+
+        timestamp = path.rsplit('/', 1)[1]
+        return self.__send(handler, 200,
+                           _digest(path, entry[0].get('currencies') or []),
+                           {'Etag': '%s-%s' % (timestamp, timestamp)})
+
+    def __create_invoice(self, handler, path, body):
+        '''
+        Answers the sending of an invoice.
+        '''
+        identifier = str(len(self.data.children(path)) + 1)
+        while self.data.get(path + '/' + identifier):
+            identifier = str(int(identifier) + 1)
+        now = datetime_to_timestamp(datetime.now())
+        self.data.put(path + '/' + identifier, {
+                    'name': 'Invoice %s' % identifier, 'body': body,
+                    'date': now, 'dueDate': now, 'read': False,
+                    'flagged': False, 'paid': False, 'canceled': False,
+                    'location': 0})
+        return self.__send(handler, 201, {'id': identifier},
+                           {'Location': '/%s/%s/' % (path, identifier)})
+
+    def __send_pdf(self, handler, path):
+        '''
+        Answers the download of a PDF file, honoring byte ranges.
+        '''
+        line = '%%PDF-1.4 %s\n' % path
+        content = (line * (self.pdf_size // len(line) + 1))[:self.pdf_size]
+        requested = re.match(r'^bytes=(\d+)-$',
+                             handler.headers.get('Range') or '')
+        if not requested:
+            return self.__send(handler, 200, content,
+                               {'Content-Type': 'application/pdf'},
+                               compress=False)
+
+        offset = int(requested.group(1))
+        if offset >= len(content):
+            return self.__send(handler, 416, '', {
+                        'Content-Range': 'bytes */%d' % len(content)},
+                        compress=False)
+        return self.__send(handler, 206, content[offset:], {
+                    'Content-Type': 'application/pdf',
+                    'Content-Range': 'bytes %d-%d/%d' % (offset,
+                                                         len(content) - 1,
+                                                         len(content))},
+                    compress=False)
+
+    def __send(self, handler, code, body=None, headers=None, compress=True):
+        '''
+        Writes a response.
+        @param handler:BaseHTTPRequestHandler
+        @param code:int Status code.
+        @param body:object Body, serialized to JSON unless it is a str.
+        @param headers:dict Headers.
+        @param compress:bool Whether the body can be compressed.
+        '''
+        headers = dict(headers or {})
+        if body is None:
+            body = ''
+        elif not isinstance(body, str):
+            body = json.dumps(body)
+            headers.setdefault('Content-Type', 'application/json')
+
+        accepted = handler.headers.get('Accept-Encoding') or ''
+        if body and compress and self.compression and \
+           self.compression in accepted and handler.command != 'HEAD':
+            if self.compression == http.COMPRESSION_DEFLATE:
+                body = zlib.compress(body)
+            else:
+                body = http.gzip_str(body)
+            headers['Content-Encoding'] = self.compression
+
+        if code in [204, 304]:
+            body = ''
+
+        handler.send_response(code)
+        for name, value in headers.items():
+            handler.send_header(name, value)
+        handler.send_header('Content-Length', str(len(body)))
+        handler.end_headers()
+        if handler.command != 'HEAD':
+            handler.wfile.write(body)
+
+
+def _matches(data, modified, query):
+    '''
+    Gets a value indicating whether a resource matches a filter query such
+    as 'read==0|location<<2'.
+    @param data:dict Representation of the resource.
+    @param modified:long Time of the last modification in milliseconds.
+    @param query:str Filter query.
+    @return: bool
+    '''
+    for clause in (query or '').split('|'):
+        match = FILTER_PATTERN.match(clause.strip())
+        if not match:
+            continue
+        field, operator, value = match.groups()
+        actual = modified if field == 'lastModified' else data.get(field)
+        expected = _coerce(value)
+        if operator == '==' and not actual == expected:
+            return False
+        if operator == '<<' and not (actual is not None and
+                                     actual < expected):
+            return False
+        if operator == '>>' and not (actual is not None and
+                                     actual > expected):
+            return False
+    return True
+
+
+def _project(data, query):
+    '''
+    Applies the 'fields' parameter of a request to a representation.
+    Fields prefixed by '-' are excluded.
+    @param data:dict Representation of a resource.
+    @param query:dict Parameters of the request.
+    @return: dict
+    '''
+    fields = [field.strip() for field in
+              (query.get('fields') or '').split(',') if field.strip()]
+    if not fields:
+        return data
+    excluded = [field[1:] for field in fields if field.startswith('-')]
+    if excluded:
+        return dict((name, value) for name, value in data.items()
+                    if name not in excluded)
+    return dict((name, value) for name, value in data.items()
+                if name in fields)
+
+
+def _digest(path, currencies):
+    '''
+    Gets the random but stable analytics of a daily or hourly digest.
+    @param path:str Path of the digest.
+    @param currencies:list Currencies.
+    @return: dict
+    '''
+    return _analytics(random.Random(path), currencies)
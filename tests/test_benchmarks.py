@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+from StringIO import StringIO
+from benchmarks import harness
+from benchmarks.harness import (scenario, timed, statistics, deep_size,
+                                SkipScenario)
+
+
+class HarnessTest(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(setattr, harness, 'SCENARIOS', list(harness.SCENARIOS))
+        del harness.SCENARIOS[:]
+
+    def test_summarizes_samples(self):
+        summary = statistics([3.0, 1.0, 2.0], number=10)
+        self.assertEqual((summary['min'], summary['median'], summary['max'],
+                          summary['mean'], summary['samples'],
+                          summary['calls']), (1.0, 2.0, 3.0, 2.0, 3, 10))
+        self.assertAlmostEqual(summary['stdev'], (2 / 3.0) ** 0.5)
+
+    def test_times_calls(self):
+        calls, setups = [], []
+        summary = timed(lambda: calls.append(1), repeat=3, number=4,
+                        setup=lambda: setups.append(1))
+        self.assertEqual((len(calls), len(setups)), (12, 3))
+        self.assertEqual((summary['samples'], summary['calls']), (3, 4))
+
+    def test_counts_shared_objects_once(self):
+        shared = ['x' * 1000]
+        single = deep_size([shared])
+        self.assertTrue(single > 1000)
+        self.assertTrue(deep_size([shared, shared]) - single < 100)
+        self.assertEqual(deep_size(int), 0)
+
+    def test_runs_saves_and_compares_scenarios(self):
+        durations = {'fast': 1.0}
+
+        @scenario('fast')
+        def fast(options):
+            return {'call': statistics([durations['fast']]), 'size': 100}
+
+        @scenario('skipped')
+        def skipped(options):
+            raise SkipScenario('not here')
+
+        output = StringIO()
+        baseline = harness.run({'repeat': 1}, output=output)
+        self.assertEqual(baseline['results']['skipped'],
+                         {'skipped': 'not here'})
+        self.assertTrue('call 1000.000ms' in output.getvalue())
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'baseline.json')
+        harness.save(baseline, path)
+        self.assertEqual(harness.load(path)['results'], baseline['results'])
+
+        durations['fast'] = 1.5
+        current = harness.run({'repeat': 1}, ['fast'], output=StringIO())
+        self.assertEqual(harness.compare(harness.load(path), current),
+                         [('fast', 'call', 1.0, 1.5, 1.5, 'regression'),
+                          ('fast', 'size', 100, 100, 1.0, '')])
+
+
+class ScenariosTest(unittest.TestCase):
+
+    def test_scenarios_run_against_the_sandbox(self):
+        import benchmarks.scenarios
+        options = {'invoices': 20, 'buyers': 3, 'storm': 10, 'workers': 2,
+                   'latency': 0.0, 'repeat': 1, 'number': 10,
+                   'cassette': None, 'speed': 0.0}
+        names = ['collection.retrieve_all']
+        results = harness.run(options, names, output=StringIO())['results']
+        self.assertEqual(sorted(results), names)
+        self.assertFalse('skipped' in results[names[0]])
+
+
+if __name__ == '__main__':
+    unittest.main()
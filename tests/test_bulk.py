@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+import unittest
+from greendizer.clients.dal import ResourceConflictException
+from tests import SandboxTestCase
+
+
+INVOICES = 'sellers/me/emails/e1/invoices'
+
+
+class BulkOperationsTest(SandboxTestCase):
+    invoices = 30
+
+    def unread(self):
+        return [path for path, data, _ in self.data.children(INVOICES)
+                if not data['read'] and data['location'] < 2]
+
+    def test_update_all_updates_resources_of_the_collection(self):
+        client = self.seller_client()
+        expected = len(self.unread())
+        outcomes = client.seller.emails['e1'].invoices.unread.update_all(
+                                                                read=True)
+        self.assertEqual(len(outcomes), expected)
+        self.assertEqual([o.error for o in outcomes if o.failed], [])
+        self.assertEqual(self.unread(), [])
+
+    def test_update_all_updates_resources_loaded_from_json(self):
+        # IDs parsed from JSON are unicode and used to break gzipped PATCH.
+        client = self.seller_client()
+        invoices = client.seller.emails['e1'].invoices.all
+        invoices.retrieve_all()
+        invoice = invoices[0]
+        self.assertTrue(isinstance(invoice.id, unicode))
+        invoice.flagged = not invoice.flagged
+        invoice.update()
+        path = '%s/%s' % (INVOICES, invoice.id)
+        self.assertEqual(self.data.get(path)[0]['flagged'], invoice.flagged)
+
+    def test_update_all_skips_unchanged_resources(self):
+        client = self.seller_client()
+        collection = client.seller.emails['e1'].invoices.all
+        read = [o.value for o in collection.update_all(read=True)]
+        self.assertEqual(read.count(True), len(
+                            [1 for _, data, _ in self.data.children(INVOICES)
+                             if data['read']]) - read.count(False))
+        self.assertEqual(collection.update_all(read=True)[0].value, False)
+
+    def test_update_all_rejects_read_only_attributes(self):
+        client = self.seller_client()
+        collection = client.seller.emails['e1'].invoices.all
+        self.assertRaises(AttributeError, collection.update_all, total=0)
+
+    def test_update_all_reports_conflicts(self):
+        client = self.seller_client()
+        collection = client.seller.emails['e1'].invoices.all
+        modified = []
+        unflagged = [path.rsplit('/', 1)[1] for path, data, _ in
+                     self.data.children(INVOICES) if not data['flagged']]
+
+        def change(outcome, done, total):
+            if done == 1:
+                # Modified once its page was retrieved.
+                identifier = [identifier for identifier in unflagged
+                              if identifier != outcome.item.id][0]
+                path = '%s/%s' % (INVOICES, identifier)
+                self.data.update(path, {'name': 'Changed'})
+                modified.append(identifier)
+
+        outcomes = collection.update_all(prevent_conflicts=True,
+                                         max_workers=1, callback=change,
+                                         flagged=True)
+        conflicts = [o for o in outcomes if o.failed]
+        self.assertEqual([o.item.id for o in conflicts], modified)
+        self.assertTrue(isinstance(conflicts[0].error,
+                                   ResourceConflictException))
+
+    def test_delete_all_deletes_resources(self):
+        client = self.seller_client()
+        progress = []
+        outcomes = client.seller.emails['e1'].invoices.all.delete_all(
+                    callback=lambda outcome, done, total:
+                        progress.append((done, total)))
+        self.assertEqual(len(outcomes), self.invoices)
+        self.assertEqual([o.error for o in outcomes if o.failed], [])
+        self.assertEqual(self.data.children(INVOICES), [])
+        self.assertEqual(progress[-1], (self.invoices, self.invoices))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+import unittest
+from greendizer.clients.analytics import AnalyticsTable, METRICS
+from tests import SandboxTestCase
+
+
+class BuyerAnalyticsTest(SandboxTestCase):
+    buyers = 12
+
+    def expected(self, currency):
+        '''
+        Gets the sums of the buyers of the sandbox in a currency.
+        @param currency:str Currency code.
+        @return: dict
+        '''
+        sums = {}
+        for n in xrange(self.buyers):
+            data = self.data.get('sellers/me/buyers/%d' % (n + 1))[0]
+            if currency in data:
+                sums['Buyer %d' % (n + 1)] = data[currency]['sum']
+        return sums
+
+    def test_loads_a_row_per_buyer_and_currency(self):
+        table = self.seller_client().seller.buyers.analytics()
+        self.assertEqual(len(table.entries), self.buyers)
+        self.assertEqual(len(table), sum(len(self.expected(currency))
+                                         for currency in table.currencies))
+        for currency in table.currencies:
+            self.assertAlmostEqual(table.totals('sum')[currency],
+                                   sum(self.expected(currency).values()))
+
+    def test_reads_the_pages_of_buyers_only(self):
+        client = self.seller_client()
+        client.seller.buyers.analytics()
+        self.assertTrue(client.stats.requests < self.buyers)
+
+    def test_sorts_rows_by_metric(self):
+        table = self.seller_client().seller.buyers.analytics()
+        currency = table.currencies[0]
+        expected = sorted(self.expected(currency).values(), reverse=True)
+        self.assertEqual([row[2]['sum'] for row in table.top(3, 'sum',
+                                                             currency)],
+                         expected[:3])
+        self.assertEqual(table.sort('sum', 'XYZ'), [])
+        self.assertRaises(ValueError, table.column, 'volume')
+
+    def test_filters_currencies(self):
+        table = self.seller_client().seller.buyers.analytics()
+        currency = table.currencies[0]
+        filtered = self.seller_client().seller.buyers.analytics(
+                                                    [currency.lower()])
+        self.assertEqual(filtered.currencies, [currency])
+        self.assertEqual(len(filtered), len(self.expected(currency)))
+
+
+class AnalyticsTableTest(unittest.TestCase):
+
+    def test_handles_entries_without_analytics(self):
+        class Empty(object):
+            available_currencies = None
+
+        table = AnalyticsTable([Empty()])
+        self.assertEqual((len(table), table.currencies), (0, []))
+        self.assertEqual(set(table.column(m).typecode for m in METRICS),
+                         set(['d']))
+
+
+if __name__ == '__main__':
+    unittest.main()
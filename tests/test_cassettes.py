@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+from greendizer.clients import transport
+from greendizer.clients.cassettes import Cassette, CassetteError, REDACTED
+from tests import SandboxTestCase
+
+
+class _CountingPool(transport.ConnectionPool):
+    '''
+    Pool counting the requests sent through it.
+    '''
+    def __init__(self):
+        transport.ConnectionPool.__init__(self)
+        self.requests = 0
+
+    def urlopen(self, *args, **kwargs):
+        self.requests += 1
+        return transport.ConnectionPool.urlopen(self, *args, **kwargs)
+
+
+def load(client, email='e1'):
+    resource = client.seller.emails[email]
+    resource.load()
+    return resource
+
+
+class CassetteTest(SandboxTestCase):
+
+    def setUp(self):
+        super(CassetteTest, self).setUp()
+        self.client = self.seller_client()
+        self.cassette = Cassette()
+        with self.cassette.record():
+            load(self.client)
+            self.client.seller.emails['e1'].invoices.search().retrieve_all()
+
+    def test_records_interactions_without_credentials(self):
+        self.assertEqual(len(self.cassette), self.client.stats.requests)
+        interaction = self.cassette[0]
+        self.assertEqual((interaction.method, interaction.uri,
+                          interaction.status_code),
+                         ('GET', 'sellers/me/emails/e1/', 200))
+        self.assertEqual(interaction.header('Authorization',
+                                            interaction.request_headers),
+                         REDACTED)
+
+    def test_saves_and_loads_cassettes(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'workload.cassette')
+        self.cassette.save(path)
+        loaded = Cassette.load(path)
+        self.assertEqual([(i.key, i.body) for i in loaded],
+                         [(i.key, i.body) for i in self.cassette])
+
+    def test_plays_interactions_back_without_the_network(self):
+        requests = self.server.requests
+        with self.cassette.play():
+            self.assertEqual(load(self.seller_client()).id, 'e1')
+        self.assertEqual(self.server.requests, requests)
+
+    def test_replays_the_recorded_requests(self):
+        requests = self.server.requests
+        outcomes = self.cassette.replay(self.client)
+        self.assertEqual(len(outcomes), len(self.cassette))
+        self.assertEqual([outcome.value.status_code for outcome in outcomes],
+                         [i.status_code for i in self.cassette])
+        self.assertEqual(self.server.requests, requests)
+
+    def test_raises_errors_for_requests_not_recorded(self):
+        requests = self.server.requests
+        with self.cassette.play():
+            self.assertRaises(CassetteError, load, self.client, 'e2')
+        self.assertEqual(self.server.requests, requests)
+
+    def test_lets_requests_not_recorded_pass_through_on_demand(self):
+        with self.cassette.play(passthrough=True):
+            self.assertEqual(load(self.client, 'e2').id, 'e2')
+
+    def test_composes_with_the_installed_handlers(self):
+        pool = _CountingPool()
+        handler = transport.PooledHandler(pool)
+        transport.add_handler(handler)
+        self.addCleanup(pool.clear)
+        self.addCleanup(transport.remove_handler, handler)
+
+        cassette = Cassette()
+        with cassette.record():
+            load(self.client)
+        self.assertEqual((len(cassette), pool.requests), (1, 1))
+        self.assertEqual(transport.installed_handlers(), [handler])
+
+        with cassette.play(passthrough=True):
+            load(self.client)
+            load(self.client, 'e2')
+        self.assertEqual(pool.requests, 2)
+        self.assertEqual(transport.installed_handlers(), [handler])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+import time
+import threading
+import unittest
+from array import array
+from greendizer.clients.http import Deadline, Channel
+from greendizer.clients.concurrency import (RateLimiter, run_concurrently,
+                                            map_concurrently)
+from greendizer.clients.resources import remaining_for
+from tests import SandboxTestCase
+
+
+class RunConcurrentlyTest(unittest.TestCase):
+
+    def test_keeps_the_order_of_the_items(self):
+        def slow_square(n):
+            time.sleep(0.01 * (5 - n))
+            return n * n
+
+        outcomes = run_concurrently(slow_square, range(5), max_workers=5)
+        self.assertEqual([outcome.get() for outcome in outcomes],
+                         [0, 1, 4, 9, 16])
+
+    def test_runs_items_concurrently(self):
+        threads = set()
+
+        def record(n):
+            threads.add(threading.current_thread().name)
+            time.sleep(0.05)
+
+        started = time.time()
+        run_concurrently(record, range(4), max_workers=4)
+        self.assertTrue(time.time() - started < 0.15)
+        self.assertEqual(len(threads), 4)
+
+    def test_collects_errors(self):
+        def fail_on_odd(n):
+            if n % 2:
+                raise ValueError(n)
+            return n
+
+        outcomes = run_concurrently(fail_on_odd, range(4))
+        self.assertEqual([outcome.failed for outcome in outcomes],
+                         [False, True, False, True])
+        self.assertRaises(ValueError, outcomes[1].get)
+        self.assertRaises(ValueError, map_concurrently, fail_on_odd, range(4))
+
+    def test_notifies_every_outcome(self):
+        notified = []
+        run_concurrently(lambda n: n, range(6), 3, notified.append)
+        self.assertEqual(sorted(outcome.value for outcome in notified),
+                         range(6))
+
+    def test_records_callback_errors_as_outcomes(self):
+        def fail_on_two(outcome):
+            if outcome.item == 2:
+                raise ValueError(outcome.item)
+
+        for workers in [1, 3]:
+            outcomes = run_concurrently(lambda n: n, range(6), workers,
+                                        fail_on_two)
+            self.assertEqual([outcome.failed for outcome in outcomes],
+                             [False, False, True, False, False, False])
+            self.assertRaises(ValueError, outcomes[2].get)
+
+    def test_passes_the_deadline_and_channel_on_to_workers(self):
+        channel = Channel()
+        with Deadline(5) as deadline, channel:
+            seen = map_concurrently(lambda n: (Deadline.current(),
+                                               Channel.current()),
+                                    range(3), max_workers=3)
+        self.assertEqual(seen, [(deadline, channel)] * 3)
+
+
+class RateLimiterTest(unittest.TestCase):
+
+    def test_lets_bursts_through(self):
+        limiter = RateLimiter(10, burst=3)
+        self.assertEqual([limiter.acquire() for _ in xrange(3)], [0.0] * 3)
+
+    def test_spaces_calls_beyond_bursts(self):
+        limiter = RateLimiter(20, burst=1)
+        started = time.time()
+        for _ in xrange(5):
+            limiter.acquire()
+        self.assertTrue(0.18 <= time.time() - started < 0.5)
+
+
+class RemainingForTest(SandboxTestCase):
+    payments = 2
+
+    def test_computes_remaining_amounts(self):
+        client = self.seller_client()
+        node = client.seller.emails['e1'].invoices
+        invoices = [node[str(n + 1)] for n in xrange(6)]
+        amounts = remaining_for(invoices, max_workers=4)
+        self.assertTrue(isinstance(amounts, array))
+        self.assertEqual(list(amounts),
+                         [invoice.remaining for invoice in invoices])
+
+    def test_revalidates_unchanged_payments(self):
+        client = self.seller_client()
+        node = client.seller.emails['e1'].invoices
+        invoices = [node[str(n + 1)] for n in xrange(6)]
+        first = remaining_for(invoices)
+        requests, hits = client.stats.requests, client.stats.cache_hits
+        self.assertEqual(remaining_for(invoices), first)
+        self.assertTrue(client.stats.requests > requests)
+        self.assertEqual(client.stats.cache_hits - hits,
+                         client.stats.requests - requests)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+import unittest
+from tests import SandboxTestCase
+
+
+INVOICES = 'sellers/me/emails/e1/invoices'
+
+
+class DeltaSyncTest(SandboxTestCase):
+
+    def setUp(self):
+        super(DeltaSyncTest, self).setUp()
+        self.client = self.seller_client()
+        self.invoices = self.client.seller.emails['e1'].invoices
+
+    def ids(self, resources):
+        return sorted(resource.id for resource in resources)
+
+    def test_first_sync_retrieves_every_resource(self):
+        collection = self.invoices.search('')
+        delta = collection.sync()
+        self.assertEqual(len(delta.added), len(self.data.children(INVOICES)))
+        self.assertEqual((delta.changed, delta.removed), ([], []))
+
+    def test_unchanged_collections_cost_one_request(self):
+        collection = self.invoices.search('')
+        collection.sync()
+        requests = self.client.stats.requests
+        self.assertFalse(collection.sync())
+        self.assertEqual(self.client.stats.requests, requests + 1)
+
+    def test_reports_changed_added_and_removed_resources(self):
+        collection = self.invoices.search('')
+        collection.sync()
+        count = len(collection)
+        self.data.update('%s/3' % INVOICES, {'name': 'Changed'})
+        self.data.delete('%s/5' % INVOICES)
+        self.data.put('%s/999' % INVOICES,
+                      dict(self.data.get('%s/1' % INVOICES)[0]))
+
+        delta = collection.sync()
+        self.assertEqual(self.ids(delta.changed), ['3'])
+        self.assertEqual(self.ids(delta.added), ['999'])
+        self.assertEqual(self.ids(delta.removed), ['5'])
+        self.assertEqual(collection['3'].name, 'Changed')
+        self.assertEqual(len(collection), count)
+        self.assertEqual(collection['5'], None)
+
+    def test_finds_resources_entering_empty_collections(self):
+        for path, data, _ in self.data.children(INVOICES):
+            if data['flagged']:
+                self.data.update(path, {'flagged': False})
+
+        collection = self.invoices.search('flagged==1')
+        self.assertFalse(collection.sync())
+        self.assertFalse(collection.sync())
+        self.data.update('%s/4' % INVOICES, {'flagged': True})
+        delta = collection.sync()
+        self.assertEqual(self.ids(delta.added), ['4'])
+        self.assertEqual(self.ids(collection), ['4'])
+
+
+if __name__ == '__main__':
+    unittest.main()
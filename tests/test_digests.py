@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+import unittest
+from datetime import datetime, date, timedelta
+from tests import SandboxTestCase
+
+
+class DigestRangeTest(SandboxTestCase):
+
+    def buyer(self):
+        return self.seller_client().seller.buyers['1']
+
+    def test_gets_every_day_of_a_range(self):
+        end = datetime.now()
+        series = self.buyer().days.range(end - timedelta(days=4), end)
+        self.assertEqual(len(series), 5)
+        self.assertEqual(series.times[-1],
+                         end.replace(hour=0, minute=0, second=0,
+                                     microsecond=0))
+        self.assertEqual(series.currencies, ['EUR', 'USD'])
+        self.assertEqual(series.missing, [])
+        self.assertEqual(len(series.series('sum', 'EUR')), 5)
+
+    def test_gets_every_hour_of_a_range(self):
+        end = datetime.now()
+        series = self.buyer().hours.range(end - timedelta(hours=5), end)
+        self.assertEqual(len(series), 6)
+        self.assertEqual(series.times[1] - series.times[0],
+                         timedelta(hours=1))
+
+    def test_accepts_dates(self):
+        today = date.today()
+        days = self.buyer().days.range(today - timedelta(days=2), today)
+        self.assertEqual(days.times, [datetime.combine(today - timedelta(n),
+                                                       datetime.min.time())
+                                      for n in [2, 1, 0]])
+        hours = self.buyer().hours.range(today, today)
+        self.assertEqual(len(hours), 24)
+
+    def test_restricts_and_fills_currencies(self):
+        end = datetime.now()
+        series = self.buyer().days.range(end - timedelta(days=1), end,
+                                         currencies=['eur', 'JPY'],
+                                         fill_value=-1.0)
+        self.assertEqual(series.currencies, ['EUR', 'JPY'])
+        self.assertEqual(list(series.series('sum', 'JPY')), [-1.0, -1.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+import time
+import httplib
+import urllib2
+import threading
+import unittest
+from greendizer.clients import transport
+from greendizer.clients.http import Channel
+from greendizer.clients.fanout import FanOut
+from tests import SandboxTestCase
+
+
+class _CountingPool(transport.ConnectionPool):
+    '''
+    Pool counting the requests sent through it.
+    '''
+    def __init__(self):
+        transport.ConnectionPool.__init__(self)
+        self.requests = 0
+
+    def urlopen(self, *args, **kwargs):
+        self.requests += 1
+        return transport.ConnectionPool.urlopen(self, *args, **kwargs)
+
+
+class _BrokenPool(object):
+    '''
+    Pool whose every response has an invalid status line.
+    '''
+    def urlopen(self, *args, **kwargs):
+        raise httplib.BadStatusLine('')
+
+
+def load(client):
+    client.seller.emails['e1'].load()
+
+
+class FanOutTest(SandboxTestCase):
+
+    def setUp(self):
+        super(FanOutTest, self).setUp()
+        self.clients = dict((key, self.seller_client())
+                            for key in ['a', 'b', 'c'])
+        self.pool = _CountingPool()
+        self.addCleanup(self.pool.clear)
+
+    def test_runs_operations_on_every_account(self):
+        def fail_on_b(client):
+            if client is self.clients['b']:
+                raise ValueError('b')
+            load(client)
+            return 'ok'
+
+        report = FanOut(self.clients, pool=self.pool).run(fail_on_b)
+        self.assertEqual(sorted(report.succeeded), ['a', 'c'])
+        self.assertEqual(report.failed, ['b'])
+        self.assertEqual(report['a'].values, ['ok'])
+        self.assertEqual([str(e) for e in report.errors['b']], ['b'])
+        self.assertEqual(report['a'].stats.requests, 1)
+        self.assertEqual(report.summary()['requests'], 2)
+
+    def test_serves_accounts_in_turns(self):
+        calls = []
+        FanOut(self.clients, max_workers=1, pool=self.pool).map(
+                lambda client, item: item, {'a': [1, 2, 3], 'b': [1]},
+                callback=lambda key, outcome: calls.append(
+                                                (key, outcome.value)))
+        self.assertNotEqual(calls[0][0], calls[1][0])
+        self.assertEqual(sorted(calls),
+                         [('a', 1), ('a', 2), ('a', 3), ('b', 1)])
+
+    def test_sends_requests_through_the_pool(self):
+        FanOut(self.clients, pool=self.pool).map(
+                lambda client, item: load(client),
+                dict((key, range(3)) for key in self.clients))
+        self.assertEqual(self.pool.requests, 9)
+
+    def test_spaces_the_requests_of_an_account(self):
+        fanout = FanOut({'a': self.clients['a']}, max_per_account=4,
+                        rate=20, burst=1, pool=self.pool)
+        started = time.time()
+        fanout.map(lambda client, item: load(client), {'a': range(5)})
+        self.assertTrue(time.time() - started >= 0.18)
+
+    def test_leaves_clients_shared_by_overlapping_runs_untouched(self):
+        client = self.clients['a']
+        fanout = FanOut({'a': client}, rate=10, burst=1, pool=self.pool)
+        first_loaded = threading.Event()
+        second_running = threading.Event()
+        first_done = threading.Event()
+        durations, untouched = [], []
+
+        def first(client):
+            load(client)
+            first_loaded.set()
+            second_running.wait(2)
+
+        def second(client):
+            second_running.set()
+            first_done.wait(2)
+            untouched.append(client.rate_limiter is None and
+                             client.opener is None)
+            started = time.time()
+            for _ in xrange(4):
+                load(client)
+            durations.append(time.time() - started)
+
+        runs = [threading.Thread(target=fanout.run, args=(first,)),
+                threading.Thread(target=fanout.run, args=(second,))]
+        runs[0].start()
+        first_loaded.wait(2)
+        runs[1].start()
+        runs[0].join()
+        first_done.set()
+        runs[1].join()
+
+        self.assertEqual(untouched, [True])
+        # The limit still applies once the first run is over.
+        self.assertTrue(durations[0] >= 0.28, durations)
+        self.assertEqual((client.rate_limiter, client.opener), (None, None))
+
+
+class PooledHandlerTest(SandboxTestCase):
+
+    def test_wraps_invalid_responses_in_url_errors(self):
+        opener = transport.build_opener(
+                                    transport.PooledHandler(_BrokenPool()))
+        self.assertRaises(urllib2.URLError, opener.open, self.server.url)
+
+        client = self.seller_client()
+        with Channel(opener):
+            try:
+                load(client)
+            except(httplib.HTTPException):
+                self.fail('httplib exception escaped the request')
+            except(Exception), e:
+                self.assertEqual(str(e), 'Unable to reach the server')
+            else:
+                self.fail('no exception raised')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+import logging
+import unittest
+from greendizer.clients import http
+from greendizer.clients.http import Request
+from tests import SandboxTestCase
+
+
+class _Handler(logging.Handler):
+    '''
+    Logging handler keeping the records it receives.
+    '''
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class HookTest(SandboxTestCase):
+
+    def setUp(self):
+        super(HookTest, self).setUp()
+        self.client = self.seller_client()
+        self.phases = []
+
+    def hook(self, event, phase, seconds):
+        self.phases.append(phase)
+
+    def add_hook(self, hook):
+        http.add_hook(hook)
+        self.addCleanup(http.remove_hook, hook)
+
+    def get(self, uri='sellers/me/emails/e1/'):
+        return Request(self.client, 'get', uri).get_response()
+
+    def test_notifies_the_phases_of_requests(self):
+        self.add_hook(self.hook)
+        response = self.get()
+        self.assertEqual(self.phases[-1], 'total')
+        self.assertTrue('network' in self.phases)
+        response.data
+        self.assertEqual(self.phases[-1], 'decode')
+        self.assertEqual(response.event.status_code, 200)
+
+    def test_isolates_failing_hooks(self):
+        handler = _Handler()
+        logger = logging.getLogger(http.__name__)
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+
+        def fail(event, phase, seconds):
+            raise RuntimeError('hook')
+
+        self.add_hook(fail)
+        self.add_hook(self.hook)
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data)
+        self.assertTrue(handler.records)
+        self.assertEqual(len(self.phases), len(handler.records))
+        self.assertEqual(self.client.stats.requests, 1)
+
+    def test_parses_responses_once(self):
+        self.add_hook(self.hook)
+        response = self.get()
+        data = response.data
+        self.assertTrue(response.data is data)
+        self.assertEqual(self.phases.count('decode'), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+import sys
+import types
+import unittest
+from greendizer.clients import helpers
+
+
+class ImportTest(unittest.TestCase):
+
+    def test_does_not_load_deferred_modules(self):
+        from benchmarks.scenarios import _probe_import
+        self.assertEqual(_probe_import(True)[1], [])
+
+    def test_keeps_the_former_names(self):
+        from greendizer.clients import Buyer, Seller
+        from greendizer.clients.resources import CURRENCIES
+        self.assertEqual((Buyer.__name__, Seller.__name__),
+                         ('Buyer', 'Seller'))
+        self.assertTrue(CURRENCIES is helpers.CURRENCIES)
+        self.assertTrue(helpers.SUPPORTED_CURRENCIES is helpers.CURRENCIES)
+
+
+class CurrenciesTest(unittest.TestCase):
+
+    def setUp(self):
+        pyxmli = types.ModuleType('pyxmli')
+        pyxmli.CURRENCIES = ['USD', 'EUR', 'JPY']
+        self.addCleanup(sys.modules.pop, 'pyxmli', None)
+        sys.modules['pyxmli'] = pyxmli
+        self.reset()
+        self.addCleanup(self.reset)
+
+    def reset(self):
+        helpers._CURRENCIES = helpers._SUPPORTED_CURRENCIES = None
+
+    def test_loads_currencies_on_first_use(self):
+        self.assertEqual(helpers.supported_currencies(),
+                         frozenset(['USD', 'EUR', 'JPY']))
+
+    def test_aliases_behave_like_the_list_of_pyxmli(self):
+        currencies = helpers.CURRENCIES
+        self.assertEqual(list(currencies), ['USD', 'EUR', 'JPY'])
+        self.assertEqual((len(currencies), currencies[1]), (3, 'EUR'))
+        self.assertTrue('JPY' in currencies)
+        self.assertFalse('XXX' in helpers.SUPPORTED_CURRENCIES)
+
+    def test_rejects_unsupported_currencies(self):
+        self.assertRaises(ValueError, helpers.CurrencyMetrics, 'XXX', {})
+
+
+if __name__ == '__main__':
+    unittest.main()
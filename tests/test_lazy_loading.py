@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+import warnings
+import unittest
+from greendizer.clients.dal import (ImplicitLoadError, ImplicitLoadWarning,
+                                    LAZY_LOADING_WARN, LAZY_LOADING_STRICT)
+from greendizer.clients.concurrency import CallSite
+from greendizer.clients.resources import remaining_for
+from tests import SandboxTestCase
+
+
+class LazyLoadingTest(SandboxTestCase):
+
+    def unloaded_invoices(self, client, count=5):
+        node = client.seller.emails['e1'].invoices
+        return [node[str(n + 1)] for n in xrange(count)]
+
+    def test_loads_resources_implicitly(self):
+        client = self.seller_client()
+        invoice = self.unloaded_invoices(client, 1)[0]
+        self.assertTrue(invoice.name)
+        self.assertEqual(client.stats.lazy_loads, {'Invoice': 1})
+
+    def test_warns_at_the_call_site(self):
+        client = self.seller_client(lazy_loading=LAZY_LOADING_WARN)
+        invoice = self.unloaded_invoices(client, 1)[0]
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            invoice.name
+        self.assertEqual(len(caught), 1)
+        self.assertEqual(caught[0].category, ImplicitLoadWarning)
+        self.assertEqual(caught[0].filename, __file__.rstrip('c'))
+
+    def test_refuses_lazy_loads_in_strict_mode(self):
+        client = self.seller_client(lazy_loading=LAZY_LOADING_STRICT)
+        invoice = self.unloaded_invoices(client, 1)[0]
+        self.assertRaises(ImplicitLoadError, getattr, invoice, 'name')
+        self.assertEqual(client.stats.requests, 0)
+
+    def test_reports_loops_of_lazy_loads(self):
+        client = self.seller_client()
+        for invoice in self.unloaded_invoices(client):
+            invoice.name
+        avoidable, = client.stats.avoidable_loads()
+        self.assertEqual((avoidable['loads'], avoidable['avoidable']), (5, 4))
+        self.assertTrue('test_reports_loops_of_lazy_loads' in
+                        avoidable['call_site'], avoidable['call_site'])
+
+    def test_attributes_loads_in_worker_threads_to_the_caller(self):
+        client = self.seller_client()
+        remaining_for(self.unloaded_invoices(client), max_workers=4)
+        sites = set(site['call_site'] for site in
+                    client.stats.avoidable_loads())
+        self.assertTrue(sites)
+        for site in sites:
+            self.assertTrue('test_attributes_loads_in_worker_threads' in site,
+                            site)
+
+
+class CallSiteTest(unittest.TestCase):
+
+    def test_gets_the_calling_code(self):
+        site = CallSite.current()
+        self.assertEqual((site.function, site.filename),
+                         ('test_gets_the_calling_code', __file__.rstrip('c')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+import unittest
+from greendizer.clients.helpers import CurrencyMetrics, Treatment
+from tests import SandboxTestCase
+
+
+DATA = {'sum': 300.0, 'min': 50.0, 'max': 150.0, 'average': 100.0,
+        'invoicesCount': 3, 'items': 9, 'totalTaxes': 60.0,
+        'taxes': [{'type': 'percentage', 'name': 'VAT', 'value': 20}]}
+
+
+class CurrencyMetricsTest(unittest.TestCase):
+
+    def test_parses_the_source_object_once(self):
+        data = dict(DATA)
+        metrics = CurrencyMetrics('EUR', data)
+        data['sum'] = 0
+        del data['taxes']
+        self.assertEqual((metrics.currency, metrics.sum, metrics.items),
+                         ('EUR', 300.0, 9))
+        self.assertTrue(metrics.taxes is metrics.taxes)
+        self.assertEqual([(tax.type, tax.name, tax.value)
+                          for tax in metrics.taxes],
+                         [('percentage', 'VAT', 20)])
+
+    def test_reads_missing_fields_as_none(self):
+        metrics = CurrencyMetrics('EUR', DATA)
+        self.assertEqual(metrics.total_discounts, None)
+        self.assertEqual(metrics.discounts, ())
+        self.assertEqual(Treatment({'value': 5}).name, None)
+
+    def test_is_read_only(self):
+        metrics = CurrencyMetrics('EUR', DATA)
+        self.assertRaises(AttributeError, setattr, metrics, 'sum', 0)
+        self.assertRaises(AttributeError, setattr, metrics, 'other', 0)
+        self.assertRaises(ValueError, CurrencyMetrics, 'EUR', {})
+
+
+class AnalyticsCacheTest(SandboxTestCase):
+
+    def test_caches_metrics_until_sync(self):
+        buyer = self.seller_client().seller.buyers['1']
+        buyer.load()
+        currency = sorted(buyer.available_currencies)[0]
+        metrics = buyer[currency.lower()]
+        self.assertTrue(buyer.get_currency_metrics(currency) is metrics)
+        self.assertTrue(isinstance(buyer.available_currencies, frozenset))
+
+        data = self.data.get('sellers/me/buyers/1')[0]
+        self.data.update('sellers/me/buyers/1',
+                         {currency: dict(data[currency], sum=1.5)})
+        buyer.load(conditional=False)
+        self.assertEqual(buyer[currency].sum, 1.5)
+
+    def test_rejects_unavailable_currencies(self):
+        buyer = self.seller_client().seller.buyers['1']
+        buyer.load()
+        self.assertRaises(ValueError, buyer.get_currency_metrics, 'XYZ')
+
+
+if __name__ == '__main__':
+    unittest.main()
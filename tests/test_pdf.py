@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+from greendizer.clients.pdf import (PDFExporter, EXPORT_DOWNLOADED,
+                                    EXPORT_RESUMED, EXPORT_SKIPPED,
+                                    PARTIAL_SUFFIX, MAX_REDIRECTS)
+from greendizer.clients.http import Deadline, DeadlineExceededError
+from tests import SandboxTestCase
+
+
+class _RedirectingResponse(object):
+    status = 302
+
+    def getheader(self, name):
+        return '/elsewhere'
+
+    def read(self, *args):
+        return ''
+
+
+class _RedirectingPool(object):
+    '''
+    Pool whose every response redirects to another URL.
+    '''
+    def __init__(self):
+        self.requests = 0
+
+    def urlopen(self, method, url, body=None, headers=None):
+        self.requests += 1
+        return _RedirectingResponse()
+
+    def release(self, response):
+        pass
+
+
+class PDFExporterTest(SandboxTestCase):
+
+    def setUp(self):
+        super(PDFExporterTest, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.server.pdf_size = 10000
+
+    def first_invoices(self, count):
+        client = self.seller_client()
+        node = client.seller.emails['e1'].invoices
+        return [node[str(n + 1)] for n in xrange(count)]
+
+    def test_exports_invoices(self):
+        exporter = PDFExporter(self.directory, chunk_size=1024)
+        outcomes = exporter.export(self.first_invoices(3))
+        for outcome in outcomes:
+            path, status = outcome.get()
+            self.assertEqual(status, EXPORT_DOWNLOADED)
+            self.assertEqual(os.path.getsize(path), 10000)
+            self.assertTrue(exporter.is_current(outcome.item))
+
+    def test_skips_invoices_already_exported(self):
+        exporter = PDFExporter(self.directory)
+        invoices = self.first_invoices(2)
+        exporter.export(invoices)
+        self.assertEqual([outcome.get()[1] for outcome in
+                          exporter.export(invoices)], [EXPORT_SKIPPED] * 2)
+
+    def test_resumes_partial_downloads(self):
+        exporter = PDFExporter(self.directory)
+        invoice = self.first_invoices(1)[0]
+        path, _ = exporter.export_one(invoice)
+        with open(path) as f:
+            content = f.read()
+        os.remove(path)
+        with open(path + PARTIAL_SUFFIX, 'wb') as f:
+            f.write(content[:4000])
+
+        self.assertEqual(exporter.export_one(invoice),
+                         (path, EXPORT_RESUMED))
+        with open(path) as f:
+            self.assertEqual(f.read(), content)
+
+    def test_resolves_pdf_urls_like_other_requests(self):
+        invoice = self.first_invoices(1)[0]
+        client = invoice.client
+        url = invoice.get_pdf('fr')
+        self.assertTrue(url.startswith(self.server.url))
+        self.assertTrue(url.endswith('.pdf'))
+        self.assertEqual(client.stats.requests, 1)
+        requests = self.server.requests
+        with Deadline(0):
+            self.assertRaises(DeadlineExceededError, invoice.get_pdf)
+        self.assertEqual(self.server.requests, requests)
+
+    def test_gives_up_after_too_many_redirections(self):
+        pool = _RedirectingPool()
+        exporter = PDFExporter(self.directory, pool=pool)
+        self.assertRaises(IOError, exporter.export_one,
+                          self.first_invoices(1)[0])
+        self.assertEqual(pool.requests, MAX_REDIRECTS + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
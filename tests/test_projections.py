@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+import unittest
+from greendizer.clients.dal import Projection
+from tests import SandboxTestCase
+
+
+class ProjectionTest(unittest.TestCase):
+
+    def test_parses_included_fields(self):
+        projection = Projection.parse('name, total')
+        self.assertEqual(projection.included, frozenset(['name', 'total']))
+        self.assertTrue(projection.covers('name'))
+        self.assertFalse(projection.covers('date'))
+        self.assertEqual(str(projection), 'name,total')
+
+    def test_parses_excluded_fields(self):
+        projection = Projection.parse(['-body', '-lines'])
+        self.assertEqual(projection.excluded, frozenset(['body', 'lines']))
+        self.assertTrue(projection.covers('name'))
+        self.assertFalse(projection.covers('body'))
+        self.assertEqual(str(projection), '-body,-lines')
+
+    def test_requests_every_field_by_default(self):
+        self.assertEqual(Projection.parse(''), None)
+        self.assertEqual(Projection.parse([' ']), None)
+        projection = Projection(['name'])
+        self.assertTrue(Projection.parse(projection) is projection)
+
+    def test_rejects_mixed_lists(self):
+        self.assertRaises(ValueError, Projection.parse, 'name,-total')
+        self.assertRaises(ValueError, Projection.parse, ['-body', 'name'])
+
+    def test_merges_projections(self):
+        names, totals = Projection(['name']), Projection(['total'])
+        self.assertEqual(names.merge(totals).included,
+                         frozenset(['name', 'total']))
+        self.assertEqual(names.merge(None), None)
+        merged = Projection(excluded=['body', 'lines']).merge(
+                                                Projection(['body']))
+        self.assertEqual(merged.excluded, frozenset(['lines']))
+        self.assertEqual(Projection(excluded=['body']).merge(
+                                    Projection(excluded=['lines'])), None)
+
+
+class PartialLoadTest(SandboxTestCase):
+
+    def test_loads_missing_fields_when_read(self):
+        client = self.seller_client()
+        collection = client.seller.emails['e1'].invoices.search()
+        collection.retrieve_all(fields='name')
+        requests = client.stats.requests
+        invoice = collection[0]
+        self.assertTrue(invoice.name)
+        self.assertEqual(client.stats.requests, requests)
+        invoice.total
+        self.assertEqual(client.stats.requests, requests + 1)
+
+    def test_updates_keep_the_fields_to_load(self):
+        client = self.seller_client()
+        collection = client.seller.emails['e1'].invoices.search()
+        collection.retrieve_all(fields='read,name')
+        invoice = collection[0]
+        invoice.read = not invoice.read
+        invoice.update()
+        self.assertEqual(invoice.fields.included, frozenset(['read', 'name']))
+        requests = client.stats.requests
+        self.assertTrue(invoice.total)
+        self.assertEqual(client.stats.requests, requests + 1)
+
+    def test_headers_keep_the_fields_to_load(self):
+        client = self.seller_client()
+        invoice = client.seller.emails['e1'].invoices['1']
+        invoice.load(fields='name')
+        invoice.load_info()
+        self.assertEqual(invoice.fields.included, frozenset(['name']))
+        self.assertTrue(invoice.total)
+        self.assertEqual(invoice.fields.included, frozenset(['name', 'total']))
+
+    def test_updates_of_resources_never_loaded_keep_loading(self):
+        client = self.seller_client()
+        invoice = client.seller.emails['e1'].invoices['1']
+        invoice.read = True
+        invoice.update()
+        self.assertTrue(invoice.total)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+import gc
+import weakref
+import unittest
+from greendizer.clients.resources import InvoiceBase, Transaction
+from tests import SandboxTestCase
+
+
+class ResolverTest(SandboxTestCase):
+
+    def setUp(self):
+        super(ResolverTest, self).setUp()
+        self.client = self.seller_client()
+        self.user = self.client.seller
+
+    def test_resolves_invoices(self):
+        invoice = InvoiceBase.from_uri(self.user,
+                                       'sellers/me/emails/e1/invoices/3/')
+        self.assertEqual((invoice.email.id, invoice.id), ('e1', '3'))
+        self.assertEqual(invoice.uri, 'sellers/me/emails/e1/invoices/3/')
+        self.assertEqual(self.client.stats.requests, 0)
+
+    def test_resolves_absolute_uris(self):
+        invoice = InvoiceBase.from_uri(self.user, self.server.url +
+                                       'sellers/me/emails/e1/invoices/3/')
+        self.assertEqual(invoice.id, '3')
+
+    def test_shares_instances(self):
+        resolver = self.user.resolver
+        first = resolver.resolve('sellers/me/emails/e1/invoices/3/')
+        second = resolver.resolve('sellers/me/emails/e1/invoices/3/')
+        other = resolver.resolve('sellers/me/emails/e1/invoices/4/')
+        self.assertTrue(first is second)
+        self.assertTrue(first.email is other.email)
+
+    def test_shares_instances_while_they_are_referenced(self):
+        resolver = self.user.resolver
+        uri = 'sellers/me/emails/e1/invoices/%d/'
+        first = resolver.resolve(uri % 1)
+        for n in xrange(2, 12000):
+            resolver.resolve(uri % n)
+        self.assertTrue(resolver.resolve(uri % 1) is first)
+
+        reference = weakref.ref(resolver.resolve(uri % 2))
+        gc.collect()
+        self.assertEqual(reference(), None)
+        self.assertTrue(resolver.resolve(uri % 2).email is first.email)
+
+    def test_resolves_transactions(self):
+        transaction = Transaction.from_uri(
+                        self.user, 'sellers/me/balances/EUR/transactions/2/')
+        self.assertEqual((transaction.balance.id, transaction.id),
+                         ('EUR', '2'))
+
+    def test_rejects_uris_of_other_users(self):
+        uri = 'sellers/9999/emails/e1/invoices/3/'
+        self.assertEqual(InvoiceBase.from_uri(self.user, uri), None)
+        self.assertEqual(self.user.resolver.resolve(uri), None)
+        # The user is loaded once to learn its ID.
+        self.assertEqual(self.client.stats.requests, 1)
+
+    def test_rejects_uris_of_other_roles(self):
+        uri = 'buyers/me/emails/e1/invoices/3/'
+        self.assertEqual(self.user.resolver.resolve(uri), None)
+
+    def test_rejects_unknown_uris(self):
+        self.assertEqual(self.user.resolver.resolve('unknown/1/'), None)
+        self.assertEqual(InvoiceBase.from_uri(self.user,
+                                              'sellers/me/emails/e1/'), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+import unittest
+from datetime import datetime, timedelta
+from greendizer.clients.helpers import CurrencyMetrics
+from greendizer.clients.analytics import (Rollup, MetricsAggregate,
+                                          BUCKET_DAY, BUCKET_WEEK,
+                                          BUCKET_MONTH, bucket_start)
+from tests import SandboxTestCase
+
+
+class _Digest(object):
+    '''
+    Digest of a period built from the metrics of each currency.
+    '''
+    def __init__(self, period, **currencies):
+        self.datetime = period
+        self.__metrics = currencies
+
+    @property
+    def available_currencies(self):
+        return self.__metrics.keys()
+
+    def get_currency_metrics(self, currency):
+        return CurrencyMetrics(currency, self.__metrics[currency])
+
+
+def metrics(total, count, low, high, tax=0.0):
+    return {'sum': total, 'invoicesCount': count, 'min': low, 'max': high,
+            'average': total / count if count else 0.0, 'totalTaxes': tax,
+            'taxes': [{'type': 'percent', 'name': 'VAT', 'value': tax}]}
+
+
+class BucketTest(unittest.TestCase):
+
+    def test_finds_the_beginning_of_buckets(self):
+        value = datetime(2012, 5, 17, 13, 45)  # A Thursday
+        self.assertEqual(bucket_start(value, BUCKET_DAY),
+                         datetime(2012, 5, 17))
+        self.assertEqual(bucket_start(value, BUCKET_WEEK),
+                         datetime(2012, 5, 14))
+        self.assertEqual(bucket_start(value, BUCKET_MONTH),
+                         datetime(2012, 5, 1))
+        self.assertEqual(bucket_start(value, lambda v: v.replace(minute=0)),
+                         datetime(2012, 5, 17, 13))
+        self.assertRaises(ValueError, bucket_start, value, 'decade')
+
+
+class MetricsAggregateTest(unittest.TestCase):
+
+    def test_recomputes_the_average(self):
+        aggregate = MetricsAggregate()
+        aggregate.add(CurrencyMetrics('EUR', metrics(100.0, 1, 100, 100)))
+        aggregate.add(CurrencyMetrics('EUR', metrics(60.0, 3, 10, 30)))
+        self.assertEqual(aggregate.average, 40.0)
+        self.assertEqual((aggregate.min, aggregate.max), (10, 100))
+
+    def test_ignores_the_bounds_of_empty_periods(self):
+        aggregate = MetricsAggregate()
+        aggregate.add(CurrencyMetrics('EUR', metrics(0.0, 0, 0, 0)))
+        aggregate.add(CurrencyMetrics('EUR', metrics(50.0, 2, 20, 30)))
+        self.assertEqual((aggregate.min, aggregate.max), (20, 30))
+
+
+class RollupTest(unittest.TestCase):
+
+    def setUp(self):
+        self.day = datetime(2012, 5, 17)
+        self.rollup = Rollup(BUCKET_DAY)
+        self.rollup.add_all([
+            _Digest(self.day + timedelta(hours=9),
+                    EUR=metrics(100.0, 2, 40, 60, 19.6)),
+            _Digest(self.day + timedelta(hours=10),
+                    EUR=metrics(20.0, 1, 20, 20, 3.9),
+                    USD=metrics(10.0, 1, 10, 10)),
+            _Digest(self.day + timedelta(days=1),
+                    EUR=metrics(5.0, 1, 5, 5))])
+
+    def test_merges_periods_into_buckets(self):
+        self.assertEqual(self.rollup.buckets,
+                         [self.day, self.day + timedelta(days=1)])
+        eur = self.rollup.get(self.day, 'eur')
+        self.assertEqual((eur.sum, eur.invoices_count, eur.min, eur.max),
+                         (120.0, 3, 20, 60))
+        self.assertEqual(eur.average, 40.0)
+        self.assertAlmostEqual(eur.total_taxes, 23.5)
+        self.assertAlmostEqual(eur.taxes[0].value, 23.5)
+        self.assertEqual(sorted(self.rollup[self.day]), ['EUR', 'USD'])
+
+    def test_replaces_periods_added_again(self):
+        self.rollup.add(_Digest(self.day + timedelta(hours=9),
+                                EUR=metrics(10.0, 1, 10, 10)))
+        eur = self.rollup.get(self.day, 'EUR')
+        self.assertEqual((eur.sum, eur.invoices_count, eur.min), (30.0, 2, 10))
+
+    def test_ignores_missing_digests(self):
+        self.assertEqual(self.rollup.add(None), None)
+        self.assertEqual(len(self.rollup), 2)
+        self.assertEqual(self.rollup.get(datetime(2000, 1, 1), 'EUR'), None)
+
+
+class SandboxRollupTest(SandboxTestCase):
+
+    def test_rolls_hourly_digests_up(self):
+        buyer = self.seller_client().seller.buyers['1']
+        end = datetime.now()
+        series = buyer.hours.range(end - timedelta(hours=47), end)
+        rollup = Rollup(BUCKET_DAY)
+        rollup.add_all(series.digests)
+        self.assertTrue(2 <= len(rollup) <= 3)
+        total = sum(rollup.get(start, 'EUR').sum for start in rollup.buckets
+                    if rollup.get(start, 'EUR'))
+        self.assertAlmostEqual(total, sum(series.series('sum', 'EUR')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+import unittest
+from greendizer.clients.routes import Router, ROUTER, split_uri
+from greendizer.clients.http import Request
+from tests import SandboxTestCase
+
+
+class RouterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.router = Router()
+        self.router.add('invoice', '{role:sellers|buyers}/{user}/emails/'
+                                   '{email}/invoices/{invoice}/')
+        self.router.add('invoice.search', '{role:sellers|buyers}/{user}/'
+                                          'emails/{email}/invoices/search/')
+
+    def test_splits_uris(self):
+        self.assertEqual(split_uri('https://api.greendizer.com/sellers/me/'
+                                   'emails/?fields=name'),
+                         ['sellers', 'me', 'emails'])
+
+    def test_matches_uris(self):
+        match = self.router.match('sellers/me/emails/e1/invoices/3/')
+        self.assertEqual(match.name, 'invoice')
+        self.assertEqual(match.params, {'role': 'sellers', 'user': 'me',
+                                        'email': 'e1', 'invoice': '3'})
+
+    def test_prefers_literals_over_placeholders(self):
+        self.assertEqual(self.router.match('buyers/me/emails/e1/invoices/'
+                                           'search/').name, 'invoice.search')
+
+    def test_restricts_choices(self):
+        self.assertEqual(self.router.match('users/me/emails/e1/invoices/3/'),
+                         None)
+        self.assertEqual(self.router.match('sellers/me/emails/e1/'), None)
+
+    def test_keys_identify_resources(self):
+        first = self.router.match('sellers/me/emails/e1/invoices/3/')
+        second = self.router.match('https://api.greendizer.com/sellers/me/'
+                                   'emails/e1/invoices/3/?fields=name')
+        other = self.router.match('sellers/me/emails/e1/invoices/4/')
+        self.assertEqual(first.key, second.key)
+        self.assertNotEqual(first.key, other.key)
+
+    def test_builds_uris(self):
+        self.assertEqual(self.router.build('invoice', role='sellers',
+                                           user='me', email='e1',
+                                           invoice='3'),
+                         'sellers/me/emails/e1/invoices/3/')
+
+    def test_rejects_ambiguous_templates(self):
+        self.assertRaises(ValueError, self.router.add, 'other',
+                          '{role:sellers|buyers}/{account}/')
+
+
+class RoutesTest(unittest.TestCase):
+
+    def test_names_the_resources_of_the_api(self):
+        for uri, name in [('sellers/me/', 'user'),
+                          ('buyers/me/emails/e1/', 'email'),
+                          ('sellers/me/emails/e1/invoices/', 'invoices'),
+                          ('sellers/me/emails/e1/invoices/3/payments/1',
+                           'payment'),
+                          ('sellers/me/buyers/7/days/', 'buyer.days'),
+                          ('sellers/me/balances/EUR/transactions/2/',
+                           'transaction')]:
+            self.assertEqual(ROUTER.match(uri).name, name)
+
+    def test_every_route_builds_uris_it_matches(self):
+        for route in ROUTER:
+            params = dict((param, 'sellers' if param == 'role' else 'x')
+                          for param in route.params)
+            self.assertEqual(ROUTER.match(route.build(**params)).route, route)
+
+
+class RequestRouteTest(SandboxTestCase):
+
+    def test_requests_are_counted_per_route(self):
+        client = self.seller_client()
+        node = client.seller.emails['e1'].invoices
+        for n in xrange(3):
+            node[str(n + 1)].load()
+        self.assertEqual(Request(client, 'get', node['1'].uri).route.name,
+                         'invoice')
+        routes = dict((route['route'], route['requests'])
+                      for route in client.stats.routes())
+        self.assertEqual(routes.get('invoice'), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
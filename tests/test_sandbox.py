@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+import urllib2
+import unittest
+from greendizer.clients import http
+from tests import SandboxTestCase
+from tests.sandbox import SandboxData
+
+
+class SandboxDataTest(unittest.TestCase):
+
+    def test_put_registers_child_in_its_collection(self):
+        data = SandboxData()
+        data.put('sellers/me/emails/e1', {'label': 'a'})
+        data.put('sellers/me/emails/e2', {'label': 'b'})
+        self.assertEqual([path for path, _, _ in
+                          data.children('sellers/me/emails')],
+                         ['sellers/me/emails/e1', 'sellers/me/emails/e2'])
+
+    def test_update_moves_modification_time(self):
+        data = SandboxData()
+        first = data.put('sellers/me/emails/e1', {'label': 'a'})
+        second = data.update('sellers/me/emails/e1', {'label': 'b'})
+        self.assertNotEqual(first, second)
+        self.assertEqual(data.get('sellers/me/emails/e1')[0]['label'], 'b')
+
+    def test_delete_removes_descendants(self):
+        data = SandboxData.generate(emails=1, invoices=3, payments=1,
+                                    buyers=1)
+        data.delete('sellers/me/emails/e1')
+        self.assertEqual(data.children('sellers/me/emails'), [])
+        self.assertEqual(data.get('sellers/me/emails/e1/invoices/1'), None)
+
+
+class SandboxServerTest(SandboxTestCase):
+
+    def open(self, path, **headers):
+        request = urllib2.Request(self.server.url + path, headers=headers)
+        try:
+            return urllib2.urlopen(request)
+        except(urllib2.HTTPError), e:
+            return e
+
+    def test_serves_resources(self):
+        client = self.seller_client()
+        self.assertEqual(client.seller.company.name, 'Sellers')
+        invoice = client.seller.emails['e1'].invoices['3']
+        invoice.load()
+        self.assertEqual(invoice.name, 'Invoice 3')
+
+    def test_serves_ranges_of_collections(self):
+        response = self.open('sellers/me/emails/e1/invoices/',
+                             Range='resources=5-10')
+        self.assertEqual(response.getcode(), 206)
+        self.assertEqual(response.info()['Content-Range'],
+                         'resources 5-14/20')
+
+    def test_answers_not_modified(self):
+        etag = self.open('sellers/me/').info()['Etag']
+        response = self.open('sellers/me/', **{'If-None-Match': etag})
+        self.assertEqual(response.getcode(), 304)
+
+    def test_filters_collections(self):
+        client = self.seller_client()
+        unread = client.seller.emails['e1'].invoices.unread
+        unread.retrieve_all()
+        expected = [path for path, data, _ in
+                    self.data.children('sellers/me/emails/e1/invoices')
+                    if not data['read'] and data['location'] < 2]
+        self.assertEqual(len(unread), len(expected))
+
+    def test_injects_failures(self):
+        self.server.fail_next(1, 503)
+        self.assertEqual(self.open('sellers/me/').getcode(), 503)
+        self.assertEqual(self.open('sellers/me/').getcode(), 200)
+
+    def test_install_redirects_the_library(self):
+        self.assertEqual(http.API_ROOT, self.server.url)
+        self.server.uninstall()
+        self.assertNotEqual(http.API_ROOT, self.server.url)
+        self.server.install()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+import unittest
+from StringIO import StringIO
+from greendizer.clients.stats import ClientStats
+from tests import SandboxTestCase
+
+
+class ClientStatsTest(SandboxTestCase):
+
+    def test_counts_requests_per_route(self):
+        client = self.seller_client()
+        node = client.seller.emails['e1'].invoices
+        for n in xrange(3):
+            node[str(n + 1)].load()
+        self.assertEqual(client.stats.requests, 3)
+        self.assertEqual(client.stats.errors, 0)
+        self.assertTrue(client.stats.bytes_received > 0)
+        route, = client.stats.routes()
+        self.assertEqual((route['method'], route['route'], route['requests']),
+                         ('GET', 'invoice', 3))
+        self.assertEqual(route['bytes_received'], client.stats.bytes_received)
+
+    def test_counts_errors(self):
+        client = self.seller_client()
+        self.server.fail_next(code=404)
+        self.assertRaises(Exception,
+                          client.seller.emails['e1'].invoices['1'].load)
+        self.assertEqual((client.stats.requests, client.stats.errors), (1, 1))
+
+    def test_counts_cache_hits(self):
+        client = self.seller_client()
+        invoice = client.seller.emails['e1'].invoices['1']
+        invoice.load()
+        invoice.load()
+        collection = client.seller.emails['e1'].invoices.search('')
+        collection.sync()
+        requests = client.stats.conditional_requests
+        collection.sync()
+        self.assertEqual(client.stats.conditional_requests, requests + 1)
+        self.assertEqual(client.stats.cache_hits, 1)
+        self.assertEqual(client.stats.cache_hit_ratio, 1.0 / (requests + 1))
+
+    def test_resets_and_summarizes(self):
+        client = self.seller_client()
+        client.seller.emails['e1'].invoices['1'].load()
+        summary = client.stats.summary()
+        self.assertEqual(summary['requests'], 1)
+        self.assertEqual(len(summary['routes']), 1)
+        self.assertTrue('1 requests (0 errors)' in client.stats.report())
+        client.stats.reset()
+        self.assertEqual((client.stats.requests, client.stats.routes()),
+                         (0, []))
+        self.assertEqual(ClientStats().cache_hit_ratio, 0.0)
+
+
+class ProfileTest(SandboxTestCase):
+
+    def test_counts_the_requests_of_the_block(self):
+        client = self.seller_client()
+        invoices = client.seller.emails['e1'].invoices
+        invoices['1'].load()
+        output = StringIO()
+        with client.profile(output=output) as profile:
+            invoices['2'].load()
+            invoices['3'].load()
+        invoices['4'].load()
+        self.assertEqual(profile.stats.requests, 2)
+        self.assertEqual(client.stats.requests, 4)
+        self.assertTrue(profile.elapsed >= 0)
+        report = output.getvalue()
+        self.assertTrue(report.startswith('Profile: '))
+        self.assertTrue('GET invoice' in report)
+
+    def test_prints_nothing_without_output(self):
+        client = self.seller_client()
+        with client.profile(output=False) as profile:
+            client.seller.emails['e1'].invoices['1'].load()
+        self.assertEqual(profile.stats.requests, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+import re
+import time
+import threading
+import unittest
+from greendizer.clients import http
+from tests import SandboxTestCase
+
+
+def run_threads(count, target):
+    '''
+    Runs a callable from several threads at once and re-raises the first
+    exception raised by one of them.
+    @param count:int Number of threads.
+    @param target:function Callable taking the index of the thread.
+    '''
+    errors = []
+    start = threading.Event()
+
+    def run(index):
+        start.wait()
+        try:
+            target(index)
+        except(Exception), e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(index,))
+               for index in xrange(count)]
+    for thread in threads:
+        thread.start()
+    start.set()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+
+
+class ThreadSafetyTest(SandboxTestCase):
+    invoices = 120
+
+    def test_populating_while_iterating(self):
+        client = self.seller_client()
+        collection = client.seller.emails['e1'].invoices.all
+        lengths = []
+
+        def work(index):
+            for _ in xrange(5):
+                if index % 2:
+                    collection.retrieve_all()
+                else:
+                    identifiers = [invoice.id for invoice in collection]
+                    self.assertEqual(len(set(identifiers)),
+                                     len(identifiers))
+                    lengths.append(len(identifiers))
+
+        run_threads(8, work)
+        self.assertEqual(len(collection), self.invoices)
+        self.assertTrue(set(lengths) <= set([0, self.invoices]))
+
+    def test_concurrent_lazy_loads_send_one_request(self):
+        self.server.latency = 0.05
+        client = self.seller_client()
+        invoice = client.seller.emails['e1'].invoices['7']
+        names = []
+        run_threads(8, lambda index: names.append(invoice.name))
+        self.assertEqual(names, ['Invoice 7'] * 8)
+        self.assertEqual(client.stats.requests, 1)
+
+    def test_lazy_load_does_not_block_updates(self):
+        self.server.latency = 0.5
+        client = self.seller_client()
+        invoice = client.seller.emails['e1'].invoices['7']
+        reader = threading.Thread(target=lambda: invoice.name)
+        reader.start()
+        time.sleep(0.1)  # The reader is waiting for the server.
+        started = time.time()
+        invoice.flagged = True
+        self.assertTrue(time.time() - started < 0.2)
+        reader.join()
+        self.assertTrue(invoice.has_updates)
+
+    def test_concurrent_updates(self):
+        client = self.seller_client()
+        collection = client.seller.emails['e1'].invoices.all
+        collection.retrieve_all()
+        invoices = list(collection)
+
+        def work(index):
+            for invoice in invoices[index::8]:
+                invoice.flagged = not invoice.flagged
+                invoice.update()
+
+        run_threads(8, work)
+        for invoice in invoices:
+            stored = self.data.get('sellers/me/emails/e1/invoices/%s' %
+                                   invoice.id)[0]
+            self.assertEqual(stored['flagged'], invoice.flagged)
+            self.assertFalse(invoice.has_updates)
+
+    def test_rotating_tokens_while_sending(self):
+        client = self.seller_client()
+        headers = []
+
+        def hook(event, phase, seconds):
+            if phase == 'total':
+                headers.append(event.request['Authorization'])
+
+        http.add_hook(hook)
+        self.addCleanup(http.remove_hook, hook)
+
+        def work(index):
+            for n in xrange(20):
+                if index == 0:
+                    client.access_token = 'token-%d' % n
+                else:
+                    client.seller.emails['e1'].invoices['%d' % (n + 1)] \
+                          .load()
+
+        run_threads(6, work)
+        self.assertEqual(len(headers), 100)
+        for header in headers:
+            self.assertTrue(re.match(r'^BEARER (sandbox|token-\d+)$', header),
+                            header)
+
+
+if __name__ == '__main__':
+    unittest.main()
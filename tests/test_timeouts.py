@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+import time
+import unittest
+from greendizer.clients.http import (Request, Deadline, RequestTimeoutError,
+                                     DeadlineExceededError, deadline_scope)
+from tests import SandboxTestCase
+
+
+URI = 'sellers/me/emails/e1/'
+
+
+class DeadlineTest(unittest.TestCase):
+
+    def test_counts_down(self):
+        deadline = Deadline(0.05)
+        self.assertFalse(deadline.expired)
+        self.assertTrue(0 < deadline.remaining <= 0.05)
+        time.sleep(0.06)
+        self.assertTrue(deadline.expired)
+        self.assertEqual(deadline.remaining, 0.0)
+        self.assertRaises(DeadlineExceededError, deadline.check)
+
+    def test_closest_entered_deadline_applies(self):
+        self.assertEqual(Deadline.current(), None)
+        with Deadline(10) as outer:
+            with Deadline(1) as inner:
+                self.assertTrue(Deadline.current() is inner)
+                with Deadline(5):
+                    self.assertTrue(Deadline.current() is inner)
+            self.assertTrue(Deadline.current() is outer)
+        self.assertEqual(Deadline.current(), None)
+
+    def test_scopes_accept_numbers_and_none(self):
+        with deadline_scope(None):
+            self.assertEqual(Deadline.current(), None)
+        with deadline_scope(3):
+            self.assertTrue(2 < Deadline.current().remaining <= 3)
+
+
+class TimeoutTest(SandboxTestCase):
+
+    def setUp(self):
+        super(TimeoutTest, self).setUp()
+        self.server.latency = 0.3
+
+    def test_applies_the_read_timeout_of_the_client(self):
+        client = self.seller_client(read_timeout=0.1)
+        started = time.time()
+        self.assertRaises(RequestTimeoutError,
+                          Request(client, 'get', URI).get_response)
+        self.assertTrue(time.time() - started < 0.3)
+
+    def test_requests_override_the_timeouts_of_the_client(self):
+        client = self.seller_client(read_timeout=0.1)
+        request = Request(client, 'get', URI, read_timeout=1)
+        self.assertEqual(request.get_response().status_code, 200)
+        self.assertEqual(Request(client, 'get', URI).connect_timeout,
+                         client.connect_timeout or 10)
+
+    def test_does_not_send_requests_past_their_deadline(self):
+        client = self.seller_client()
+        deadline = Deadline(0)
+        requests = self.server.requests
+        self.assertRaises(DeadlineExceededError,
+                          Request(client, 'get', URI,
+                                  deadline=deadline).get_response)
+        self.assertEqual(self.server.requests, requests)
+
+    def test_deadlines_cap_the_read_timeout(self):
+        client = self.seller_client()
+        with client.deadline(0.1):
+            self.assertRaises(RequestTimeoutError,
+                              Request(client, 'get', URI).get_response)
+
+    def test_deadlines_span_operations_sending_several_requests(self):
+        client = self.seller_client()
+        collection = client.seller.emails['e1'].invoices.search()
+        started = time.time()
+        self.assertRaises(RequestTimeoutError, collection.retrieve_all,
+                          deadline=0.4)
+        self.assertTrue(time.time() - started < 0.6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from greendizer.oauth.tokens import Token, TokenManager
+from greendizer.oauth.stores import (MemoryTokenStore, FileTokenStore,
+                                     SQLiteTokenStore)
+from tests.test_tokens import FakeOAuthClient
+
+
+class _StoreTests(object):
+    '''
+    Tests shared by every kind of store.
+    '''
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_saves_and_loads_tokens(self):
+        store = self.create_store()
+        self.assertEqual(store.load('key'), None)
+        store.save('key', Token('a', 'r', 'scope', 110, 100))
+        store.save('other', Token('b'))
+        token = self.create_store().load('key')
+        self.assertEqual((token.access_token, token.refresh_token,
+                          token.expires_at, token.lifetime), ('a', 'r', 110, 10))
+
+    def test_locks_are_reentrant(self):
+        store = self.create_store()
+        with store.lock('key'):
+            with store.lock('key'):
+                store.save('key', Token('a'))
+        self.assertEqual(store.load('key').access_token, 'a')
+
+    def test_locks_are_exclusive(self):
+        store = self.create_store()
+        events = []
+
+        def hold(name):
+            with self.create_store().lock('key'):
+                events.append(name)
+                threading.Event().wait(0.05)
+                events.append(name)
+
+        threads = [threading.Thread(target=hold, args=(n,)) for n in xrange(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([events[i] for i in xrange(0, 6, 2)],
+                         [events[i] for i in xrange(1, 6, 2)])
+
+    def test_managers_sharing_a_store_refresh_once(self):
+        oauth_client = FakeOAuthClient(latency=0.1)
+        TokenManager(store=self.create_store()).add(oauth_client,
+                                                    oauth_client.response())
+        # One manager per process, loading the token from the store.
+        managers = [TokenManager(store=self.create_store())
+                    for _ in xrange(4)]
+        for manager in managers:
+            manager.add(oauth_client)
+
+        threads = [threading.Thread(target=manager.refresh,
+                                    args=(oauth_client,))
+                   for manager in managers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(oauth_client.refreshes, 1)
+        self.assertEqual(set(manager.get(oauth_client)
+                             for manager in managers), set(['token-1']))
+
+
+class MemoryTokenStoreTest(_StoreTests, unittest.TestCase):
+
+    def setUp(self):
+        super(MemoryTokenStoreTest, self).setUp()
+        self.store = MemoryTokenStore()
+
+    def create_store(self):
+        return self.store
+
+
+class FileTokenStoreTest(_StoreTests, unittest.TestCase):
+
+    def create_store(self):
+        return FileTokenStore(os.path.join(self.directory, 'tokens'))
+
+    def test_ignores_corrupted_files(self):
+        store = self.create_store()
+        with open(store.path_for('key'), 'w') as f:
+            f.write('{')
+        self.assertEqual(store.load('key'), None)
+
+
+class SQLiteTokenStoreTest(_StoreTests, unittest.TestCase):
+
+    def create_store(self):
+        return SQLiteTokenStore(os.path.join(self.directory, 'tokens.db'))
+
+    def test_rolls_back_on_errors(self):
+        store = self.create_store()
+
+        def fail():
+            with store.lock('key'):
+                store.save('key', Token('a'))
+                raise ValueError()
+
+        self.assertRaises(ValueError, fail)
+        self.assertEqual(store.load('key'), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+import time
+import threading
+import unittest
+from greendizer.oauth import OAuthClient, AccessTokenError
+from greendizer.oauth.tokens import Token, TokenManager
+from greendizer.oauth.stores import MemoryTokenStore
+
+
+class FakeOAuthClient(OAuthClient):
+    '''
+    OAuth client issuing tokens without contacting the OAuth server.
+    '''
+    def __init__(self, expires_in=3600, latency=0):
+        OAuthClient.__init__(self, 'sellers', 'client', 'secret', 'scope')
+        self.expires_in = expires_in
+        self.latency = latency
+        self.refreshes = 0
+        self.__lock = threading.Lock()
+
+    def refresh_token(self, token, redirect_uri=None, scope=None):
+        time.sleep(self.latency)
+        with self.__lock:
+            self.refreshes += 1
+            return {'access_token': 'token-%d' % self.refreshes,
+                    'expires_in': self.expires_in}
+
+    def response(self, access_token='token-0'):
+        return {'access_token': access_token, 'refresh_token': 'refresh',
+                'expires_in': self.expires_in}
+
+
+class _Client(object):
+    access_token = None
+
+
+class FlakyTokenStore(MemoryTokenStore):
+    '''
+    Store failing to lock its tokens a given number of times.
+    '''
+    failures = 0
+
+    def lock(self, key):
+        if self.failures:
+            self.failures -= 1
+            raise IOError('Store unavailable')
+        return MemoryTokenStore.lock(self, key)
+
+
+class TokenTest(unittest.TestCase):
+
+    def test_serializes_tokens(self):
+        token = Token.from_response({'access_token': 'a', 'expires_in': 10,
+                                     'refresh_token': 'r'}, 'scope', now=100)
+        copy = Token.from_dict(token.to_dict())
+        self.assertEqual((copy.access_token, copy.refresh_token, copy.scope,
+                          copy.expires_at, copy.lifetime),
+                         ('a', 'r', 'scope', 110, 10))
+
+    def test_keeps_the_refresh_token(self):
+        previous = Token('a', 'r')
+        token = Token.from_response({'access_token': 'b'}, previous=previous)
+        self.assertEqual(token.refresh_token, 'r')
+
+    def test_tells_whether_it_expires(self):
+        token = Token('a', expires_at=100)
+        self.assertTrue(token.expires_within(10, now=95))
+        self.assertFalse(token.expires_within(10, now=80))
+        self.assertFalse(Token('a').expires_within(10))
+
+
+class TokenManagerTest(unittest.TestCase):
+
+    def test_refreshes_tokens_about_to_expire(self):
+        oauth_client = FakeOAuthClient(expires_in=60)
+        manager = TokenManager(refresh_margin=10)
+        now = time.time()
+        manager.add(oauth_client, Token('token-0', 'refresh', None, now + 20,
+                                        now - 40))
+        self.assertEqual(manager.get(oauth_client), 'token-0')
+
+        manager.token(oauth_client).expires_at = now + 5
+        self.assertEqual(manager.get(oauth_client), 'token-1')
+        self.assertEqual(oauth_client.refreshes, 1)
+
+    def test_concurrent_refreshes_send_one_request(self):
+        oauth_client = FakeOAuthClient(latency=0.1)
+        manager = TokenManager()
+        manager.add(oauth_client, oauth_client.response())
+        threads = [threading.Thread(target=manager.refresh,
+                                    args=(oauth_client,))
+                   for _ in xrange(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(oauth_client.refreshes, 1)
+
+    def test_swaps_the_tokens_of_bound_clients(self):
+        oauth_client = FakeOAuthClient()
+        manager = TokenManager()
+        manager.add(oauth_client, oauth_client.response())
+        client = manager.bind(_Client(), oauth_client)
+        self.assertEqual(client.access_token, 'token-0')
+        manager.refresh(oauth_client)
+        self.assertEqual(client.access_token, 'token-1')
+        manager.unbind(client, oauth_client)
+        manager.refresh(oauth_client)
+        self.assertEqual(client.access_token, 'token-1')
+
+    def test_rejects_unknown_tokens(self):
+        self.assertRaises(AccessTokenError, TokenManager().get,
+                          FakeOAuthClient())
+
+    def test_clamps_the_margin_of_short_lived_tokens(self):
+        manager = TokenManager(refresh_margin=120)
+        self.assertEqual(manager.margin(Token('a', expires_at=160,
+                                              issued_at=100)), 30)
+        self.assertEqual(manager.margin(Token('a', expires_at=1000,
+                                              issued_at=100)), 120)
+        self.assertEqual(manager.margin(Token('a', expires_at=1000)), 120)
+
+    def test_refreshes_short_lived_tokens_halfway(self):
+        oauth_client = FakeOAuthClient(expires_in=0.4)
+        manager = TokenManager(refresh_margin=120).start()
+        self.addCleanup(manager.stop)
+        manager.add(oauth_client, oauth_client.response())
+        time.sleep(1)
+        # One refresh every 0.2s rather than back to back.
+        self.assertTrue(3 <= oauth_client.refreshes <= 6,
+                        oauth_client.refreshes)
+        self.assertFalse(manager.token(oauth_client).expires_within(0))
+
+    def test_store_errors_keep_the_current_token(self):
+        oauth_client = FakeOAuthClient()
+        store = FlakyTokenStore()
+        manager = TokenManager(store=store)
+        manager.add(oauth_client, oauth_client.response())
+        store.failures = 2
+        self.assertRaises(IOError, manager.refresh, oauth_client)
+        self.assertEqual(manager.refresh(oauth_client,
+                                         raise_errors=False).access_token,
+                         'token-0')
+        self.assertEqual(manager.refresh(oauth_client).access_token,
+                         'token-1')
+
+    def test_background_refreshes_survive_store_errors(self):
+        oauth_client = FakeOAuthClient(expires_in=0.2)
+        store = FlakyTokenStore()
+        manager = TokenManager(retry_delay=0.1, store=store)
+        manager.add(oauth_client, oauth_client.response())
+        store.failures = 3
+        manager.start()
+        self.addCleanup(manager.stop)
+        time.sleep(0.6)
+        self.assertEqual(store.failures, 0)
+        self.assertTrue(oauth_client.refreshes >= 1)
+        self.assertFalse(manager.token(oauth_client).expires_within(0))
+
+    def test_background_refreshes_survive_unknown_tokens(self):
+        broken, other = FakeOAuthClient(), FakeOAuthClient(expires_in=0.2)
+        other.client_id = 'other'
+        manager = TokenManager(retry_delay=0.1)
+        manager.add(broken, Token('a', 'refresh', None, time.time()))
+        manager.add(other, other.response())
+        broken.client_id = 'renamed'  # Its entry cannot be found anymore
+        manager.start()
+        self.addCleanup(manager.stop)
+        time.sleep(0.3)
+        self.assertTrue(other.refreshes >= 1)
+        self.assertEqual(broken.refreshes, 0)
+
+if __name__ == '__main__':
+    unittest.main()
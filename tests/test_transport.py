@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+import time
+import socket
+import httplib
+import threading
+import unittest
+import BaseHTTPServer
+import SocketServer
+from greendizer.clients import SellerClient, http
+from greendizer.clients.http import Request
+from greendizer.clients.stats import LatencyAggregator
+from greendizer.clients.transport import (ConnectionPool, PooledHandler,
+                                          build_opener)
+
+
+class _Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    '''
+    Answers every request with a small body, unless the server was told to
+    drop the next requests or to answer them late.
+    '''
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        self.server.connections += 1
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(self.command)
+        length = int(self.headers.get('Content-Length') or 0)
+        self.rfile.read(length)
+        if server.drop:
+            # Processed, but the connection closes before the answer.
+            server.drop -= 1
+            self.close_connection = 1
+            return
+        if server.delay:
+            time.sleep(server.delay)
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write('ok')
+
+    do_POST = do_GET
+
+
+class ConnectionPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = _Server(('127.0.0.1', 0), _Handler)
+        self.server.connections = 0
+        self.server.requests = []
+        self.server.drop = 0
+        self.server.delay = 0
+        thread = threading.Thread(target=self.server.serve_forever,
+                                  args=(0.05,))
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = 'http://%s:%d/' % self.server.server_address
+        self.pool = ConnectionPool()
+        self.addCleanup(self.pool.clear)
+
+    def send(self, method='GET', **kwargs):
+        response = self.pool.urlopen(method, self.url,
+                                     'data' if method == 'POST' else None,
+                                     **kwargs)
+        body = response.read()
+        self.pool.release(response)
+        return response.status, body
+
+    def test_reuses_connections(self):
+        for _ in xrange(3):
+            self.assertEqual(self.send(), (200, 'ok'))
+        self.assertEqual(self.server.connections, 1)
+
+    def test_resends_idempotent_requests_on_dropped_connections(self):
+        self.send()
+        self.server.drop = 1
+        response = self.pool.urlopen('GET', self.url)
+        self.assertEqual((response.read(), response.retries), ('ok', 1))
+        self.pool.release(response)
+        self.assertEqual(self.server.requests, ['GET', 'GET', 'GET'])
+
+    def test_reports_retries_to_request_hooks(self):
+        retries = []
+
+        def hook(event, phase, seconds):
+            if phase == 'network':
+                retries.append(event.retries)
+
+        http.add_hook(hook)
+        self.addCleanup(http.remove_hook, hook)
+        aggregator = LatencyAggregator().install()
+        self.addCleanup(aggregator.uninstall)
+        self.addCleanup(setattr, http, 'API_ROOT', http.API_ROOT)
+        http.API_ROOT = self.url
+        client = SellerClient(oauth_token='test')
+        client.opener = build_opener(PooledHandler(self.pool))
+        Request(client, 'get', 'sellers/me/').get_response()
+        self.server.drop = 1
+        Request(client, 'get', 'sellers/me/').get_response()
+        self.assertEqual(retries, [0, 1])
+        self.assertEqual(aggregator.report()[0]['retries'], 1)
+
+    def test_does_not_resend_requests_which_may_have_been_processed(self):
+        self.send()
+        self.server.drop = 1
+        self.assertRaises(httplib.HTTPException, self.send, 'POST')
+        self.assertEqual(self.server.requests, ['GET', 'POST'])
+
+    def test_does_not_resend_requests_which_timed_out(self):
+        self.send()
+        self.server.delay = 0.5
+        self.assertRaises(socket.timeout, self.send, read_timeout=0.1)
+        self.assertEqual(self.server.requests, ['GET', 'GET'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+import unittest
+from greendizer.clients.dal import (UpdateSession, CONFLICT_SKIP,
+                                    CONFLICT_REFRESH, CONFLICT_FORCE)
+from tests import SandboxTestCase
+
+
+INVOICES = 'sellers/me/emails/e1/invoices'
+
+
+class UpdateSessionTest(SandboxTestCase):
+
+    def retrieve(self, client):
+        collection = client.seller.emails['e1'].invoices.all
+        collection.retrieve_all()
+        return list(collection)
+
+    def stored(self, invoice):
+        return self.data.get('%s/%s' % (INVOICES, invoice.id))[0]
+
+    def test_flushes_resources_changed_within_the_session(self):
+        invoices = self.retrieve(self.seller_client())
+        with UpdateSession(max_workers=4) as session:
+            for invoice in invoices:
+                invoice.flagged = True
+        report = session.report
+        self.assertEqual(report.errors, [])
+        self.assertEqual(len(report.updated) + len(report.unchanged),
+                         len(invoices))
+        self.assertTrue(all(self.stored(invoice)['flagged']
+                            for invoice in invoices))
+
+    def test_sessions_are_not_flushed_on_error(self):
+        invoice = self.retrieve(self.seller_client())[0]
+        try:
+            with UpdateSession() as session:
+                invoice.flagged = not invoice.flagged
+                raise RuntimeError()
+        except RuntimeError:
+            pass
+        self.assertEqual(len(session), 1)
+        self.assertEqual(session.report, None)
+
+    def conflicting(self, on_conflict):
+        invoice = [invoice for invoice in
+                   self.retrieve(self.seller_client())
+                   if not invoice.flagged][0]
+        self.data.update('%s/%s' % (INVOICES, invoice.id),
+                         {'name': 'Changed'})
+        session = UpdateSession(prevent_conflicts=True,
+                                on_conflict=on_conflict)
+        invoice.flagged = True
+        session.add(invoice)
+        return invoice, session.flush()
+
+    def test_skips_conflicts(self):
+        invoice, report = self.conflicting(CONFLICT_SKIP)
+        self.assertEqual(len(report.conflicts), 1)
+        self.assertFalse(self.stored(invoice)['flagged'])
+
+    def test_refreshes_conflicts(self):
+        invoice, report = self.conflicting(CONFLICT_REFRESH)
+        self.assertEqual((report.conflicts, report.errors), ([], []))
+        self.assertEqual(report.updated, [invoice])
+        self.assertTrue(self.stored(invoice)['flagged'])
+        self.assertEqual(invoice.name, 'Changed')
+
+    def test_forces_conflicts(self):
+        invoice, report = self.conflicting(CONFLICT_FORCE)
+        self.assertEqual(report.updated, [invoice])
+        self.assertTrue(self.stored(invoice)['flagged'])
+
+    def test_rejects_unknown_policies(self):
+        self.assertRaises(ValueError, UpdateSession, on_conflict='merge')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+import time
+import unittest
+from greendizer.clients.watchers import Watcher
+from tests import SandboxTestCase
+
+
+INVOICES = 'sellers/me/emails/e%d/invoices'
+
+
+class WatcherTest(SandboxTestCase):
+    emails = 20
+
+    def setUp(self):
+        super(WatcherTest, self).setUp()
+        self.client = self.seller_client()
+        self.changes = []
+
+    def notify(self, watch, delta):
+        self.changes.append((watch, delta))
+
+    def unread_invoice(self, email):
+        return [path for path, data, _ in self.data.children(INVOICES % email)
+                if not data['read'] and data['location'] < 2][0]
+
+    def watch_mailboxes(self, watcher):
+        emails = self.client.seller.emails.all
+        emails.retrieve_all()
+        return emails, dict((email.id, watcher.watch(email.invoices.unread,
+                                                     self.notify,
+                                                     parent=emails))
+                            for email in emails)
+
+    def test_notifies_changes_after_the_baseline(self):
+        watcher = Watcher()
+        collection = self.client.seller.emails['e1'].invoices.search('')
+        watch = watcher.watch(collection, self.notify)
+        self.assertEqual(watcher.poll(), 0)
+        self.assertEqual(self.changes, [])
+
+        self.data.update('%s/3' % INVOICES % 1, {'name': 'Changed'})
+        self.assertEqual(watcher.poll(force=True), 1)
+        self.assertEqual(len(self.changes), 1)
+        changed, delta = self.changes[0]
+        self.assertTrue(changed is watch)
+        self.assertEqual([invoice.id for invoice in delta.changed], ['3'])
+        self.assertEqual(watch.changes, 1)
+
+    def test_idle_polls_of_coalesced_watches_cost_one_request(self):
+        watcher = Watcher(min_interval=0.01, max_interval=0.02,
+                          fallback_interval=3600)
+        self.watch_mailboxes(watcher)
+        watcher.poll()
+        requests = self.client.stats.requests
+        for _ in xrange(5):
+            time.sleep(0.03)  # Backed off to max_interval
+            self.assertEqual(watcher.poll(), 0)
+        self.assertEqual(self.client.stats.requests - requests, 5)
+
+    def test_syncs_collections_whose_owner_changed(self):
+        watcher = Watcher(fallback_interval=3600)
+        emails, watches = self.watch_mailboxes(watcher)
+        watcher.poll()
+        self.data.update(self.unread_invoice(7), {'read': True})
+        # The API reflects the change on the email address owning it.
+        self.data.update('sellers/me/emails/e7', {})
+        requests = self.client.stats.requests
+        self.assertEqual(watcher.poll(force=True), 1)
+        self.assertEqual([watch for watch, _ in self.changes],
+                         [watches['e7']])
+        self.assertTrue(self.client.stats.requests - requests < 10)
+
+    def test_fallback_syncs_find_changes_not_reflected_by_owners(self):
+        watcher = Watcher(fallback_interval=0.4)
+        emails, watches = self.watch_mailboxes(watcher)
+        watcher.poll()
+        self.data.update(self.unread_invoice(3), {'read': True})
+        self.assertEqual(watcher.poll(force=True), 0)
+
+        deadline = time.time() + 1
+        while not self.changes and time.time() < deadline:
+            time.sleep(0.05)
+            watcher.poll(force=True)
+        self.assertEqual([watch for watch, _ in self.changes],
+                         [watches['e3']])
+
+    def test_fallback_syncs_are_staggered(self):
+        watcher = Watcher(fallback_interval=1)
+        emails, watches = self.watch_mailboxes(watcher)
+        watcher.poll()
+        time.sleep(0.75)
+        requests = self.client.stats.requests
+        watcher.poll(force=True)
+        synced = self.client.stats.requests - requests - 1
+        self.assertTrue(0 < synced < self.emails, synced)
+
+    def test_callback_errors_are_recorded(self):
+        watcher = Watcher()
+        collection = self.client.seller.emails['e1'].invoices.search('')
+
+        def fail(watch, delta):
+            raise RuntimeError('callback')
+
+        watch = watcher.watch(collection, fail)
+        watcher.poll()
+        self.data.update('%s/3' % INVOICES % 1, {'name': 'Changed'})
+        watcher.poll(force=True)
+        self.assertEqual((watch.errors, str(watch.last_error)),
+                         (1, 'callback'))
+
+    def test_cancelled_watches_are_not_polled(self):
+        watcher = Watcher()
+        collection = self.client.seller.emails['e1'].invoices.search('')
+        watch = watcher.watch(collection, self.notify)
+        watch.cancel()
+        self.assertEqual(watcher.watches, [])
+        self.assertEqual(watcher.poll(force=True), 0)
+        self.assertEqual(watch.polls, 0)
+
+    def test_polls_in_the_background(self):
+        watcher = Watcher(min_interval=0.05, max_interval=0.2).start()
+        self.addCleanup(watcher.stop)
+        collection = self.client.seller.emails['e1'].invoices.search('')
+        watch = watcher.watch(collection, self.notify)
+        deadline = time.time() + 2
+        while not watch.polls and time.time() < deadline:
+            time.sleep(0.02)
+        self.data.update('%s/3' % INVOICES % 1, {'name': 'Changed'})
+        while not self.changes and time.time() < deadline:
+            time.sleep(0.02)
+        self.assertEqual(len(self.changes), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()